@@ -9,11 +9,17 @@ from flask_login import LoginManager
 
 # Local
 from models import db, User
+import ledger  # noqa: F401 — registers the listeners that keep derived ledger tables in step
+import category_tree  # noqa: F401 — registers the listener that maintains category_closure
 from auth import auth_bp, init_oauth
-from blueprints.main import main_bp
+from import_jobs import init_import_jobs
+from plaid_sync import init_plaid_sync
+from snapshot import init_snapshot_cache
+from blueprints.main import main_bp, init_route_list
 from blueprints.transactions import transactions_bp
 from blueprints.plaid import plaid_bp
 from blueprints.accounts import accounts_bp
+from blueprints.analytics import analytics_bp
 
 load_dotenv()
 
@@ -67,11 +73,16 @@ def create_app(config_override: dict | None = None) -> Flask:
         return db.session.get(User, int(user_id))
 
     init_oauth(app)
+    init_import_jobs(app)
+    init_plaid_sync(app)
+    init_snapshot_cache(app)
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(transactions_bp)
     app.register_blueprint(plaid_bp)
     app.register_blueprint(accounts_bp)
+    app.register_blueprint(analytics_bp)
+    init_route_list(app)
 
     with app.app_context():
         db.create_all()
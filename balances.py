@@ -0,0 +1,239 @@
+"""
+Account balance history.
+
+Every balance snapshot goes through record_balance, which only writes when the
+balance has actually changed and moves the account's latest_balance_id pointer, so
+anything that shows current balances joins one row per account instead of loading
+and sorting balance_history.
+
+compact_balances keeps the history small: raw snapshots older than a couple of days
+are folded into hourly buckets, hourly into daily after a month, daily into monthly
+after a year. A bucket row keeps the last, lowest and highest balance it covered,
+and net_worth_series reads those buckets back at any resolution.
+"""
+# Standard library
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Third-party
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import selectinload
+
+# Local
+from models import db, Account, AccountBalance, PlaidItem
+from money import DEFAULT_CURRENCY
+
+
+# Loader option for PlaidItem queries: each item's accounts with their latest balance,
+# in two queries however many accounts or snapshots there are
+ACCOUNTS_WITH_BALANCES = selectinload(PlaidItem.accounts).joinedload(Account.latest_balance)
+
+# (resolution compacted, resolution it becomes, how long to keep it uncompacted)
+COMPACTION_TIERS = (
+    ("raw", "hour", timedelta(days=2)),
+    ("hour", "day", timedelta(days=30)),
+    ("day", "month", timedelta(days=365)),
+)
+RESOLUTIONS = ("hour", "day", "month")
+
+# Account subtypes whose balance is money owed, subtracted from net worth
+LIABILITY_SUBTYPES = {"credit", "loan"}
+
+# Most points net_worth_series will return in one call
+MAX_SERIES_POINTS = 5000
+
+# Max (account_id, bucket) pairs per IN (...) list
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Start of the hour/day/month bucket containing moment."""
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "month":
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown resolution {resolution!r}")
+
+
+def next_bucket(start: datetime, resolution: str) -> datetime:
+    """Start of the bucket after the one starting at start."""
+    if resolution == "hour":
+        return start + timedelta(hours=1)
+    if resolution == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def record_balance(
+    account_id: int, current_balance: Decimal | float, recorded_at: datetime | None = None,
+) -> AccountBalance | None:
+    """
+    Append a balance snapshot and point the account at it, unless the account already
+    points at a newer one (snapshots can arrive out of order). Nothing is written if
+    the balance is the same as the latest snapshot's. Flushes; doesn't commit.
+    Returns the new snapshot, or None if it was unchanged.
+    """
+    recorded_at = recorded_at or datetime.utcnow()
+    balance = Decimal(str(current_balance)).quantize(Decimal("0.01"))
+
+    latest = db.session.execute(
+        select(AccountBalance.current_balance, AccountBalance.recorded_at)
+        .join(Account, Account.latest_balance_id == AccountBalance.id)
+        .where(Account.id == account_id)
+    ).first()
+    if latest is not None and latest.recorded_at <= recorded_at and latest.current_balance == balance:
+        return None
+
+    snapshot = AccountBalance(account_id=account_id, current_balance=balance, recorded_at=recorded_at)
+    db.session.add(snapshot)
+    db.session.flush()
+
+    latest = AccountBalance.__table__
+    current_at = select(latest.c.recorded_at).where(latest.c.id == Account.latest_balance_id).scalar_subquery()
+    db.session.execute(
+        update(Account)
+        .where(Account.id == account_id,
+               or_(Account.latest_balance_id.is_(None), current_at <= snapshot.recorded_at))
+        .values(latest_balance_id=snapshot.id)
+        .execution_options(synchronize_session=False)
+    )
+    return snapshot
+
+
+def refresh_latest_balances(account_ids: list[int] | None = None) -> None:
+    """Re-point latest_balance_id at each account's newest snapshot (or NULL if it has none)."""
+    history = AccountBalance.__table__
+    newest = (
+        select(history.c.id)
+        .where(history.c.account_id == Account.id)
+        .order_by(history.c.recorded_at.desc(), history.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = update(Account).values(latest_balance_id=newest).execution_options(synchronize_session=False)
+    if account_ids is not None:
+        stmt = stmt.where(Account.id.in_(account_ids))
+    db.session.execute(stmt)
+
+
+def compact_balances(account_ids: list[int] | None = None, now: datetime | None = None) -> int:
+    """
+    Fold old snapshots into coarser buckets, tier by tier (see COMPACTION_TIERS).
+    Cut-offs fall on bucket boundaries, so a bucket is only ever built from complete
+    data. Re-points latest_balance_id for the accounts touched. Doesn't commit.
+    Returns how many rows were removed.
+    """
+    now = now or datetime.utcnow()
+    history = AccountBalance.__table__
+    removed = 0
+    touched = set()
+
+    for source, target, keep in COMPACTION_TIERS:
+        filters = [history.c.resolution == source, history.c.recorded_at < bucket_start(now - keep, target)]
+        if account_ids is not None:
+            filters.append(history.c.account_id.in_(account_ids))
+        rows = db.session.execute(select(history).where(*filters)).all()
+        if not rows:
+            continue
+
+        buckets = defaultdict(list)
+        for row in rows:
+            buckets[(row.account_id, bucket_start(row.recorded_at, target))].append(row)
+
+        # Fold in any bucket rows already there (snapshots that arrived after a compaction)
+        keys = list(buckets)
+        for start in range(0, len(keys), IN_CLAUSE_CHUNK_SIZE):
+            existing = db.session.execute(select(history).where(
+                history.c.resolution == target,
+                tuple_(history.c.account_id, history.c.recorded_at).in_(keys[start:start + IN_CLAUSE_CHUNK_SIZE]),
+            )).all()
+            for row in existing:
+                buckets[(row.account_id, row.recorded_at)].insert(0, row)
+
+        merged, doomed = [], []
+        for (account_id, start), members in buckets.items():
+            members.sort(key=lambda r: (r.recorded_at, r.id))
+            merged.append({
+                "account_id": account_id,
+                "recorded_at": start,
+                "resolution": target,
+                "current_balance": members[-1].current_balance,
+                "min_balance": min(r.min_balance if r.min_balance is not None else r.current_balance for r in members),
+                "max_balance": max(r.max_balance if r.max_balance is not None else r.current_balance for r in members),
+            })
+            doomed.extend(r.id for r in members)
+            touched.add(account_id)
+
+        for start in range(0, len(doomed), IN_CLAUSE_CHUNK_SIZE):
+            db.session.execute(delete(history).where(history.c.id.in_(doomed[start:start + IN_CLAUSE_CHUNK_SIZE])))
+        db.session.execute(insert(history), merged)
+        removed += len(doomed) - len(merged)
+
+    if touched:
+        refresh_latest_balances(list(touched))
+    return removed
+
+
+def balance_currencies(user_id: int) -> list[str]:
+    """Currencies of the user's accounts that have balance history, most accounts first."""
+    currency = func.upper(Account.currency)
+    accounts = func.count(func.distinct(Account.id))
+    rows = db.session.execute(
+        select(currency)
+        .join(AccountBalance, AccountBalance.account_id == Account.id)
+        .where(Account.user_id == user_id)
+        .group_by(currency)
+        .order_by(accounts.desc(), currency)
+    )
+    return list(rows.scalars())
+
+
+def net_worth_series(
+    user_id: int, resolution: str = "day", start: datetime | None = None, end: datetime | None = None,
+    currency: str | None = None,
+) -> dict:
+    """
+    Net worth per bucket from start to end (default: first snapshot to now): the sum of
+    every account's balance at the end of the bucket, credit and loan balances counted
+    as negative. An account's last known balance carries forward through buckets with
+    no snapshot. Only accounts in currency (default: the one most of the user's
+    accounts are in) are added up, since balances in different currencies can't be.
+    Returns {"currency", "currencies": [every currency with balances],
+    "series": [{"at": bucket start, "net_worth": float}]}.
+    Raises ValueError for an unknown resolution or more than MAX_SERIES_POINTS points.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+    end = end or datetime.utcnow()
+    currencies = balance_currencies(user_id)
+    currency = (currency or next(iter(currencies), DEFAULT_CURRENCY)).upper()
+    result = {"currency": currency, "currencies": currencies, "series": []}
+
+    rows = db.session.execute(
+        select(AccountBalance.account_id, AccountBalance.recorded_at, AccountBalance.current_balance, Account.subtype)
+        .join(Account, Account.id == AccountBalance.account_id)
+        .where(Account.user_id == user_id, func.upper(Account.currency) == currency, AccountBalance.recorded_at <= end)
+        .order_by(AccountBalance.recorded_at, AccountBalance.id)
+    ).all()
+    if not rows:
+        return result
+
+    bucket = bucket_start(start or rows[0].recorded_at, resolution)
+    last = bucket_start(end, resolution)
+    balances = {}
+    series = result["series"]
+    i = 0
+    while bucket <= last:
+        following = next_bucket(bucket, resolution)
+        while i < len(rows) and rows[i].recorded_at < following:
+            sign = -1 if rows[i].subtype in LIABILITY_SUBTYPES else 1
+            balances[rows[i].account_id] = sign * rows[i].current_balance
+            i += 1
+        series.append({"at": bucket, "net_worth": float(sum(balances.values(), Decimal(0)))})
+        if len(series) > MAX_SERIES_POINTS:
+            raise ValueError(f"More than {MAX_SERIES_POINTS} points; use a coarser resolution or a shorter range")
+        bucket = following
+    return result
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+
 from models import db, Account, PlaidItem
+from balances import ACCOUNTS_WITH_BALANCES
 
 accounts_bp = Blueprint('accounts', __name__)
 
@@ -9,14 +12,14 @@ accounts_bp = Blueprint('accounts', __name__)
 @login_required
 def accounts():
     # Automatic accounts: grouped by bank (PlaidItem), includes balance + sync
-    items = PlaidItem.query.filter_by(user_id=current_user.id).all()
+    items = PlaidItem.query.filter_by(user_id=current_user.id).options(ACCOUNTS_WITH_BALANCES).all()
 
     # Manual accounts: user-created, no Plaid connection
     manual_accounts = Account.query.filter_by(
         user_id=current_user.id,
         account_type='manual',
         status='active'
-    ).all()
+    ).options(joinedload(Account.latest_balance)).all()
 
     return render_template("accounts.html", items=items, manual_accounts=manual_accounts)
 
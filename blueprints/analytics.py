@@ -0,0 +1,119 @@
+from datetime import date, datetime, time
+
+from flask import Blueprint, request, jsonify, abort
+from flask_login import login_required, current_user
+
+from balances import net_worth_series
+from category_tree import category_rollup
+from helpers import monthly_spend_matrix
+from ledger import next_month
+from models import ledger_currencies
+from money import DEFAULT_CURRENCY
+from snapshot import GROUP_BYS, ledger_summary
+
+analytics_bp = Blueprint('analytics', __name__)
+
+
+@analytics_bp.route("/analytics/category-rollup")
+@login_required
+def category_rollup_view():
+    """
+    JSON spend per category including subcategories.
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive, default: this month so far)
+    &parent_id=<id> to list that category's children instead of the top level
+    &currency=<ISO code> (default: the currency most of the user's transactions are in).
+    """
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args.get("start", today.replace(day=1).isoformat()))
+        end = date.fromisoformat(request.args.get("end", today.isoformat()))
+    except ValueError:
+        abort(400, "start and end must be YYYY-MM-DD dates")
+    parent_id = request.args.get("parent_id", type=int)
+    currencies = ledger_currencies(current_user.id)
+    currency = request.args.get("currency", next(iter(currencies), DEFAULT_CURRENCY)).upper()
+
+    return jsonify({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "parent_id": parent_id,
+        "currency": currency,
+        "currencies": currencies,
+        "categories": category_rollup(current_user.id, start, end, parent_id, currency),
+    })
+
+
+@analytics_bp.route("/analytics/monthly-totals")
+@login_required
+def monthly_totals_view():
+    """
+    JSON month x category spend matrix from the monthly rollup.
+    ?start=YYYY-MM&end=YYYY-MM (inclusive, default: the last 12 months)
+    &account_id=<id> to limit it to one account
+    &currency=<ISO code> (default: the currency most of the user's transactions are in).
+    """
+    today = date.today()
+    default_start = next_month(date(today.year - 1, today.month, 1))
+    try:
+        start = date.fromisoformat(request.args["start"] + "-01") if "start" in request.args else default_start
+        end = date.fromisoformat(request.args["end"] + "-01") if "end" in request.args else today.replace(day=1)
+    except ValueError:
+        abort(400, "start and end must be YYYY-MM months")
+    account_id = request.args.get("account_id", type=int)
+
+    matrix = monthly_spend_matrix(current_user.id, start, end, account_id, request.args.get("currency"))
+    return jsonify({"account_id": account_id, **matrix})
+
+
+@analytics_bp.route("/analytics/summary")
+@login_required
+def ledger_summary_view():
+    """
+    JSON count, total, mean, median, p90, min and max of transaction amounts, from
+    the user's cached ledger snapshot.
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive, default: all time)
+    &account_id=<id> to limit it to one account
+    &currency=<ISO code> (default: the currency most of the user's transactions are in)
+    &group_by=category|account|merchant|month for per-group counts and totals.
+    """
+    try:
+        start = date.fromisoformat(request.args["start"]) if "start" in request.args else None
+        end = date.fromisoformat(request.args["end"]) if "end" in request.args else None
+    except ValueError:
+        abort(400, "start and end must be YYYY-MM-DD dates")
+    group_by = request.args.get("group_by")
+    if group_by is not None and group_by not in GROUP_BYS:
+        abort(400, f"group_by must be one of: {', '.join(GROUP_BYS)}")
+
+    return jsonify(ledger_summary(
+        current_user.id, start, end, request.args.get("account_id", type=int), group_by,
+        request.args.get("currency"),
+    ))
+
+
+@analytics_bp.route("/analytics/net-worth")
+@login_required
+def net_worth_view():
+    """
+    JSON net worth over time from account balance snapshots.
+    ?resolution=hour|day|month (default day)
+    &start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive, default: first snapshot to now)
+    &currency=<ISO code> (default: the currency most of the user's accounts are in).
+    """
+    try:
+        start = datetime.combine(date.fromisoformat(request.args["start"]), time.min) if "start" in request.args else None
+        end = datetime.combine(date.fromisoformat(request.args["end"]), time.max) if "end" in request.args else None
+    except ValueError:
+        abort(400, "start and end must be YYYY-MM-DD dates")
+    resolution = request.args.get("resolution", "day")
+
+    try:
+        result = net_worth_series(current_user.id, resolution, start, end, request.args.get("currency"))
+    except ValueError as e:
+        abort(400, str(e))
+    return jsonify({
+        "resolution": resolution,
+        "currency": result["currency"],
+        "currencies": result["currencies"],
+        "series": [{"at": point["at"].isoformat(), "net_worth": point["net_worth"]} for point in result["series"]],
+    })
@@ -1,14 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, current_app
+from flask import Blueprint, Flask, render_template, redirect, url_for, current_app
 from flask_login import login_required, current_user
 
-from models import db, Transaction
+from models import db
+from helpers import get_dashboard_stats
 
 main_bp = Blueprint('main', __name__)
 
 
-def get_all_routes() -> list[dict]:
+def get_all_routes(app: Flask) -> list[dict]:
+    """Every URL rule in the app, sorted. Built once by create_app, see init_route_list."""
     routes = []
-    for rule in current_app.url_map.iter_rules():
+    for rule in app.url_map.iter_rules():
         if rule.endpoint == 'static':
             continue
         routes.append({
@@ -20,6 +22,11 @@ def get_all_routes() -> list[dict]:
     return routes
 
 
+def init_route_list(app: Flask) -> None:
+    """Snapshot the route table once all blueprints are registered."""
+    app.extensions["route_list"] = get_all_routes(app)
+
+
 @main_bp.route("/")
 def landing():
     if current_user.is_authenticated:
@@ -30,18 +37,15 @@ def landing():
 @main_bp.route("/dashboard")
 @login_required
 def home():
-    all_routes = get_all_routes()
-
-    total_tx = Transaction.query.for_current_user().count()
-    uncategorised_tx = Transaction.query.for_current_user().filter(
-        Transaction.category_id.is_(None)
-    ).count()
+    stats = get_dashboard_stats(current_user.id)
 
     return render_template(
         "home.html",
-        routes=all_routes,
-        total_tx=total_tx,
-        uncategorised_tx=uncategorised_tx,
+        routes=current_app.extensions["route_list"],
+        total_tx=stats["total"],
+        uncategorised_tx=stats["uncategorised"],
+        account_counts=stats["accounts"],
+        last_import_at=stats["last_import_at"],
     )
 
 
@@ -1,12 +1,18 @@
 from datetime import datetime
 
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
 
-from models import db, Transaction, PlaidItem, Account, AccountBalance
-from plaid_client import create_link_token, exchange_public_token, sync_transactions, get_balances
+from models import db, PlaidItem, Account
+from plaid_client import create_link_token, exchange_public_token
 
-from helpers import build_transactions_from_plaid, save_transactions
+from balances import ACCOUNTS_WITH_BALANCES, compact_balances, record_balance
+from helpers import (
+    build_transactions_from_plaid, bulk_insert_transactions, delete_plaid_transactions, update_plaid_transactions,
+)
+from ledger import record_import
+from plaid_sync import stream_items
 
 plaid_bp = Blueprint('plaid', __name__)
 
@@ -56,51 +62,77 @@ def plaid_exchange():
 def plaid_sync():
     """Sync transactions for all linked banks for the current user.
     If item_id is passed in the form, only syncs that specific bank.
+    Banks are fetched from Plaid concurrently (plaid_sync.stream_items) and saved a
+    page at a time, committing with the bank's cursor moved past each page, so an
+    interrupted sync picks up where it stopped. A bank that fails or times out is
+    reported on its own and the others are still saved.
     """
     item_id = request.form.get("item_id", type=int)
     if item_id:
-        item = PlaidItem.query.filter_by(user_id=current_user.id, id=item_id).first()
+        item = PlaidItem.query.filter_by(user_id=current_user.id, id=item_id).options(selectinload(PlaidItem.accounts)).first()
         items = [item] if item else []
     else:
-        items = PlaidItem.query.filter_by(user_id=current_user.id).all()
-
-    total_added = 0
-    total_removed = 0
-
-    try:
-        for item in items:
-            account_map = {a.plaid_account_id: a.id for a in item.accounts}     # now maps to id
-            added, removed, next_cursor = sync_transactions(item)
-            transactions = build_transactions_from_plaid(added, account_map, current_user.id)
-            save_transactions(transactions)
-            balances = get_balances(item)
-
-            for b in balances:
-                db_id = account_map.get(b['plaid_account_id'])           
-                
+        items = PlaidItem.query.filter_by(user_id=current_user.id).options(selectinload(PlaidItem.accounts)).all()
+
+    # Plain lookups, so nothing below depends on ORM state a rolled-back page expires
+    user_id = current_user.id
+    items_by_id = {item.id: item for item in items}
+    account_maps = {item.id: {a.plaid_account_id: a.id for a in item.accounts} for item in items}
+    account_names = {item.id: {a.plaid_account_id: a.name for a in item.accounts} for item in items}
+    added = dict.fromkeys(items_by_id, 0)
+    modified = dict.fromkeys(items_by_id, 0)
+    removed = dict.fromkeys(items_by_id, 0)
+    failed = set()
+    synced = 0
+
+    pages = stream_items(items, current_app.config["PLAID_SYNC_WORKERS"], current_app.config["PLAID_SYNC_TIMEOUT"],
+                         current_app.config["PLAID_SYNC_QUEUE_PAGES"])
+    for status, page in pages:
+        item = items_by_id[status.item_id]
+        if status.item_id in failed:
+            continue
+        try:
+            if page is not None:
+                # Save the page and checkpoint the cursor past it in one commit
+                transactions = build_transactions_from_plaid(
+                    page.added, account_maps[status.item_id], user_id, account_names[status.item_id])
+                inserted = bulk_insert_transactions(transactions, skip_duplicates=True, dedup_key="plaid_transaction_id")
+                updated = update_plaid_transactions(user_id, page.modified)
+                removed_ids = [r["transaction_id"] for r in page.removed]
+                deleted = delete_plaid_transactions(user_id, removed_ids)
+                item.cursor = page.next_cursor
+                db.session.commit()
+                added[status.item_id] += len(inserted)
+                modified[status.item_id] += updated
+                removed[status.item_id] += deleted
+                continue
+
+            if not status.ok:
+                flash(f"{status.institution_name}: sync failed after {status.seconds:.1f}s "
+                      f"({status.pages} pages saved): {status.error}", "danger")
+                continue
+            for b in status.balances:
+                db_id = account_maps[status.item_id].get(b['plaid_account_id'])
                 if db_id:
-                    snapshot = AccountBalance(
-                        account_id=db_id,
-                        current_balance=b['current'],
-                        recorded_at=datetime.utcnow(),
-                    )
-                    db.session.add(snapshot)
-            
-            total_added += len(transactions)
-
-            removed_ids = [r["transaction_id"] for r in removed]
-            if removed_ids:
-                deleted = Transaction.query.filter(
-                    Transaction.plaid_transaction_id.in_(removed_ids),
-                    Transaction.user_id == current_user.id
-                ).delete(synchronize_session=False)
-                total_removed += deleted
-
-            item.cursor = next_cursor
+                    record_balance(db_id, b['current'])
             item.last_synced_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            failed.add(status.item_id)
+            flash(f"{status.institution_name}: saving failed after {status.pages} pages: {e}", "danger")
+            continue
+        synced += 1
+        flash(f"{status.institution_name}: {added[status.item_id]} added, {modified[status.item_id]} updated, "
+              f"{removed[status.item_id]} removed ({status.seconds:.1f}s)", "info")
 
+    try:
+        if synced or any(added.values()) or any(modified.values()) or any(removed.values()):
+            record_import(user_id)
+            compact_balances([a_id for accounts in account_maps.values() for a_id in accounts.values()])
         db.session.commit()
-        flash(f"Synced: {total_added} added, {total_removed} removed.", "success")
+        flash(f"Synced {synced} of {len(items)} banks: {sum(added.values())} added, {sum(modified.values())} updated, "
+              f"{sum(removed.values())} removed.", "success" if synced == len(items) else "warning")
 
     except Exception as e:
         db.session.rollback()
@@ -113,7 +145,7 @@ def plaid_sync():
 @login_required
 def plaid_accounts():
     """Show all linked bank accounts."""
-    items = PlaidItem.query.filter_by(user_id=current_user.id).all()
+    items = PlaidItem.query.filter_by(user_id=current_user.id).options(ACCOUNTS_WITH_BALANCES).all()
     return render_template("plaid_accounts.html", items=items)
 
 
@@ -1,20 +1,27 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
-from models import db, Transaction, Account
+from models import db, Transaction, Category, Account, ImportBatch, ImportJob
 from helpers import (
     get_all_category_names,
     build_claude_payload,
-    load_uploaded_csv,
-    build_transactions_from_df,
-    save_transactions,
+    get_uploaded_file,
+    import_csv_stream,
+    preview_csv_import,
+    keyset_page,
+    count_transactions,
 )
-from parsers import parse_standard_csv
+from import_jobs import should_run_in_background, enqueue_import, job_status
 
 from claude_client import categorise_with_claude
 
 transactions_bp = Blueprint('transactions', __name__)
 
+# Loads category and parent names in the same SELECT, so t.category (full_path)
+# doesn't cost two lazy loads per row when a list is rendered
+WITH_CATEGORY_PATHS = joinedload(Transaction.category_obj).joinedload(Category.parent)
+
 @transactions_bp.route("/upload-csv", methods=["GET", "POST"])
 @login_required
 def upload_csv():
@@ -22,6 +29,9 @@ def upload_csv():
     - GET  -> show the HTML form so the user can choose a CSV file
     - POST -> receive the uploaded file, parse it, and store transactions
               in an all-or-nothing way (one bad row = nothing saved).
+              Large files are handed to a background import job instead.
+              Rows already imported (same fingerprint) are skipped; with the
+              dry_run box ticked nothing is saved, only new/duplicate counts shown.
     """
     if request.method == "GET":
         accounts = Account.query.filter_by(user_id=current_user.id, account_type='manual', status='active').all()
@@ -29,17 +39,25 @@ def upload_csv():
 
 
     try:
-        df = load_uploaded_csv(request)
+        file = get_uploaded_file(request)
         account_id = request.form.get("account_id", type=int)
         account = Account.query.filter_by(id=account_id, user_id=current_user.id).first_or_404()
-        standard_df = parse_standard_csv(df, account.invert_amounts)
-        created_transactions = build_transactions_from_df(standard_df, current_user.id, account.id, account.name)
 
+        if request.form.get("dry_run"):
+            preview = preview_csv_import(file.stream, account)
+            accounts = Account.query.filter_by(user_id=current_user.id, account_type='manual', status='active').all()
+            return render_template("upload.html", accounts=accounts, preview=preview)
 
-        save_transactions(created_transactions)
+        # Big files would hold this worker for too long — import them in the background
+        if should_run_in_background(file):
+            job = enqueue_import(file, account, current_user.id)
+            flash(f"Importing {job.filename} in the background.")
+            return redirect(url_for("transactions.import_status_view", job_id=job.id))
 
-        last_ids = [tx.id for tx in created_transactions]
-        session["last_upload_ids"] = last_ids
+        # Parsed and inserted chunk by chunk, inside one transaction (all-or-nothing)
+        batch = import_csv_stream(file.stream, account, current_user.id, filename=file.filename)
+        session["last_import_batch_id"] = batch.id
+        session.pop("last_upload_ids", None)  # pre-batch sessions carried every ID in the cookie
 
     except ValueError as e:
         accounts = Account.query.filter_by(user_id=current_user.id, account_type='manual', status='active').all()
@@ -48,36 +66,79 @@ def upload_csv():
         accounts = Account.query.filter_by(user_id=current_user.id, account_type='manual', status='active').all()
         return render_template("upload.html", accounts=accounts, message=f"Error processing CSV: {e}")
 
-    message = f"Successfully imported {len(created_transactions)} transactions."
+    message = f"Successfully imported {batch.row_count} transactions."
+    if batch.duplicate_count:
+        message += f" Skipped {batch.duplicate_count} already imported."
     flash(message)
-    return redirect(url_for("transactions.review_last_upload"))
+    if not batch.row_count:
+        return redirect(url_for("transactions.list_uploads"))
+    return redirect(url_for("transactions.review_upload", batch_id=batch.id))
+
+
+@transactions_bp.route("/imports/<int:job_id>")
+@login_required
+def import_status(job_id):
+    """JSON status of a background import: rows processed, rows per second, errors."""
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job_status(job))
+
+
+@transactions_bp.route("/imports/<int:job_id>/view")
+@login_required
+def import_status_view(job_id):
+    """HTML page that polls the import status until the job finishes."""
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return render_template("import_status.html", job=job)
 
 
 @transactions_bp.route("/review-last-upload", methods=["GET"])
 @login_required
 def review_last_upload():
     """Show the transactions from the most recent upload."""
-    last_ids = session.get("last_upload_ids")
+    batch_id = session.get("last_import_batch_id")
 
-    if not last_ids:
+    if not batch_id:
         flash("No recent upload to review.")
         return redirect(url_for("main.home"))
 
+    return redirect(url_for("transactions.review_upload", batch_id=batch_id))
+
+
+@transactions_bp.route("/uploads")
+@login_required
+def list_uploads():
+    """List past CSV uploads, newest first, each linking to its review page."""
+    batches = (
+        ImportBatch.query.filter_by(user_id=current_user.id)
+        .order_by(ImportBatch.created_at.desc(), ImportBatch.id.desc())
+        .all()
+    )
+    return render_template("uploads.html", batches=batches)
+
+
+@transactions_bp.route("/uploads/<int:batch_id>/review", methods=["GET"])
+@login_required
+def review_upload(batch_id):
+    """Show the transactions from one upload so their categories can be checked."""
+    batch = ImportBatch.query.filter_by(id=batch_id, user_id=current_user.id).first_or_404()
+
     transactions = (
         Transaction.query.for_current_user()
-        .filter(Transaction.id.in_(last_ids))
+        .options(WITH_CATEGORY_PATHS)
+        .filter(Transaction.batch_id == batch.id)
         .order_by(Transaction.date.desc(), Transaction.id.desc())
         .all()
     )
 
     if not transactions:
-        flash("No transactions found for the last upload.")
+        flash("No transactions found for this upload.")
         return redirect(url_for("main.home"))
 
     category_names = get_all_category_names()
 
     return render_template(
         "review_last_upload.html",
+        batch=batch,
         transactions=transactions,
         category_names=category_names
     )
@@ -87,16 +148,17 @@ def review_last_upload():
 @login_required
 def update_categories():
     """
-    Update categories for the transactions in the last upload.
+    Update categories for the transactions in one upload (batch_id form field).
     Optionally send remaining uncategorised ones to Claude.
     """
-    last_ids = session.get("last_upload_ids")
-    if not last_ids:
+    batch_id = request.form.get("batch_id", type=int)
+    batch = ImportBatch.query.filter_by(id=batch_id, user_id=current_user.id).first()
+    if not batch:
         flash("No recent upload to update.")
         return redirect(url_for("transactions.upload_csv"))
 
     transactions = Transaction.query.for_current_user().filter(
-        Transaction.id.in_(last_ids)
+        Transaction.batch_id == batch.id
     ).all()
 
     for tx in transactions:
@@ -114,7 +176,7 @@ def update_categories():
         uncats = [t for t in transactions if t.category is None]
         if not uncats:
             flash("No uncategorised transactions to send to Claude.")
-            return redirect(url_for("transactions.review_last_upload"))
+            return redirect(url_for("transactions.review_upload", batch_id=batch_id))
 
         txs = []
         for t in uncats:
@@ -122,7 +184,7 @@ def update_categories():
                 {
                     "id": t.id,
                     "date": t.date.isoformat() if t.date else None,
-                    "amount": t.amount,
+                    "amount": float(t.amount),
                     "description": t.description,
                     "account": t.account,
                 }
@@ -145,53 +207,83 @@ def update_categories():
             tx.category = None
         db.session.commit()
         flash("All categories reset to Uncategorised.")
-        return redirect(url_for("transactions.review_last_upload"))
+        return redirect(url_for("transactions.review_upload", batch_id=batch_id))
 
     else:
         flash("Categories updated.")
 
-    return redirect(url_for("transactions.review_last_upload"))
+    return redirect(url_for("transactions.review_upload", batch_id=batch_id))
 
 
 @transactions_bp.route('/transactions')
 @login_required
 def list_transactions():
-    """HTML view: shows all transactions in a table (newest first)."""
-    all_tx = Transaction.query.for_current_user().order_by(Transaction.date.desc()).all()
-    return render_template('transactions.html', transactions=all_tx)
+    """HTML view: one page of transactions (newest first). ?before=<cursor> for older pages."""
+    cursor = request.args.get("before")
+    page, next_cursor = keyset_page(
+        Transaction.query.for_current_user().options(WITH_CATEGORY_PATHS),
+        cursor,
+        request.args.get("limit", type=int),
+    )
+    return render_template(
+        'transactions.html',
+        transactions=page,
+        total=count_transactions(current_user.id),
+        cursor=cursor,
+        next_cursor=next_cursor,
+    )
 
 
 @transactions_bp.route('/uncategorised')
 @login_required
 def uncategorised_transactions():
-    """Returns all transactions that are not yet categorised (JSON)."""
-    uncats = Transaction.query.for_current_user().filter(
-        Transaction.category_id.is_(None)
-    ).order_by(Transaction.date.desc()).all()
+    """
+    Returns one page of transactions that are not yet categorised (JSON):
+    {"transactions": [...], "next_cursor": ..., "total": ...}. Pass next_cursor
+    back as ?before= to get the following page.
+    """
+    uncats, next_cursor = keyset_page(
+        Transaction.query.for_current_user().filter(Transaction.category_id.is_(None)),
+        request.args.get("before"),
+        request.args.get("limit", type=int),
+    )
 
     result = []
     for t in uncats:
         result.append({
             'id': t.id,
             'date': t.date.isoformat() if t.date else None,
-            'amount': t.amount,
+            'amount': float(t.amount),
             'description': t.description,
             'account': t.account,
             'category': t.category,
         })
 
-    return jsonify(result)
+    return jsonify({
+        'transactions': result,
+        'next_cursor': next_cursor,
+        'total': count_transactions(current_user.id, uncategorised=True),
+    })
 
 
 @transactions_bp.route('/uncategorised-view')
 @login_required
 def uncategorised_view():
-    """HTML page showing uncategorised transactions in a table."""
-    uncats = Transaction.query.for_current_user().filter(
-        Transaction.category_id.is_(None)
-    ).order_by(Transaction.date.desc()).all()
+    """HTML page showing one page of uncategorised transactions in a table."""
+    cursor = request.args.get("before")
+    uncats, next_cursor = keyset_page(
+        Transaction.query.for_current_user().filter(Transaction.category_id.is_(None)),
+        cursor,
+        request.args.get("limit", type=int),
+    )
 
-    return render_template('uncategorised.html', transactions=uncats)
+    return render_template(
+        'uncategorised.html',
+        transactions=uncats,
+        total=count_transactions(current_user.id, uncategorised=True),
+        cursor=cursor,
+        next_cursor=next_cursor,
+    )
 
 
 @transactions_bp.route("/categorise-batch")
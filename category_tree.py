@@ -0,0 +1,165 @@
+"""
+Category hierarchy as a closure table, plus spending rollups over it.
+
+category_closure holds one row per (ancestor, descendant) pair, so "this category
+and everything under it" is a single indexed join instead of a walk up or down
+parent_id in Python. The after_flush listener at the bottom of this module keeps
+it in step with Category inserts, re-parenting and deletes; rebuild_category_closure
+recomputes it from parent_id with one recursive query.
+"""
+from datetime import date
+
+from sqlalchemy import delete, event, func, inspect, literal, select, true, union_all
+from sqlalchemy.orm import Session
+
+from models import db, ledger_currencies, Category, CategoryClosure, Transaction
+from money import DEFAULT_CURRENCY, minor_to_float
+
+
+def rebuild_category_closure(user_id: int | None = None) -> None:
+    """Recompute category_closure from category.parent_id (one user, or everyone)."""
+    cat = Category.__table__
+    closure = CategoryClosure.__table__
+
+    roots = select(
+        cat.c.id.label("ancestor_id"), cat.c.id.label("descendant_id"), literal(0).label("depth")
+    )
+    clear = delete(closure)
+    if user_id is not None:
+        roots = roots.where(cat.c.user_id == user_id)
+        clear = clear.where(closure.c.ancestor_id.in_(select(cat.c.id).where(cat.c.user_id == user_id)))
+
+    tree = roots.cte("tree", recursive=True)
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, cat.c.id, tree.c.depth + 1).where(cat.c.parent_id == tree.c.descendant_id)
+    )
+
+    db.session.execute(clear)
+    db.session.execute(
+        closure.insert().from_select(["ancestor_id", "descendant_id", "depth"], select(tree))
+    )
+
+
+def category_rollup(
+    user_id: int, start: date, end: date, parent_id: int | None = None, currency: str | None = None,
+) -> list[dict]:
+    """
+    Net spend for start <= date <= end per category at one level of the tree, each
+    total including all of its subcategories. parent_id=None gives the top-level
+    categories; pass a category id to drill into its children. Only transactions in
+    currency (default: the user's most used) are summed.
+
+    One aggregate over transaction ⋈ category_closure ⋈ category.
+    Returns [{"category_id", "name", "total"}], biggest total first.
+    """
+    currency = (currency or next(iter(ledger_currencies(user_id)), DEFAULT_CURRENCY)).upper()
+    tx = Transaction.__table__
+    closure = CategoryClosure.__table__
+    cat = Category.__table__
+
+    level = cat.c.parent_id.is_(None) if parent_id is None else cat.c.parent_id == parent_id
+    total = func.sum(tx.c.amount_minor).label("total")
+    rows = db.session.execute(
+        select(cat.c.id, cat.c.name, total)
+        .select_from(
+            cat.join(closure, closure.c.ancestor_id == cat.c.id)
+            .join(tx, tx.c.category_id == closure.c.descendant_id)
+        )
+        .where(
+            cat.c.user_id == user_id,
+            level,
+            tx.c.user_id == user_id,
+            tx.c.currency == currency,
+            tx.c.date >= start,
+            tx.c.date <= end,
+        )
+        .group_by(cat.c.id, cat.c.name)
+        .order_by(total.desc(), cat.c.id)
+    )
+    return [{"category_id": i, "name": name, "total": minor_to_float(t, currency)} for i, name, t in rows]
+
+
+def _subtree(category_id: int):
+    """SELECT of the ids in category_id's subtree (itself included)."""
+    closure = CategoryClosure.__table__
+    return select(closure.c.descendant_id).where(closure.c.ancestor_id == category_id)
+
+
+def _link(conn, category_id: int, parent_id: int | None) -> None:
+    """Closure rows for a new leaf: itself, plus every ancestor of its parent one level further down."""
+    closure = CategoryClosure.__table__
+    rows = select(literal(category_id), literal(category_id), literal(0))
+    if parent_id is not None:
+        rows = union_all(
+            rows,
+            select(closure.c.ancestor_id, literal(category_id), closure.c.depth + 1)
+            .where(closure.c.descendant_id == parent_id),
+        )
+    conn.execute(closure.insert().from_select(["ancestor_id", "descendant_id", "depth"], rows))
+
+
+def _move(conn, category_id: int, parent_id: int | None) -> None:
+    """Re-hang category_id's whole subtree under parent_id."""
+    closure = CategoryClosure.__table__
+    subtree = _subtree(category_id)
+
+    if parent_id is not None and conn.execute(
+        subtree.where(closure.c.descendant_id == parent_id)
+    ).first():
+        raise ValueError("A category can't be moved under one of its own subcategories.")
+
+    # Cut the subtree loose from its old ancestors...
+    conn.execute(
+        delete(closure).where(
+            closure.c.descendant_id.in_(subtree.scalar_subquery()),
+            closure.c.ancestor_id.notin_(subtree.scalar_subquery()),
+        )
+    )
+    if parent_id is None:
+        return
+
+    # ...then join every new ancestor to every node in it
+    above = closure.alias("above")
+    below = closure.alias("below")
+    conn.execute(closure.insert().from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+        .select_from(above.join(below, true()))  # cross join: (new ancestors) × (subtree)
+        .where(above.c.descendant_id == parent_id, below.c.ancestor_id == category_id),
+    ))
+
+
+def _parent_changed(category: Category) -> bool:
+    attrs = inspect(category).attrs
+    return attrs.parent_id.history.has_changes() or attrs.parent.history.has_changes()
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_closure(session, flush_context):
+    """Mirror Category inserts, parent changes and deletes into category_closure."""
+    new = [obj for obj in session.new if isinstance(obj, Category)]
+    moved = [obj for obj in session.dirty if isinstance(obj, Category) and _parent_changed(obj)]
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Category)]
+    if not (new or moved or deleted):
+        return
+
+    conn = session.connection()
+    closure = CategoryClosure.__table__
+
+    if deleted:
+        conn.execute(delete(closure).where(
+            closure.c.ancestor_id.in_(deleted) | closure.c.descendant_id.in_(deleted)
+        ))
+
+    # Parents before children when a whole branch is added in one flush
+    pending = {obj.id: obj for obj in new}
+    while pending:
+        ready = [obj for obj in pending.values() if obj.parent_id not in pending]
+        if not ready:
+            raise ValueError("New categories can't be each other's parents.")
+        for obj in ready:
+            _link(conn, obj.id, obj.parent_id)
+            del pending[obj.id]
+
+    for obj in moved:
+        _move(conn, obj.id, obj.parent_id)
@@ -1,82 +1,245 @@
 # Standard library
 from collections import Counter
-import re
+from collections.abc import Callable, Iterator
+from datetime import date, datetime
+import codecs
+import hashlib
 
 # Third‑party
 import pandas as pd
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import bindparam, delete, func, insert, or_, select, tuple_, update
 
 # Local
-from models import db, Transaction, Category
-from parsers import parse_standard_csv
+from ledger import (
+    LEDGER_COLUMNS, descriptions_renormalised, next_month, record_import,
+    rows_deleted, rows_inserted, rows_updated,
+)
+from models import (
+    db, category_ids_by_name, category_paths_by_id, dialect_insert, ledger_currencies,
+    Account, Transaction, MerchantCategoryStat, ImportBatch, MonthlyCategoryTotal, UserStats, UserAccountStat,
+)
+from money import DEFAULT_CURRENCY, format_minor_series, minor_exponent, minor_to_float, to_minor
+from normaliser import NORMALISER_VERSION, normalise_description, normalise_series
+from parsers import detect_format, read_csv_chunks, read_header
 
 
 # Only allow CSV files for now
 ALLOWED_EXTENSIONS = {'csv'}
 
+# Rows per INSERT statement when bulk-saving transactions (overridable via app config)
+DEFAULT_BULK_INSERT_CHUNK_SIZE = 1000
+
+# Plaid transaction ids per UPDATE/DELETE in update_plaid_transactions / delete_plaid_transactions
+PLAID_WRITE_CHUNK_SIZE = 500
+
+# ON CONFLICT targets for bulk_insert_transactions(skip_duplicates=True), by dedup_key
+DEDUP_CONFLICT_TARGETS = {
+    "fingerprint": {"index_elements": [Transaction.__table__.c.fingerprint]},
+    "plaid_transaction_id": {
+        "index_elements": [Transaction.__table__.c.user_id, Transaction.__table__.c.plaid_transaction_id],
+        "index_where": Transaction.__table__.c.plaid_transaction_id.isnot(None),
+    },
+}
+
+# Rows parsed and inserted per chunk by import_csv_stream (overridable via app config)
+DEFAULT_CSV_CHUNK_ROWS = 10_000
+
+# Transactions per page on the list views (overridable via app config / ?limit=)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Max values per IN (...) list — keeps lookups under SQLite's bound-parameter limit
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Columns written by the bulk insert path — every row dict must carry the same keys
+TRANSACTION_INSERT_COLUMNS = (
+    "user_id",
+    "category_id",
+    "date",
+    "amount_minor",
+    "currency",
+    "description",
+    "account",
+    "created_at",
+    "normalised_description",
+    "normaliser_version",
+    "plaid_transaction_id",
+    "account_id",
+    "batch_id",
+    "fingerprint",
+)
+
 def allowed_file(filename: str) -> bool:
     """
     Helper function: checks that the uploaded file has a .csv extension.
     """
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def normalise_description(description: str) -> str:
+def guess_categories_from_history(normalised_descriptions, user_id: int) -> dict[str, int]:
     """
-    Try to strip variable parts (like dates) from merchant descriptions
-    so 'BUTTERNUT BOX ON 01 FEB BCC' becomes 'BUTTERNUT BOX'.
-    This is a simple heuristic; we can refine it later.
+    Batched history lookup for an import: given the normalised descriptions of every
+    incoming row, return {normalised_description: category_id} using the category the
+    user has picked most often for that description (ties go to the lowest category id).
+    Descriptions with no categorised history are left out of the map.
+
+    Reads the running counts in merchant_category_stats (primary-key lookups), so the
+    cost does not grow with the size of the user's ledger.
     """
-    if not description:
-        return ""
+    wanted = sorted({d for d in normalised_descriptions if d})
+    if not wanted:
+        return {}
+
+    stats = MerchantCategoryStat.__table__
+    best = {}  # description -> (count, category_id)
+    for start in range(0, len(wanted), IN_CLAUSE_CHUNK_SIZE):
+        chunk = wanted[start:start + IN_CLAUSE_CHUNK_SIZE]
+        rows = db.session.execute(
+            select(stats.c.normalised_description, stats.c.category_id, stats.c.count)
+            .where(stats.c.user_id == user_id, stats.c.normalised_description.in_(chunk))
+        )
+        for description, category_id, count in rows:
+            current = best.get(description)
+            if current is None or (count, -category_id) > (current[0], -current[1]):
+                best[description] = (count, category_id)
 
-    # Collapse multiple spaces
-    text = " ".join(description.split())
+    return {description: category_id for description, (_, category_id) in best.items()}
 
-    # Remove patterns like 'ON 01 FEB', 'ON 12 MAR', etc. (rough heuristic)
-    text = re.sub(r"\bON\s+\d{1,2}\s+[A-Z]{3}\b", "", text)
+def get_all_category_names() -> list[str]:
+    """
+    Return a list of all category names currently in the database, for display in dropdowns.
+    Shares the per-request cache used by the Transaction.category setter.
+    """
+    return sorted(category_ids_by_name(current_user.id))
 
-    # Strip trailing 'BCC', 'POS', etc. (add more as you discover patterns)
-    text = re.sub(r"\b(BCC|POS|DD|CARD)\b$", "", text)
+def encode_cursor(tx: Transaction) -> str:
+    """Opaque-ish keyset cursor for a row: '2024-01-31_1234' (date, then id)."""
+    return f"{tx.date.isoformat()}_{tx.id}"
 
-    # Remove date patterns like 12/01/2024, 01-02-2024
-    text = re.sub(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", "", text)
 
-    # Remove REF: patterns like REF:123456789
-    text = re.sub(r"\bREF:\d+\b", "", text)
+def decode_cursor(cursor: str | None) -> tuple[date, int] | None:
+    """Parse a cursor from encode_cursor. Missing or malformed cursors mean 'first page'."""
+    try:
+        day, tx_id = cursor.split("_")
+        return date.fromisoformat(day), int(tx_id)
+    except (AttributeError, ValueError):
+        return None
 
-    # Final cleanup: collapse spaces again and uppercase for consistent matching
-    text = " ".join(text.split()).upper()
 
-    return text
+def keyset_page(query, cursor: str | None = None, limit: int | None = None) -> tuple[list, str | None]:
+    """
+    One page of a Transaction query, newest first on (date DESC, id DESC), starting
+    just after cursor. Returns (transactions, next_cursor); next_cursor is None on
+    the last page. Seeks straight to the cursor via the (user_id, date, id) index,
+    so deep pages cost the same as the first one.
+    """
+    if limit is None:
+        limit = current_app.config.get("TRANSACTIONS_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
 
-def guess_category_from_history(description: str, user_id: int) -> str | None:
-    norm = normalise_description(description)
-    if not norm:
-        return None
+    after = decode_cursor(cursor)
+    if after:
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < after)
 
-    rows = (
-        Transaction.query
-        .filter(
-            Transaction.normalised_description == norm,
-            Transaction.category_id.isnot(None),
-            Transaction.user_id == user_id
-        )
-        .all()
-    )
+    # One extra row tells us whether there is a next page
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
 
-    if not rows:
-        return None
 
-    counts = Counter(t.category for t in rows if t.category)
-    if not counts:
-        return None
+def count_transactions(user_id: int, uncategorised: bool = False) -> int:
+    """
+    How many transactions the user has, optionally only uncategorised ones, read
+    from the user_stats counters (one row by primary key) rather than a COUNT(*)
+    over the ledger. Users with no transactions yet get 0.
+    """
+    column = UserStats.uncategorised_count if uncategorised else UserStats.total_count
+    return db.session.scalar(select(column).where(UserStats.user_id == user_id)) or 0
 
-    return counts.most_common(1)[0][0]
 
-def get_all_category_names() -> list[str]:
+def get_dashboard_stats(user_id: int) -> dict:
     """
-    Return a list of all category names currently in the database, for display in dropdowns.
+    The user's dashboard counters from user_stats, with per-account counts, in one
+    query keyed on user_id. Users with no transactions yet get zeros.
+    """
+    rows = db.session.execute(
+        select(
+            UserStats.total_count, UserStats.uncategorised_count, UserStats.last_import_at,
+            Account.name, UserAccountStat.count,
+        )
+        .select_from(UserStats)
+        .outerjoin(UserAccountStat, UserAccountStat.user_id == UserStats.user_id)
+        .outerjoin(Account, Account.id == UserAccountStat.account_id)
+        .where(UserStats.user_id == user_id)
+        .order_by(Account.name)
+    ).all()
+    if not rows:
+        return {"total": 0, "uncategorised": 0, "last_import_at": None, "accounts": []}
+
+    total, uncategorised, last_import_at = rows[0][:3]
+    return {
+        "total": total,
+        "uncategorised": uncategorised,
+        "last_import_at": last_import_at,
+        "accounts": [{"name": name, "count": count} for *_, name, count in rows if name is not None],
+    }
+
+
+def monthly_spend_matrix(
+    user_id: int, start: date, end: date, account_id: int | None = None, currency: str | None = None,
+) -> dict:
+    """
+    Spend per category per month for the months start..end (inclusive), read from
+    the monthly_category_totals rollup only; the write path keeps its min/max
+    current, so this never reads the transaction table and never writes.
+    account_id narrows it to one account; categories are named by their full path
+    and category 0 is "Uncategorised". Amounts are in one currency, the user's most
+    used unless currency is given, since totals in different currencies can't be
+    added together.
+
+    Returns {"currency", "currencies": [every currency the user has], "months":
+    ["YYYY-MM", ...], "categories": [{"category_id", "name", "total",
+    "cells": {"YYYY-MM": {"total", "count", "min", "max"}}}]}, biggest spender first.
     """
-    return [c.name for c in Category.query.for_current_user().order_by(Category.name).all()]
+    currencies = ledger_currencies(user_id)
+    currency = (currency or next(iter(currencies), DEFAULT_CURRENCY)).upper()
+    mt = MonthlyCategoryTotal.__table__
+    filters = [mt.c.user_id == user_id, mt.c.currency == currency,
+               mt.c.month >= start.replace(day=1), mt.c.month <= end]
+    if account_id is not None:
+        filters.append(mt.c.account_id == account_id)
+    rows = db.session.execute(
+        select(mt.c.month, mt.c.category_id, func.sum(mt.c.total_minor), func.sum(mt.c.count),
+               func.min(mt.c.min_minor), func.max(mt.c.max_minor))
+        .where(*filters)
+        .group_by(mt.c.month, mt.c.category_id)
+    ).all()
+
+    names = {0: "Uncategorised", **category_paths_by_id(user_id)}
+    categories = {}
+    for month, category_id, total, count, low, high in rows:
+        entry = categories.setdefault(category_id, {
+            "category_id": category_id or None, "name": names.get(category_id), "total": 0, "cells": {},
+        })
+        entry["total"] += total
+        entry["cells"][month.strftime("%Y-%m")] = {
+            "total": minor_to_float(total, currency),
+            "count": count,
+            "min": minor_to_float(low, currency),
+            "max": minor_to_float(high, currency),
+        }
+
+    months, month = [], start.replace(day=1)
+    while month <= end:
+        months.append(month.strftime("%Y-%m"))
+        month = next_month(month)
+
+    ordered = sorted(categories.values(), key=lambda c: c["total"], reverse=True)
+    for entry in ordered:
+        entry["total"] = minor_to_float(entry["total"], currency)
+    return {"currency": currency, "currencies": currencies, "months": months, "categories": ordered}
+
 
 def build_claude_payload(transactions: list[Transaction]) -> list[dict]:
     """
@@ -88,16 +251,16 @@ def build_claude_payload(transactions: list[Transaction]) -> list[dict]:
             {
                 "id": t.id,
                 "date": t.date.isoformat() if t.date else None,
-                "amount": t.amount,
+                "amount": float(t.amount),
                 "description": t.description,
                 "account": t.account,
             }
         )
     return payload
 
-def load_uploaded_csv(request) -> pd.DataFrame:
+def get_uploaded_file(request):
     """
-    Validate the uploaded file and return a Pandas DataFrame.
+    Validate the uploaded file and return the werkzeug FileStorage.
     Raises ValueError with a user-friendly message on problems.
     """
     if "file" not in request.files:
@@ -111,103 +274,558 @@ def load_uploaded_csv(request) -> pd.DataFrame:
     if not allowed_file(file.filename):
         raise ValueError("Only .csv files are allowed")
 
-    # Try UTF-8, fall back to latin-1
+    return file
+
+def detect_csv_encoding(stream, block_size: int = 1 << 20) -> str:
+    """
+    Return 'utf-8-sig' if the whole stream decodes as UTF-8 (a leading BOM is
+    dropped), otherwise 'latin-1'.
+    Decodes block by block so memory stays bounded, then rewinds the stream.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
     try:
-        return pd.read_csv(file)
+        while block := stream.read(block_size):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8-sig"
     except UnicodeDecodeError:
-        file.stream.seek(0)
-        return pd.read_csv(file, encoding="latin-1")
-
-def build_transactions_from_df(standard_df: pd.DataFrame, user_id: int, account_id: int, account_name: str) -> list[Transaction]:
-    """
-    Turn the standardised DataFrame into a list of Transaction objects.
-    Uses guess_category_from_history to auto-fill category when possible.
-    Raises ValueError if any row is invalid.
-    """
-    created = []
-
-    for idx, row in standard_df.iterrows():
-        try:
-            description = str(row["Description"])
-            normalised = normalise_description(description)
-
-            tx = Transaction(
-                date=row["Date"],
-                amount=float(row["Amount"]),
-                description=description,
-                account=account_name,       # legacy string field (temporary)
-                account_id=account_id,      # new FK
-                normalised_description=normalised,
-                user_id=user_id,
-            )
+        return "latin-1"
+    finally:
+        stream.seek(0)
+
+def iter_csv_chunks(
+    stream, chunk_rows: int, invert_amounts: bool | None, currency: str = DEFAULT_CURRENCY,
+) -> Iterator[pd.DataFrame]:
+    """
+    Detect the bank format from the header row and yield the CSV as standardised
+    (Date, AmountMinor, Description) DataFrames of at most chunk_rows rows, amounts
+    in currency's minor units.
+    The row index carries on across chunks, so row numbers in errors stay file-wide.
+    """
+    encoding = detect_csv_encoding(stream)
+    fmt = detect_format(read_header(stream, encoding))
+    for chunk in read_csv_chunks(stream, fmt, fmt.encoding or encoding, chunk_rows):
+        yield fmt.parse(chunk, invert_amounts, currency)
+
+def transaction_row(**values) -> dict:
+    """
+    Build a plain row dict for bulk_insert_transactions.
+    Any insert column not passed in is filled with None; created_at defaults to now
+    and currency to GBP. An amount in major units may be passed instead of amount_minor.
+    """
+    row = dict.fromkeys(TRANSACTION_INSERT_COLUMNS)
+    amount = values.pop("amount", None)
+    row.update(values)
+    if row["currency"] is None:
+        row["currency"] = DEFAULT_CURRENCY
+    if amount is not None:
+        row["amount_minor"] = to_minor(amount, row["currency"])
+    if row["created_at"] is None:
+        row["created_at"] = datetime.utcnow()
+    return row
+
+
+def _describe_rows(row_numbers: list[int], limit: int = 10) -> str:
+    """Format row numbers for an error message: 'row 4' or 'rows 2, 5, 9 (and 3 more)'."""
+    shown = ", ".join(str(n) for n in row_numbers[:limit])
+    extra = f" (and {len(row_numbers) - limit} more)" if len(row_numbers) > limit else ""
+    return f"row{'s' if len(row_numbers) > 1 else ''} {shown}{extra}"
+
+
+def build_transactions_from_df(
+    standard_df: pd.DataFrame,
+    user_id: int,
+    account_id: int,
+    account_name: str,
+    batch_id: int | None = None,
+    seen: Counter | None = None,
+    currency: str = DEFAULT_CURRENCY,
+) -> list[dict]:
+    """
+    Turn the standardised DataFrame into row dicts for save_transactions.
+    Works column by column: dates and amounts are validated as whole columns, and each
+    distinct description is normalised once.
+    Uses guess_categories_from_history to auto-fill category when possible.
+    Every row gets a content fingerprint; pass the same seen Counter for every chunk
+    of one file so occurrence ordinals carry across chunks.
+    Raises ValueError naming every invalid row.
+    """
+    dates, amounts, descriptions, normalised_col = _validated_columns(standard_df)
+    fingerprints = fingerprint_rows(account_id, dates, amounts, descriptions, seen, currency)
+
+    # One batched history lookup for the whole upload
+    guesses = guess_categories_from_history(normalised_col.unique(), user_id)
+
+    base = transaction_row(
+        user_id=user_id,
+        account=account_name,       # legacy string field (temporary)
+        account_id=account_id,      # new FK
+        batch_id=batch_id,          # the upload this row came from
+        currency=currency,
+        normaliser_version=NORMALISER_VERSION,
+    )
+    return [
+        {
+            **base,
+            "date": d,
+            "amount_minor": amount,
+            "description": description,
+            "normalised_description": norm,
+            "category_id": guesses.get(norm),  # reuse past categorisations
+            "fingerprint": fingerprint,
+        }
+        for d, amount, description, norm, fingerprint in zip(
+            dates.dt.date.tolist(), amounts.tolist(), descriptions.tolist(),
+            normalised_col.tolist(), fingerprints,
+        )
+    ]
 
-            # Try to reuse past categorizations
-            guessed = guess_category_from_history(description, user_id)
-            if guessed is not None:
-                tx.category = guessed
 
-            created.append(tx)
+def _validated_columns(standard_df: pd.DataFrame) -> tuple[pd.Series, pd.Series, pd.Series, pd.Series]:
+    """
+    Coerce and validate the Date/AmountMinor/Description columns of a standardised chunk.
+    Returns (dates, int64 minor-unit amounts, descriptions, normalised descriptions).
+    Raises ValueError naming every invalid row.
+    """
+    dates = pd.to_datetime(standard_df["Date"], errors="coerce")
+    amounts = standard_df["AmountMinor"].astype("Int64")
+    descriptions = standard_df["Description"].astype(str)
+
+    # Validate whole columns at once; row numbers come straight from the masks
+    problems = []
+    for mask, reason in (
+        (dates.isna().to_numpy(), "Invalid date"),
+        (amounts.isna().to_numpy(), "Invalid amount"),
+    ):
+        if mask.any():
+            row_numbers = (standard_df.index[mask] + 1).tolist()
+            problems.append(f"{reason} on {_describe_rows(row_numbers)}")
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    # Each distinct description is normalised once, then broadcast back to every row
+    return dates, amounts.astype("int64"), descriptions, normalise_series(descriptions)
+
+
+def fingerprint_rows(
+    account_id: int,
+    dates: pd.Series,
+    amounts: pd.Series,
+    descriptions: pd.Series,
+    seen: Counter | None = None,
+    currency: str | None = DEFAULT_CURRENCY,
+) -> list[str]:
+    """
+    Content fingerprint for each CSV row: SHA-256 of account, date, amount (int
+    minor units of the account's currency, written as major units to two decimal
+    places), description as it appears in the file (trimmed) and occurrence
+    ordinal. The ordinal numbers identical rows 1, 2, 3... so two genuine same-day
+    coffees stay distinct while a re-uploaded statement maps onto the rows already
+    stored. The raw description is used rather than the normalised one, so a
+    NORMALISER_VERSION bump doesn't change the fingerprints of new uploads.
+
+    seen holds how often each key has appeared in earlier chunks of the same file
+    and is updated in place.
+    """
+    if seen is None:
+        seen = Counter()
 
-        except Exception as e:
-            # Turn any row error into a clear message with the row number
-            raise ValueError(f"Upload failed on row {idx + 1}: {e}")
+    keys = (
+        dates.dt.strftime("%Y-%m-%d")
+        + "|" + _fingerprint_amounts(amounts, currency)
+        + "|" + descriptions.fillna("").astype(str).str.strip()
+    )
+    ordinals = keys.groupby(keys, sort=False).cumcount() + 1 + keys.map(seen).fillna(0).astype(int)
+    seen.update(keys.value_counts().to_dict())
 
-    return created
+    return [
+        hashlib.sha256(f"{account_id}|{key}|{ordinal}".encode()).hexdigest()
+        for key, ordinal in zip(keys.tolist(), ordinals.tolist())
+    ]
+
+
+def _fingerprint_amounts(amounts: pd.Series, currency: str | None) -> pd.Series:
+    """
+    Minor-unit amounts as the "12.50" / "1500.00" text the float column used to give
+    (major units, two decimal places, whatever the currency), so stored fingerprints
+    still match. Three-decimal currencies round half away from zero to two places.
+    """
+    exponent = minor_exponent(currency)
+    amounts = amounts.astype("int64")
+    if exponent <= 2:
+        hundredths = amounts * 10 ** (2 - exponent)
+    else:
+        step = 10 ** (exponent - 2)
+        rounded = (amounts.abs() + step // 2) // step
+        hundredths = rounded.where(amounts >= 0, -rounded)
+    return format_minor_series(hundredths)
+
+
+def existing_fingerprints(fingerprints: list[str]) -> set[str]:
+    """Return the subset of fingerprints already stored, looked up in IN-list chunks."""
+    column = Transaction.__table__.c.fingerprint
+    found = set()
+    for start in range(0, len(fingerprints), IN_CLAUSE_CHUNK_SIZE):
+        chunk = fingerprints[start:start + IN_CLAUSE_CHUNK_SIZE]
+        found.update(db.session.execute(select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def backfill_fingerprints(account_id: int | None = None, restamp: bool = False) -> int:
+    """
+    Fingerprint stored CSV rows that predate fingerprinting, one account at a time,
+    counting occurrence ordinals over the account's whole history in id order.
+    restamp=True recomputes every CSV row's fingerprint instead, for when the key
+    itself has changed; the account's old ones are cleared first so the unique
+    index never sees two rows swap fingerprints mid-update.
+    Commits after each account. Returns how many rows were fingerprinted.
+    """
+    table = Transaction.__table__
+    csv_rows = table.c.plaid_transaction_id.is_(None) & table.c.account_id.isnot(None)
+    todo_rows = csv_rows if restamp else csv_rows & table.c.fingerprint.is_(None)
+    if account_id is not None:
+        todo_rows = todo_rows & (table.c.account_id == account_id)
+
+    stamp = update(table).where(table.c.id == bindparam("b_id")).values(fingerprint=bindparam("b_fp"))
+
+    account_ids = db.session.execute(select(table.c.account_id).where(todo_rows).distinct()).scalars().all()
+    stamped = 0
+    for acct_id in account_ids:
+        currency = db.session.scalar(select(Account.currency).where(Account.id == acct_id))
+        # Ordinals count every CSV row the account already has, not just the unstamped ones
+        df = pd.DataFrame(
+            db.session.execute(
+                select(table.c.id, table.c.date, table.c.amount_minor,
+                       table.c.description, table.c.fingerprint)
+                .where(table.c.account_id == acct_id, table.c.plaid_transaction_id.is_(None))
+                .order_by(table.c.id)
+            ).all(),
+            columns=["id", "date", "amount_minor", "description", "fingerprint"],
+        )
+        df["new_fingerprint"] = fingerprint_rows(
+            acct_id, pd.to_datetime(df["date"]), df["amount_minor"], df["description"],
+            currency=currency,
+        )
+        if restamp:
+            db.session.execute(update(table).where(csv_rows, table.c.account_id == acct_id).values(fingerprint=None))
+            todo = df
+        else:
+            todo = df[df["fingerprint"].isna()]
+        db.session.execute(
+            stamp, [{"b_id": i, "b_fp": fp} for i, fp in zip(todo["id"].tolist(), todo["new_fingerprint"].tolist())]
+        )
+        db.session.commit()
+        stamped += len(todo)
+    return stamped
 
 
 def build_transactions_from_plaid(
     plaid_txs: list,
     account_map: dict[str, int],  # plaid_account_id → Account.id
-    user_id: int
-) -> list:
-    # Fetch all already-imported Plaid transaction IDs for this user
-    # This is our deduplication check — skip anything we've seen before
-    existing_ids = {
-        tx.plaid_transaction_id
-        for tx in Transaction.query.for_user(user_id)
-        .filter(Transaction.plaid_transaction_id.isnot(None)).all()
-    }
-
-    transactions = []
-    for pt in plaid_txs:
-        tx_id = pt["transaction_id"]
+    user_id: int,
+    account_names: dict[str, str] | None = None,  # plaid_account_id → Account.name
+) -> list[dict]:
+    """
+    Turn a page of Plaid transactions into row dicts for bulk_insert_transactions.
+    Transactions imported before (e.g. sync ran twice) aren't filtered out here:
+    save them with skip_duplicates=True, dedup_key="plaid_transaction_id" and the
+    unique index skips them, without loading the user's whole Plaid history.
+    """
+    normalised = [normalise_description(pt["name"]) for pt in plaid_txs]
 
-        # Skip if already imported (e.g. sync ran twice)
-        if tx_id in existing_ids:
-            continue
+    # One batched history lookup for the whole sync
+    guesses = guess_categories_from_history(normalised, user_id)
 
+    rows = []
+    for pt, norm in zip(plaid_txs, normalised):
         description = pt["name"]  # Plaid's merchant/description field
 
-        tx = Transaction(
+        rows.append(transaction_row(
             user_id=user_id,
             date=pt["date"],
             amount=pt["amount"],       # Positive = debit (same convention as CSV imports)
+            currency=pt.get("iso_currency_code") or DEFAULT_CURRENCY,
             description=description[:200],
             account_id=account_map.get(pt["account_id"]),
-            normalised_description=normalise_description(description),
-            plaid_transaction_id=tx_id,  # Store for future dedup
-        )
+            account=(account_names or {}).get(pt["account_id"], "Plaid")[:50],
+            normalised_description=norm,
+            normaliser_version=NORMALISER_VERSION,
+            plaid_transaction_id=pt["transaction_id"],  # Store for future dedup
+            category_id=guesses.get(norm),              # reuse past categorisations
+        ))
+
+    return rows
 
-        # Try to reuse past categorizations
-        guessed = guess_category_from_history(description, user_id)
-        if guessed is not None:
-            tx.category = guessed
 
-        transactions.append(tx)
+def renormalise_stale_descriptions(user_id: int | None = None, batch_size: int = 5000) -> int:
+    """
+    Re-run the normaliser over rows whose normalised_description was produced by an
+    older NORMALISER_VERSION (or by code that predates versioning), in id order,
+    committing after each batch. Returns how many rows were refreshed.
+    """
+    table = Transaction.__table__
+    stale = or_(table.c.normaliser_version.is_(None), table.c.normaliser_version != NORMALISER_VERSION)
+    if user_id is not None:
+        stale = stale & (table.c.user_id == user_id)
+
+    refresh = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(normalised_description=bindparam("b_norm"), normaliser_version=NORMALISER_VERSION)
+    )
 
-    return transactions
+    refreshed = 0
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            select(table.c.id, table.c.user_id, table.c.category_id,
+                   table.c.description, table.c.normalised_description)
+            .where(stale, table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not batch:
+            return refreshed
+
+        ids = [row["id"] for row in batch]
+        normalised = normalise_series(pd.Series([row["description"] for row in batch])).tolist()
+        db.session.execute(refresh, [{"b_id": i, "b_norm": n} for i, n in zip(ids, normalised)])
+
+        # Move merchant stats from the old keys to the new ones
+        descriptions_renormalised(batch, [{**row, "normalised_description": n} for row, n in zip(batch, normalised)])
+        db.session.commit()
 
+        refreshed += len(batch)
+        last_id = ids[-1]
 
 
-def save_transactions(transactions: list[Transaction]) -> None:
+def bulk_insert_transactions(
+    rows: list[dict],
+    chunk_size: int | None = None,
+    skip_duplicates: bool = False,
+    dedup_key: str = "fingerprint",
+) -> list[int]:
     """
-    Save a list of Transaction objects in an all-or-nothing way.
+    Insert plain row dicts into the transaction table, chunk_size rows per statement,
+    and return the new IDs in input order.
+
+    Each chunk goes out as a single multi-row INSERT ... RETURNING id (SQLAlchemy's
+    "insertmanyvalues"), so there is no per-object ORM flush. Does not commit —
+    the caller owns the transaction.
+
+    skip_duplicates=True adds ON CONFLICT ... DO NOTHING on dedup_key: rows whose
+    key is already stored are left out, and only the IDs of rows actually inserted
+    are returned. Every row must then carry that key. dedup_key is "fingerprint"
+    (CSV rows) or "plaid_transaction_id" (bank rows, unique per user through
+    idx_plaid_tx_user), so the database's unique index does the duplicate check
+    and its cost depends on the chunk, not on how many rows are already stored.
+    """
+    if not rows:
+        return []
+
+    if chunk_size is None:
+        chunk_size = current_app.config.get("BULK_INSERT_CHUNK_SIZE", DEFAULT_BULK_INSERT_CHUNK_SIZE)
+
+    table = Transaction.__table__
+    if skip_duplicates:
+        stmt = (
+            dialect_insert(table)
+            .on_conflict_do_nothing(**DEDUP_CONFLICT_TARGETS[dedup_key])
+            .returning(table.c[dedup_key], table.c.id)
+        )
+    else:
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if skip_duplicates:
+            # Skipped rows return nothing, so match the new IDs back up by key
+            new_ids = dict(db.session.execute(stmt, chunk).all())
+            inserted = []
+            for row in chunk:
+                new_id = new_ids.pop(row[dedup_key], None)  # pop: a key repeated in the chunk went in once
+                if new_id is not None:
+                    inserted.append(row)
+                    ids.append(new_id)
+            chunk = inserted
+        else:
+            ids.extend(db.session.execute(stmt, chunk).scalars())
+        rows_inserted(chunk)
+    return ids
+
+
+def update_plaid_transactions(user_id: int, plaid_txs: list) -> int:
+    """
+    Apply Plaid "modified" transactions (pending -> posted, corrected amounts, dates
+    or names) to the rows already imported, keeping derived tables in step. Works
+    PLAID_WRITE_CHUNK_SIZE transactions at a time: one SELECT of the current values,
+    then one executemany UPDATE keyed on (user_id, plaid_transaction_id), which
+    idx_plaid_tx_user serves. The category and account are left as they are.
+    Transactions never imported are ignored. Returns how many rows were updated.
+    Does not commit.
+    """
+    table = Transaction.__table__
+    refresh = (
+        update(table)
+        .where(table.c.user_id == user_id, table.c.plaid_transaction_id == bindparam("b_plaid_id"))
+        .values(
+            date=bindparam("b_date"),
+            amount_minor=bindparam("b_amount_minor"),
+            currency=bindparam("b_currency"),
+            description=bindparam("b_description"),
+            normalised_description=bindparam("b_norm"),
+            normaliser_version=NORMALISER_VERSION,
+        )
+    )
+
+    updated = 0
+    for start in range(0, len(plaid_txs), PLAID_WRITE_CHUNK_SIZE):
+        # Later entries win if Plaid repeats a transaction within the page
+        chunk = {pt["transaction_id"]: pt for pt in plaid_txs[start:start + PLAID_WRITE_CHUNK_SIZE]}
+        before = db.session.execute(
+            select(table.c.plaid_transaction_id, *(table.c[c] for c in LEDGER_COLUMNS))
+            .where(table.c.user_id == user_id, table.c.plaid_transaction_id.in_(chunk))
+        ).mappings().all()
+        if not before:
+            continue
+
+        after, params = [], []
+        for row in before:
+            pt = chunk[row["plaid_transaction_id"]]
+            currency = pt.get("iso_currency_code") or DEFAULT_CURRENCY
+            new = {**row, "date": pt["date"], "amount_minor": to_minor(pt["amount"], currency),
+                   "currency": currency,
+                   "normalised_description": normalise_description(pt["name"])}
+            after.append(new)
+            params.append({
+                "b_plaid_id": row["plaid_transaction_id"],
+                "b_date": new["date"],
+                "b_amount_minor": new["amount_minor"],
+                "b_currency": currency,
+                "b_description": pt["name"][:200],
+                "b_norm": new["normalised_description"],
+            })
+        db.session.execute(refresh, params)
+        rows_updated(before, after)
+        updated += len(before)
+    return updated
+
+
+def delete_plaid_transactions(user_id: int, plaid_transaction_ids: list[str]) -> int:
+    """
+    Delete a user's transactions by Plaid transaction id, keeping derived tables in step.
+    Deletes PLAID_WRITE_CHUNK_SIZE ids per DELETE ... RETURNING, so the IN list stays
+    bounded and the removed rows' ledger values come back from the DELETE itself.
+    Returns how many rows were deleted. Does not commit.
+    """
+    table = Transaction.__table__
+    deleted = 0
+    for start in range(0, len(plaid_transaction_ids), PLAID_WRITE_CHUNK_SIZE):
+        chunk = plaid_transaction_ids[start:start + PLAID_WRITE_CHUNK_SIZE]
+        doomed = db.session.execute(
+            delete(table)
+            .where(table.c.user_id == user_id, table.c.plaid_transaction_id.in_(chunk))
+            .returning(*(table.c[c] for c in LEDGER_COLUMNS))
+        ).mappings().all()
+        rows_deleted(doomed)
+        deleted += len(doomed)
+    return deleted
+
+
+def save_transactions(rows: list[dict], chunk_size: int | None = None) -> list[int]:
+    """
+    Save a list of transaction row dicts (see transaction_row) in an all-or-nothing way
+    using the bulk insert path.
+    Returns the new transaction IDs in the same order as the input.
     Rolls back on any error and raises ValueError with a user-friendly message.
     """
     try:
-        for tx in transactions:
-            db.session.add(tx)
+        ids = bulk_insert_transactions(rows, chunk_size)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        raise ValueError(f"Upload failed. No transactions were saved. Error: {e}")
\ No newline at end of file
+        raise ValueError(f"Upload failed. No transactions were saved. Error: {e}")
+    return ids
+
+
+def import_csv_stream(
+    stream,
+    account,
+    user_id: int,
+    filename: str | None = None,
+    chunk_rows: int | None = None,
+    atomic: bool = True,
+    on_progress: Callable[[int], None] | None = None,
+) -> ImportBatch:
+    """
+    Stream a CSV into the transaction table chunk by chunk. Each chunk goes through
+    parse -> normalise -> category guess -> bulk insert before the next one is read,
+    so peak memory depends on chunk_rows, not on the size of the file.
+
+    Every row is tagged with a new ImportBatch, which is what gets returned. Rows
+    whose fingerprint is already stored (an overlapping statement uploaded again)
+    are skipped and counted in batch.duplicate_count.
+
+    atomic=True keeps the upload all-or-nothing: every chunk (and the batch) is
+    written inside one enclosing transaction that only commits after the last chunk.
+    atomic=False commits after each chunk, so rows imported before a failure are kept.
+    on_progress, if given, is called after every chunk with the number of rows written so far.
+
+    Raises ValueError with a user-friendly message.
+    """
+    if chunk_rows is None:
+        chunk_rows = current_app.config.get("CSV_IMPORT_CHUNK_ROWS", DEFAULT_CSV_CHUNK_ROWS)
+
+    batch = ImportBatch(user_id=user_id, account_id=account.id, filename=filename, row_count=0)
+    committed = 0  # rows already made permanent (only moves before the end when atomic=False)
+    seen = Counter()  # fingerprint keys so far, so occurrence ordinals span chunks
+    try:
+        db.session.add(batch)
+        db.session.flush()
+        for standard_df in iter_csv_chunks(stream, chunk_rows, account.invert_amounts, account.currency):
+            rows = build_transactions_from_df(
+                standard_df, user_id, account.id, account.name, batch.id, seen, account.currency,
+            )
+            inserted = len(bulk_insert_transactions(rows, skip_duplicates=True))
+            batch.row_count += inserted
+            batch.duplicate_count += len(rows) - inserted
+            if not atomic:
+                db.session.commit()
+                committed = batch.row_count
+            if on_progress:
+                on_progress(batch.row_count)
+        record_import(user_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if not committed:
+            saved = "No transactions were saved."
+        else:
+            saved = f"{committed} transactions were saved before the error."
+        raise ValueError(f"Upload failed. {saved} Error: {e}")
+    return batch
+
+
+def preview_csv_import(stream, account, chunk_rows: int | None = None) -> dict:
+    """
+    Dry run of import_csv_stream: parse and fingerprint the CSV chunk by chunk and
+    report how many rows would be imported and how many are already stored.
+    Nothing is written. Returns {"rows": ..., "new": ..., "duplicates": ...}.
+
+    Raises ValueError with a user-friendly message.
+    """
+    if chunk_rows is None:
+        chunk_rows = current_app.config.get("CSV_IMPORT_CHUNK_ROWS", DEFAULT_CSV_CHUNK_ROWS)
+
+    total = duplicates = 0
+    seen = Counter()
+    try:
+        for standard_df in iter_csv_chunks(stream, chunk_rows, account.invert_amounts, account.currency):
+            dates, amounts, descriptions, _ = _validated_columns(standard_df)
+            fingerprints = fingerprint_rows(account.id, dates, amounts, descriptions, seen, account.currency)
+            total += len(fingerprints)
+            duplicates += len(existing_fingerprints(fingerprints))
+    except Exception as e:
+        raise ValueError(f"Dry run failed. Error: {e}")
+    return {"rows": total, "new": total - duplicates, "duplicates": duplicates}
@@ -0,0 +1,227 @@
+"""
+Background CSV import jobs.
+
+Large uploads are written to IMPORT_UPLOAD_DIR and queued as an ImportJob row; a
+small in-process thread pool works through them with the same streaming import
+the inline path uses. The import_job table doubles as the queue, so nothing
+external is needed: when a serving process handles its first request, jobs still
+'queued' are resumed, and 'running' jobs whose worker has stopped reporting
+progress (its process died, so the all-or-nothing import rolled back) are queued
+again. Recovery waits for a request rather than running in create_app, so scripts
+that only import the app (migrations, seed_data.py) never start imports. Each job
+is claimed with a conditional UPDATE so it never runs twice.
+
+Progress is written to the job row as the import goes, through a connection of its
+own so the import's transaction is untouched, which lets any app process answer
+/imports/<id>.
+"""
+# Standard library
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+import os
+import tempfile
+import threading
+import uuid
+
+# Third-party
+from flask import Flask, current_app, url_for
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+# Local
+from helpers import import_csv_stream
+from models import db, Account, ImportBatch, ImportJob
+
+
+_pool_lock = threading.Lock()
+_resume_lock = threading.Lock()
+
+
+def init_import_jobs(app: Flask) -> None:
+    """Set config defaults and resume unfinished jobs on the app's first request."""
+    app.config.setdefault("IMPORT_WORKERS", 2)
+    app.config.setdefault("IMPORT_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "budget-app-imports"))
+    app.config.setdefault("IMPORT_BACKGROUND_MIN_BYTES", 1_000_000)
+    app.config.setdefault("IMPORT_JOBS_SYNC", False)  # run jobs inline (tests)
+    # A running job with no progress for this long has lost its worker
+    app.config.setdefault("IMPORT_JOB_STALE_SECONDS", 600)
+    app.config.setdefault("IMPORT_JOBS_RESUME", True)  # off in tests that count queries per request
+
+    @app.before_request
+    def _resume_on_first_request() -> None:
+        if app.extensions.get("import_jobs_resumed") or not app.config["IMPORT_JOBS_RESUME"]:
+            return
+        with _resume_lock:
+            if app.extensions.get("import_jobs_resumed"):
+                return
+            app.extensions["import_jobs_resumed"] = True
+            try:
+                resume_import_jobs(app)
+            except SQLAlchemyError as e:  # e.g. a migration still to run; serve anyway
+                db.session.rollback()
+                print(f"⚠️ Import jobs not resumed: {e}")
+
+
+def _pool(app: Flask) -> ThreadPoolExecutor:
+    """Return the app's worker pool, starting it on first call."""
+    with _pool_lock:
+        pool = app.extensions.get("import_jobs")
+        if pool is None:
+            pool = ThreadPoolExecutor(
+                max_workers=app.config["IMPORT_WORKERS"],
+                thread_name_prefix="import-job",
+            )
+            app.extensions["import_jobs"] = pool
+    return pool
+
+
+def _submit(app: Flask, job_id: int) -> None:
+    """Run a job on the pool, or inline when IMPORT_JOBS_SYNC is set."""
+    if app.config["IMPORT_JOBS_SYNC"]:
+        run_import_job(app, job_id)
+    else:
+        _pool(app).submit(run_import_job, app, job_id)
+
+
+def resume_import_jobs(app: Flask) -> list[int]:
+    """
+    Queue again every 'running' job that hasn't reported progress for
+    IMPORT_JOB_STALE_SECONDS (or fail it if its upload is gone), then start every
+    queued job. Returns the ids started.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=app.config["IMPORT_JOB_STALE_SECONDS"])
+    stale = db.session.execute(
+        select(ImportJob.id, ImportJob.stored_path).where(
+            ImportJob.status == "running",
+            func.coalesce(ImportJob.heartbeat_at, ImportJob.started_at) < cutoff,
+        )
+    ).all()
+    for job_id, stored_path in stale:
+        if os.path.exists(stored_path):
+            values = {"status": "queued", "started_at": None, "heartbeat_at": None, "rows_processed": 0}
+        else:
+            values = {"status": "failed", "finished_at": now,
+                      "error": "The import was interrupted and its upload is no longer available."}
+        # Conditional, so two processes starting together don't both act on a job
+        db.session.execute(
+            update(ImportJob).where(ImportJob.id == job_id, ImportJob.status == "running").values(**values)
+        )
+    db.session.commit()
+
+    queued = db.session.execute(
+        select(ImportJob.id).where(ImportJob.status == "queued").order_by(ImportJob.id)
+    ).scalars().all()
+    for job_id in queued:
+        _submit(app, job_id)
+    return queued
+
+
+def should_run_in_background(file) -> bool:
+    """True if the upload is big enough to hand to a background job."""
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size >= current_app.config["IMPORT_BACKGROUND_MIN_BYTES"]
+
+
+def enqueue_import(file, account: Account, user_id: int) -> ImportJob:
+    """Store the upload on disk, create its ImportJob and queue it. Returns the job."""
+    upload_dir = current_app.config["IMPORT_UPLOAD_DIR"]
+    os.makedirs(upload_dir, exist_ok=True)
+    stored_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.csv")
+    file.save(stored_path)
+
+    job = ImportJob(
+        user_id=user_id,
+        account_id=account.id,
+        filename=file.filename[:255],
+        stored_path=stored_path,
+        status="queued",
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _submit(current_app._get_current_object(), job.id)
+    return job
+
+
+def record_progress(job_id: int, rows: int) -> None:
+    """
+    Store a running job's row count and heartbeat through a connection of its own,
+    committed at once, so every app process sees it while the import's own
+    transaction is still open.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(ImportJob.__table__)
+            .where(ImportJob.__table__.c.id == job_id)
+            .values(rows_processed=rows, heartbeat_at=datetime.utcnow())
+        )
+
+
+def run_import_job(app: Flask, job_id: int) -> None:
+    """Claim a queued job and import its file. Safe to call from any thread."""
+    with app.app_context():
+        claimed = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == "queued")
+            .values(status="running", started_at=datetime.utcnow(), heartbeat_at=None)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return  # someone else has it, or it was already finished
+
+        job = db.session.get(ImportJob, job_id)
+        account = db.session.get(Account, job.account_id)
+
+        # SQLite has a single writer: a second connection would wait on the import's
+        # lock (or, with an in-memory database, share and commit its transaction)
+        report = None if db.engine.dialect.name == "sqlite" else partial(record_progress, job_id)
+
+        try:
+            with open(job.stored_path, "rb") as f:
+                batch = import_csv_stream(f, account, job.user_id, filename=job.filename, on_progress=report)
+            job.status = "done"
+            job.batch_id = batch.id
+            job.rows_processed = batch.row_count
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if os.path.exists(job.stored_path):
+                os.remove(job.stored_path)
+
+
+def job_status(job: ImportJob) -> dict:
+    """JSON-ready status for the /imports/<id> endpoint."""
+    rows = job.rows_processed
+
+    rows_per_second = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_second = round(rows / elapsed, 1)
+
+    batch = db.session.get(ImportBatch, job.batch_id) if job.batch_id else None
+
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "rows_processed": rows,
+        "rows_per_second": rows_per_second,
+        "error": job.error,
+        "batch_id": job.batch_id,
+        "duplicates_skipped": batch.duplicate_count if batch else None,
+        "review_url": url_for("transactions.review_upload", batch_id=job.batch_id) if job.batch_id else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,475 @@
+"""
+Incremental upkeep of tables derived from the transaction ledger.
+
+Every path that writes transactions reports what changed, so derived tables never
+need a full rescan:
+  - bulk INSERTs call rows_inserted(rows) with the row dicts they wrote
+  - bulk DELETEs call rows_deleted(rows) with the rows they removed
+  - ORM adds, recategorisations (tx.category = ...) and deletes are picked up
+    automatically by the before_flush listener at the bottom of this module
+
+A "row" is anything with the LEDGER_COLUMNS keys. Changes are collected in a
+LedgerDelta and written to every derived table (merchant_category_stats,
+user_stats, user_account_stats, monthly_category_totals) inside the caller's
+transaction.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, bindparam, case, delete, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from money import DEFAULT_CURRENCY
+from models import (
+    db, dialect_insert,
+    MerchantCategoryStat, MonthlyCategoryTotal, Transaction, UserAccountStat, UserStats,
+)
+
+
+# Transaction columns every derived table is computed from — bulk paths select these
+LEDGER_COLUMNS = (
+    "user_id", "normalised_description", "category_id", "account_id", "date", "amount_minor", "currency",
+)
+
+# Amounts in different currencies are never added together, so currency is part of every cell
+MONTHLY_KEY = ("user_id", "account_id", "category_id", "month", "currency")
+
+
+def _merchant_key(row) -> tuple | None:
+    """(user_id, normalised_description, category_id), or None if the row can't teach us anything."""
+    if not row["category_id"] or not row["normalised_description"]:
+        return None
+    return (row["user_id"], row["normalised_description"], row["category_id"])
+
+
+def _month(day) -> date:
+    """First day of day's month (accepts dates and datetimes)."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    """First day of the month after month."""
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _monthly_key(row) -> tuple:
+    """
+    (user_id, account_id, category_id, month, currency), with 0 standing in for a
+    missing account/category and GBP for a currency not yet filled in.
+    """
+    return (row["user_id"], row["account_id"] or 0, row["category_id"] or 0, _month(row["date"]),
+            row.get("currency") or DEFAULT_CURRENCY)
+
+
+def _is_postgres() -> bool:
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def month_start(column):
+    """SQL expression for the first day of column's month."""
+    if _is_postgres():
+        return func.date_trunc("month", column).cast(db.Date)
+    return func.date(column, "start of month")
+
+
+def _upsert_add(table, key_columns: tuple[str, ...], rows: list[dict], extra: dict | None = None) -> None:
+    """
+    INSERT rows, or add their counter columns onto the existing row with the same key.
+    extra is SET verbatim on conflict (e.g. a timestamp).
+    """
+    stmt = dialect_insert(table)
+    counters = [c for c in rows[0] if c not in key_columns and c not in (extra or {})]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[c] for c in key_columns],
+        set_={**{c: table.c[c] + stmt.excluded[c] for c in counters},
+              **{c: stmt.excluded[c] for c in (extra or {})}},
+    )
+    db.session.execute(stmt, [{**row, **(extra or {})} for row in rows])
+
+
+def apply_merchant_deltas(deltas: Counter) -> None:
+    """Add each (user_id, normalised_description, category_id) -> n delta to merchant_category_stats."""
+    deltas = {key: n for key, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    table = MerchantCategoryStat.__table__
+    _upsert_add(table, ("user_id", "normalised_description", "category_id"), [
+        {"user_id": u, "normalised_description": d, "category_id": c, "count": n}
+        for (u, d, c), n in deltas.items()
+    ])
+
+    if any(n < 0 for n in deltas.values()):
+        user_ids = {u for (u, _, _) in deltas}
+        db.session.execute(
+            delete(table).where(table.c.user_id.in_(user_ids), table.c.count <= 0)
+        )
+
+
+def apply_stat_deltas(totals: Counter, accounts: Counter, changed_users=()) -> None:
+    """
+    Add (user_id, column) -> n deltas to user_stats and (user_id, account_id) -> n
+    deltas to user_account_stats, and bump ledger_version for every user in
+    changed_users (cached ledger snapshots are keyed on it).
+    """
+    def stats_row(user_id):
+        return users.setdefault(user_id, {
+            "user_id": user_id, "total_count": 0, "uncategorised_count": 0, "ledger_version": 0,
+        })
+
+    users = {}
+    for (user_id, column), n in totals.items():
+        if n:
+            stats_row(user_id)[column] += n
+    for user_id in changed_users:
+        stats_row(user_id)["ledger_version"] = 1
+    if users:
+        _upsert_add(UserStats.__table__, ("user_id",), list(users.values()),
+                    extra={"updated_at": datetime.utcnow()})
+
+    accounts = {key: n for key, n in accounts.items() if n}
+    if accounts:
+        table = UserAccountStat.__table__
+        _upsert_add(table, ("user_id", "account_id"), [
+            {"user_id": u, "account_id": a, "count": n} for (u, a), n in accounts.items()
+        ])
+        if any(n < 0 for n in accounts.values()):
+            db.session.execute(delete(table).where(
+                table.c.user_id.in_({u for (u, _) in accounts}), table.c.count <= 0
+            ))
+
+
+def apply_monthly_deltas(added: dict, removed: dict) -> None:
+    """
+    added: monthly key -> [total, count, min, max] of new rows, merged in with an upsert.
+    removed: monthly key -> [total, count, min, max] of rows taken away. Min/max
+    can't be un-merged, so a key whose extreme value was removed is flagged
+    minmax_stale, for the write path to recompute once its own DML has run
+    (LedgerDelta.refresh_extremes); keys left with no rows are deleted.
+    """
+    table = MonthlyCategoryTotal.__table__
+
+    if added:
+        least, greatest = (func.least, func.greatest) if _is_postgres() else (func.min, func.max)
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[c] for c in MONTHLY_KEY],
+            set_={
+                "total_minor": table.c.total_minor + stmt.excluded.total_minor,
+                "count": table.c.count + stmt.excluded.count,
+                "min_minor": least(table.c.min_minor, stmt.excluded.min_minor),
+                "max_minor": greatest(table.c.max_minor, stmt.excluded.max_minor),
+            },
+        )
+        db.session.execute(stmt, [
+            {**dict(zip(MONTHLY_KEY, key)), "total_minor": total, "count": count,
+             "min_minor": low, "max_minor": high, "minmax_stale": False}
+            for key, (total, count, low, high) in added.items()
+        ])
+
+    if removed:
+        db.session.execute(
+            update(table)
+            .where(and_(*(table.c[c] == bindparam(f"b_{c}") for c in MONTHLY_KEY)))
+            .values(total_minor=table.c.total_minor - bindparam("b_total"),
+                    count=table.c.count - bindparam("b_count"),
+                    minmax_stale=table.c.minmax_stale
+                    | (bindparam("b_min") <= table.c.min_minor)
+                    | (bindparam("b_max") >= table.c.max_minor)),
+            [
+                {**{f"b_{c}": v for c, v in zip(MONTHLY_KEY, key)},
+                 "b_total": total, "b_count": count, "b_min": low, "b_max": high}
+                for key, (total, count, low, high) in removed.items()
+            ],
+        )
+        db.session.execute(delete(table).where(
+            table.c.user_id.in_({key[0] for key in removed}), table.c.count <= 0
+        ))
+
+
+class LedgerDelta:
+    """Net change to every derived table from a set of transaction writes."""
+
+    def __init__(self):
+        self.merchants = Counter()  # (user_id, normalised_description, category_id) -> n
+        self.totals = Counter()     # (user_id, "total_count" | "uncategorised_count") -> n
+        self.accounts = Counter()   # (user_id, account_id) -> n
+        self.months_added = {}      # monthly key -> [total, count, min, max]
+        self.months_removed = {}    # monthly key -> [total, count, min, max]
+        self.users = set()          # users whose ledger changed
+
+    def add(self, row, n: int, monthly: bool = True) -> None:
+        """Count row as inserted (n=+1) or deleted (n=-1)."""
+        self.users.add(row["user_id"])
+        key = _merchant_key(row)
+        if key:
+            self.merchants[key] += n
+        self.totals[(row["user_id"], "total_count")] += n
+        if row["category_id"] is None:
+            self.totals[(row["user_id"], "uncategorised_count")] += n
+        if row.get("account_id"):
+            self.accounts[(row["user_id"], row["account_id"])] += n
+        if monthly:
+            self._add_month(row, n)
+
+    def _add_month(self, row, n: int) -> None:
+        key, amount = _monthly_key(row), row["amount_minor"]
+        months = self.months_added if n > 0 else self.months_removed
+        agg = months.setdefault(key, [0, 0, amount, amount])
+        agg[0] += amount
+        agg[1] += 1
+        agg[2] = min(agg[2], amount)
+        agg[3] = max(agg[3], amount)
+
+    def move(self, old, new) -> None:
+        """A row was edited in place: old and new are its values before and after."""
+        same_month_cell = _monthly_key(old) == _monthly_key(new) and old["amount_minor"] == new["amount_minor"]
+        self.add(old, -1, monthly=not same_month_cell)
+        self.add(new, +1, monthly=not same_month_cell)
+
+    def apply(self) -> None:
+        apply_merchant_deltas(self.merchants)
+        apply_stat_deltas(self.totals, self.accounts, self.users)
+        apply_monthly_deltas(self.months_added, self.months_removed)
+
+    @property
+    def minmax_users(self) -> set[int]:
+        """Users who may have monthly cells flagged minmax_stale by apply()."""
+        return {key[0] for key in self.months_removed}
+
+    def refresh_extremes(self) -> None:
+        """Recompute min/max for cells apply() flagged. Call once the transaction rows are written."""
+        for user_id in self.minmax_users:
+            refresh_stale_monthly_totals(user_id)
+
+
+def rows_inserted(rows) -> None:
+    """Record freshly inserted transaction rows."""
+    delta = LedgerDelta()
+    for row in rows:
+        delta.add(row, +1)
+    delta.apply()
+
+
+def rows_deleted(rows) -> None:
+    """Record transaction rows removed by a bulk DELETE (call after the DELETE has run)."""
+    delta = LedgerDelta()
+    for row in rows:
+        delta.add(row, -1)
+    delta.apply()
+    delta.refresh_extremes()
+
+
+def rows_updated(before, after) -> None:
+    """
+    Record transaction rows rewritten by a bulk UPDATE (call after the UPDATE has
+    run): before[i] and after[i] are one row's old and new values.
+    """
+    delta = LedgerDelta()
+    for old, new in zip(before, after):
+        delta.move(old, new)
+    delta.apply()
+    delta.refresh_extremes()
+
+
+def descriptions_renormalised(before, after) -> None:
+    """Move merchant stats for rows whose normalised_description was rewritten in bulk."""
+    deltas = Counter()
+    for rows, n in ((before, -1), (after, +1)):
+        for key in map(_merchant_key, rows):
+            if key:
+                deltas[key] += n
+    apply_merchant_deltas(deltas)
+    apply_stat_deltas(Counter(), Counter(), {row["user_id"] for row in before})
+
+
+def record_import(user_id: int) -> None:
+    """Stamp user_stats.last_import_at and bump ledger_version (CSV uploads and bank syncs)."""
+    now = datetime.utcnow()
+    _upsert_add(UserStats.__table__, ("user_id",),
+                [{"user_id": user_id, "total_count": 0, "uncategorised_count": 0, "ledger_version": 1}],
+                extra={"last_import_at": now, "updated_at": now})
+
+
+def refresh_stale_monthly_totals(user_id: int | None = None) -> int:
+    """
+    Recompute min/max for monthly_category_totals rows flagged minmax_stale (one
+    user's, or everyone's), each from its own account/category/month/currency slice of the
+    ledger. Runs in the write path, so readers never touch the transaction table.
+    Returns how many.
+    """
+    table = MonthlyCategoryTotal.__table__
+    tx = Transaction.__table__
+    stale = select(*(table.c[c] for c in MONTHLY_KEY)).where(table.c.minmax_stale.is_(True))
+    if user_id is not None:
+        stale = stale.where(table.c.user_id == user_id)
+    stale = db.session.execute(stale).all()
+
+    for user, account_id, category_id, month, currency in stale:
+        low, high = db.session.execute(
+            select(func.min(tx.c.amount_minor), func.max(tx.c.amount_minor)).where(
+                tx.c.user_id == user,
+                func.coalesce(tx.c.account_id, 0) == account_id,
+                func.coalesce(tx.c.category_id, 0) == category_id,
+                tx.c.date >= month,
+                tx.c.date < next_month(month),
+                tx.c.currency == currency,
+            )
+        ).one()
+        db.session.execute(
+            update(table)
+            .where(table.c.user_id == user, table.c.account_id == account_id,
+                   table.c.category_id == category_id, table.c.month == month,
+                   table.c.currency == currency)
+            .values(min_minor=low, max_minor=high, minmax_stale=False)
+        )
+    return len(stale)
+
+
+def rebuild_monthly_totals(user_id: int | None = None) -> None:
+    """Recompute monthly_category_totals from the transaction table (one user, or everyone)."""
+    table = MonthlyCategoryTotal.__table__
+    tx = Transaction.__table__
+
+    account_id = func.coalesce(tx.c.account_id, 0)
+    category_id = func.coalesce(tx.c.category_id, 0)
+    month = month_start(tx.c.date)
+    source = (
+        select(tx.c.user_id, account_id, category_id, month, tx.c.currency,
+               func.sum(tx.c.amount_minor), func.count(tx.c.id),
+               func.min(tx.c.amount_minor), func.max(tx.c.amount_minor))
+        .group_by(tx.c.user_id, account_id, category_id, month, tx.c.currency)
+    )
+    clear = delete(table)
+    if user_id is not None:
+        source = source.where(tx.c.user_id == user_id)
+        clear = clear.where(table.c.user_id == user_id)
+
+    db.session.execute(clear)
+    db.session.execute(table.insert().from_select(
+        [*MONTHLY_KEY, "total_minor", "count", "min_minor", "max_minor"], source
+    ))
+
+
+def rebuild_merchant_stats(user_id: int | None = None) -> None:
+    """Recompute merchant_category_stats from the transaction table (one user, or everyone)."""
+    stats = MerchantCategoryStat.__table__
+    tx = Transaction.__table__
+
+    clear = delete(stats)
+    source = (
+        select(tx.c.user_id, tx.c.normalised_description, tx.c.category_id, func.count(tx.c.id))
+        .where(tx.c.category_id.isnot(None), tx.c.normalised_description.isnot(None),
+               tx.c.normalised_description != "")
+        .group_by(tx.c.user_id, tx.c.normalised_description, tx.c.category_id)
+    )
+    if user_id is not None:
+        clear = clear.where(stats.c.user_id == user_id)
+        source = source.where(tx.c.user_id == user_id)
+
+    db.session.execute(clear)
+    db.session.execute(
+        stats.insert().from_select(["user_id", "normalised_description", "category_id", "count"], source)
+    )
+
+
+def rebuild_user_stats(user_id: int | None = None) -> None:
+    """
+    Recompute user_stats counters and user_account_stats from the transaction table
+    (one user, or everyone). last_import_at is kept where a row already exists.
+    """
+    stats = UserStats.__table__
+    account_stats = UserAccountStat.__table__
+    tx = Transaction.__table__
+    now = datetime.utcnow()
+
+    totals = (
+        select(
+            tx.c.user_id,
+            func.count(tx.c.id),
+            func.sum(case((tx.c.category_id.is_(None), 1), else_=0)),
+        )
+        .group_by(tx.c.user_id)
+    )
+    per_account = (
+        select(tx.c.user_id, tx.c.account_id, func.count(tx.c.id))
+        .where(tx.c.account_id.isnot(None))
+        .group_by(tx.c.user_id, tx.c.account_id)
+    )
+    reset = stats.update().values(total_count=0, uncategorised_count=0, updated_at=now)
+    clear = delete(account_stats)
+    if user_id is not None:
+        totals = totals.where(tx.c.user_id == user_id)
+        per_account = per_account.where(tx.c.user_id == user_id)
+        reset = reset.where(stats.c.user_id == user_id)
+        clear = clear.where(account_stats.c.user_id == user_id)
+
+    db.session.execute(reset)
+    rows = [
+        {"user_id": u, "total_count": total, "uncategorised_count": uncategorised or 0}
+        for u, total, uncategorised in db.session.execute(totals)
+    ]
+    if rows:
+        _upsert_add(stats, ("user_id",), rows, extra={"updated_at": now})
+
+    db.session.execute(clear)
+    db.session.execute(
+        account_stats.insert().from_select(["user_id", "account_id", "count"], per_account)
+    )
+
+
+def _committed(tx: Transaction, attr: str):
+    """Value of attr as it is in the database, ignoring unflushed changes."""
+    getattr(tx, attr)  # load it first if expired
+    history = inspect(tx).attrs[attr].history
+    values = list(history.unchanged) + list(history.deleted)
+    return values[0] if values else None
+
+
+# Load the old value of every ledger column before it is overwritten, even on
+# expired objects, so the flush listener below always sees what an edit replaced
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+for _column in ("category_id", "account_id", "date", "amount_minor", "currency"):
+    event.listen(getattr(Transaction, _column), "set", _load_old_value, active_history=True)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_orm_changes(session, flush_context, instances):
+    """Turn ORM-level transaction adds, recategorisations and deletes into ledger deltas."""
+    delta = LedgerDelta()
+
+    def current(tx):
+        return {column: getattr(tx, column) for column in LEDGER_COLUMNS}
+
+    def committed(tx):
+        return {column: _committed(tx, column) for column in LEDGER_COLUMNS}
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            delta.add(current(obj), +1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Transaction):
+            attrs = inspect(obj).attrs
+            if any(attrs[c].history.has_changes() for c in LEDGER_COLUMNS):
+                delta.move(committed(obj), current(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            delta.add(committed(obj), -1)
+
+    delta.apply()
+    # The rows themselves are only written later in this flush, so min/max is recomputed after it
+    session.info.setdefault("ledger_minmax_users", set()).update(delta.minmax_users)
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_orm_extremes(session, flush_context):
+    """Recompute min/max for monthly cells the flush's edits and deletes flagged stale."""
+    for user_id in session.info.pop("ledger_minmax_users", ()):
+        refresh_stale_monthly_totals(user_id)
@@ -0,0 +1,63 @@
+"""
+Migration 006: Add normaliser_version to transaction
+
+Stamps each stored normalised_description with the NORMALISER_VERSION that
+produced it, so rows normalised under older rules can be found and refreshed.
+Existing rows start as NULL (unknown) and are re-normalised in batches.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from helpers import renormalise_stale_descriptions
+
+
+def upgrade():
+    print("🔄 Migration 006: Adding normaliser_version to transaction...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE transaction ADD COLUMN normaliser_version SMALLINT"))
+        print("  ✅ Added 'normaliser_version' column")
+        conn.commit()
+
+    refreshed = renormalise_stale_descriptions()
+    print(f"  ✅ Re-normalised {refreshed} existing transactions")
+    print("✅ Migration 006 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 006: Dropping normaliser_version...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE transaction DROP COLUMN IF EXISTS normaliser_version"))
+        conn.commit()
+    print("✅ Downgrade 006 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 006...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = 'transaction'
+            AND column_name = 'normaliser_version'
+        """))
+        assert result.fetchone(), "❌ normaliser_version column missing"
+
+        stale = conn.execute(db.text(
+            "SELECT COUNT(*) FROM transaction WHERE normaliser_version IS NULL"
+        )).scalar()
+        print(f"  Rows still unstamped: {stale}")
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
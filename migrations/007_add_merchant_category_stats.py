@@ -0,0 +1,63 @@
+"""
+Migration 007: Add merchant_category_stats table
+
+One row per (user, normalised description, category) with a running count of how
+often the user filed that merchant there. Import-time category guesses read it
+with primary-key lookups instead of scanning the transaction table.
+Existing history is backfilled with a single GROUP BY.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from ledger import rebuild_merchant_stats
+
+
+def upgrade():
+    print("🔄 Migration 007: Creating merchant_category_stats table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE merchant_category_stats (
+                user_id INTEGER NOT NULL REFERENCES "user"(id),
+                normalised_description VARCHAR(200) NOT NULL,
+                category_id INTEGER NOT NULL REFERENCES category(id) ON DELETE CASCADE,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, normalised_description, category_id)
+            )
+        """))
+        print("  ✅ Created merchant_category_stats table")
+        conn.commit()
+
+    rebuild_merchant_stats()
+    db.session.commit()
+    print("  ✅ Backfilled counts from existing transactions")
+    print("✅ Migration 007 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 007: Dropping merchant_category_stats table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TABLE IF EXISTS merchant_category_stats"))
+        conn.commit()
+    print("✅ Downgrade 007 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 007...")
+    with db.engine.connect() as conn:
+        rows = conn.execute(db.text("SELECT COUNT(*) FROM merchant_category_stats")).scalar()
+        print(f"  Stats rows: {rows}")
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,74 @@
+"""
+Migration 008: Add import_job table
+
+Background CSV imports: one row per queued upload, tracking status, progress
+and errors. The table is also the job queue, so no external broker is needed.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 008: Creating import_job table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE import_job (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES "user"(id),
+                account_id INTEGER NOT NULL REFERENCES account(id),
+                filename VARCHAR(255) NOT NULL,
+                stored_path VARCHAR(500) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                rows_processed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        """))
+        print("  ✅ Created import_job table")
+
+        conn.execute(db.text("CREATE INDEX ix_import_job_user_id ON import_job(user_id)"))
+        conn.execute(db.text("CREATE INDEX ix_import_job_status ON import_job(status)"))
+        print("  ✅ Created indexes")
+
+        conn.commit()
+    print("✅ Migration 008 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 008: Dropping import_job table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TABLE IF EXISTS import_job"))
+        conn.commit()
+    print("✅ Downgrade 008 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 008...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = 'import_job'
+        """))
+        cols = [row[0] for row in result]
+        print(f"  Columns found: {cols}")
+        for col in ('id', 'user_id', 'account_id', 'status', 'rows_processed', 'error'):
+            assert col in cols, f"❌ {col} column missing"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
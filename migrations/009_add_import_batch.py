@@ -0,0 +1,80 @@
+"""
+Migration 009: Add import_batch table and transaction.batch_id
+
+Each CSV upload becomes an import_batch row and every transaction it created
+points back to it, so review/update pages query one indexed key instead of
+carrying every transaction ID in the session cookie.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 009: Creating import_batch table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE import_batch (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES "user"(id),
+                account_id INTEGER REFERENCES account(id),
+                filename VARCHAR(255),
+                row_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        """))
+        conn.execute(db.text("CREATE INDEX ix_import_batch_user_id ON import_batch(user_id)"))
+        print("  ✅ Created import_batch table")
+
+        conn.execute(db.text(
+            "ALTER TABLE transaction ADD COLUMN batch_id INTEGER REFERENCES import_batch(id)"
+        ))
+        conn.execute(db.text("CREATE INDEX ix_transaction_batch_id ON transaction(batch_id)"))
+        print("  ✅ Added transaction.batch_id")
+
+        conn.execute(db.text(
+            "ALTER TABLE import_job ADD COLUMN batch_id INTEGER REFERENCES import_batch(id)"
+        ))
+        print("  ✅ Added import_job.batch_id")
+
+        conn.commit()
+    print("✅ Migration 009 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 009: Dropping import batches...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE import_job DROP COLUMN IF EXISTS batch_id"))
+        conn.execute(db.text("ALTER TABLE transaction DROP COLUMN IF EXISTS batch_id"))
+        conn.execute(db.text("DROP TABLE IF EXISTS import_batch"))
+        conn.commit()
+    print("✅ Downgrade 009 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 009...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND column_name = 'batch_id'
+        """))
+        tables = {row[0] for row in result}
+        print(f"  batch_id found on: {sorted(tables)}")
+        assert 'transaction' in tables, "❌ transaction.batch_id missing"
+        assert 'import_job' in tables, "❌ import_job.batch_id missing"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
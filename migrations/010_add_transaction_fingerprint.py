@@ -0,0 +1,81 @@
+"""
+Migration 010: Add transaction.fingerprint for CSV duplicate detection
+
+Every CSV-imported row gets a content fingerprint (account, date, amount,
+normalised description, occurrence ordinal) under a unique index, so a
+re-uploaded or overlapping statement skips rows that are already stored.
+Existing manual rows are fingerprinted account by account.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from helpers import backfill_fingerprints
+
+
+def upgrade():
+    print("🔄 Migration 010: Adding transaction fingerprints...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE transaction ADD COLUMN fingerprint VARCHAR(64)"))
+        print("  ✅ Added 'fingerprint' column")
+
+        conn.execute(db.text(
+            "ALTER TABLE import_batch ADD COLUMN duplicate_count INTEGER NOT NULL DEFAULT 0"
+        ))
+        print("  ✅ Added import_batch.duplicate_count")
+        conn.commit()
+
+    stamped = backfill_fingerprints()
+    print(f"  ✅ Fingerprinted {stamped} existing transactions")
+
+    # Built after the backfill so the index isn't maintained row by row
+    with db.engine.connect() as conn:
+        conn.execute(db.text(
+            "CREATE UNIQUE INDEX ix_transaction_fingerprint ON transaction(fingerprint)"
+        ))
+        conn.commit()
+    print("  ✅ Created unique index ix_transaction_fingerprint")
+    print("✅ Migration 010 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 010: Dropping transaction fingerprints...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP INDEX IF EXISTS ix_transaction_fingerprint"))
+        conn.execute(db.text("ALTER TABLE transaction DROP COLUMN IF EXISTS fingerprint"))
+        conn.execute(db.text("ALTER TABLE import_batch DROP COLUMN IF EXISTS duplicate_count"))
+        conn.commit()
+    print("✅ Downgrade 010 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 010...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'transaction'
+            AND indexname = 'ix_transaction_fingerprint'
+        """))
+        assert result.fetchone(), "❌ ix_transaction_fingerprint index missing"
+
+        unstamped = conn.execute(db.text("""
+            SELECT COUNT(*) FROM transaction
+            WHERE fingerprint IS NULL
+            AND plaid_transaction_id IS NULL
+            AND account_id IS NOT NULL
+        """)).scalar()
+        print(f"  CSV rows without a fingerprint: {unstamped}")
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,70 @@
+"""
+Migration 011: Add keyset-pagination indexes on transaction
+
+/transactions and /uncategorised page on (date DESC, id DESC) per user. The
+composite (user_id, date, id) index lets each page seek straight to its cursor;
+the partial index covers the uncategorised slice only.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+INDEXES = ("ix_transaction_user_date_id", "ix_transaction_uncategorised")
+
+
+def upgrade():
+    print("🔄 Migration 011: Adding pagination indexes to transaction...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text(
+            "CREATE INDEX ix_transaction_user_date_id ON transaction(user_id, date, id)"
+        ))
+        print("  ✅ Created ix_transaction_user_date_id")
+
+        conn.execute(db.text("""
+            CREATE INDEX ix_transaction_uncategorised ON transaction(user_id, date, id)
+            WHERE category_id IS NULL
+        """))
+        print("  ✅ Created partial index ix_transaction_uncategorised")
+
+        conn.execute(db.text("ANALYZE transaction"))
+        conn.commit()
+    print("✅ Migration 011 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 011: Dropping pagination indexes...")
+    with db.engine.connect() as conn:
+        for name in INDEXES:
+            conn.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+        conn.commit()
+    print("✅ Downgrade 011 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 011...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'transaction'
+            AND indexname IN :names
+        """).bindparams(db.bindparam("names", expanding=True)), {"names": list(INDEXES)})
+        found = {row[0] for row in result}
+        for name in INDEXES:
+            assert name in found, f"❌ {name} missing"
+            print(f"  ✅ {name}")
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
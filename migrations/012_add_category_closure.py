@@ -0,0 +1,77 @@
+"""
+Migration 012: Add category_closure table
+
+One row per (ancestor, descendant) pair in each category tree, including every
+category paired with itself, so spend rollups over a category and all of its
+subcategories are one indexed join. Backfilled from parent_id with a recursive CTE.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 012: Creating category_closure table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE category_closure (
+                ancestor_id INTEGER NOT NULL REFERENCES category(id) ON DELETE CASCADE,
+                descendant_id INTEGER NOT NULL REFERENCES category(id) ON DELETE CASCADE,
+                depth INTEGER NOT NULL,
+                PRIMARY KEY (ancestor_id, descendant_id)
+            )
+        """))
+        print("  ✅ Created category_closure table")
+
+        result = conn.execute(db.text("""
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM category
+                UNION ALL
+                SELECT tree.ancestor_id, category.id, tree.depth + 1
+                FROM tree JOIN category ON category.parent_id = tree.descendant_id
+            )
+            SELECT ancestor_id, descendant_id, depth FROM tree
+        """))
+        print(f"  ✅ Backfilled {result.rowcount} closure rows")
+
+        conn.execute(db.text(
+            "CREATE INDEX ix_category_closure_descendant ON category_closure(descendant_id, ancestor_id)"
+        ))
+        print("  ✅ Created index ix_category_closure_descendant")
+        conn.commit()
+    print("✅ Migration 012 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 012: Dropping category_closure...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TABLE IF EXISTS category_closure"))
+        conn.commit()
+    print("✅ Downgrade 012 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 012...")
+    with db.engine.connect() as conn:
+        categories = conn.execute(db.text("SELECT COUNT(*) FROM category")).scalar()
+        self_rows = conn.execute(db.text(
+            "SELECT COUNT(*) FROM category_closure WHERE depth = 0"
+        )).scalar()
+        print(f"  Categories: {categories}, self rows: {self_rows}")
+        assert categories == self_rows, "❌ Some categories are missing from category_closure"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,92 @@
+"""
+Migration 013: Add user_stats and user_account_stats tables
+
+Dashboard counters (total, uncategorised, per-account counts, last import time)
+kept up to date incrementally by ledger.py, so the dashboard reads one row per
+user instead of counting the transaction table on every load.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from ledger import rebuild_user_stats
+
+
+def upgrade():
+    print("🔄 Migration 013: Creating user_stats tables...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE user_stats (
+                user_id INTEGER PRIMARY KEY REFERENCES "user"(id) ON DELETE CASCADE,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                uncategorised_count INTEGER NOT NULL DEFAULT 0,
+                last_import_at TIMESTAMP,
+                updated_at TIMESTAMP
+            )
+        """))
+        print("  ✅ Created user_stats table")
+
+        conn.execute(db.text("""
+            CREATE TABLE user_account_stats (
+                user_id INTEGER NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+                account_id INTEGER NOT NULL REFERENCES account(id) ON DELETE CASCADE,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, account_id)
+            )
+        """))
+        print("  ✅ Created user_account_stats table")
+        conn.commit()
+
+    rebuild_user_stats()
+    # Best guess at the last import for existing users: their newest upload or sync
+    db.session.execute(db.text("""
+        UPDATE user_stats SET last_import_at = latest.at
+        FROM (
+            -- One row per user, so the UPDATE has a single match to apply
+            SELECT user_id, MAX(at) AS at FROM (
+                SELECT user_id, created_at AS at FROM import_batch
+                UNION ALL
+                SELECT user_id, last_synced_at FROM plaid_item
+            ) AS imports
+            GROUP BY user_id
+        ) AS latest
+        WHERE latest.user_id = user_stats.user_id
+        AND (user_stats.last_import_at IS NULL OR latest.at > user_stats.last_import_at)
+    """))
+    db.session.commit()
+    print("  ✅ Backfilled user_stats from existing transactions")
+    print("✅ Migration 013 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 013: Dropping user_stats tables...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TABLE IF EXISTS user_account_stats"))
+        conn.execute(db.text("DROP TABLE IF EXISTS user_stats"))
+        conn.commit()
+    print("✅ Downgrade 013 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 013...")
+    with db.engine.connect() as conn:
+        drift = conn.execute(db.text("""
+            SELECT COUNT(*) FROM user_stats s
+            WHERE s.total_count <> (SELECT COUNT(*) FROM transaction t WHERE t.user_id = s.user_id)
+        """)).scalar()
+        print(f"  Users whose total_count doesn't match: {drift}")
+        assert drift == 0, "❌ user_stats out of step with transaction"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,69 @@
+"""
+Migration 014: Add monthly_category_totals table
+
+Per user/account/category/month sum, count, min and max of transaction amounts,
+kept up to date incrementally by ledger.py, so month-by-category spend reports
+read the rollup instead of scanning the transaction table.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from ledger import rebuild_monthly_totals
+
+
+def upgrade():
+    print("🔄 Migration 014: Creating monthly_category_totals table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE monthly_category_totals (
+                user_id INTEGER NOT NULL REFERENCES "user"(id) ON DELETE CASCADE,
+                account_id INTEGER NOT NULL DEFAULT 0,
+                category_id INTEGER NOT NULL DEFAULT 0,
+                month DATE NOT NULL,
+                total DOUBLE PRECISION NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                min_amount DOUBLE PRECISION,
+                max_amount DOUBLE PRECISION,
+                minmax_stale BOOLEAN NOT NULL DEFAULT FALSE,
+                PRIMARY KEY (user_id, account_id, category_id, month)
+            )
+        """))
+        print("  ✅ Created monthly_category_totals table")
+        conn.commit()
+
+    rebuild_monthly_totals()
+    db.session.commit()
+    print("  ✅ Backfilled monthly_category_totals from existing transactions")
+    print("✅ Migration 014 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 014: Dropping monthly_category_totals table...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TABLE IF EXISTS monthly_category_totals"))
+        conn.commit()
+    print("✅ Downgrade 014 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 014...")
+    with db.engine.connect() as conn:
+        rolled_up = conn.execute(db.text("SELECT COALESCE(SUM(count), 0) FROM monthly_category_totals")).scalar()
+        ledger = conn.execute(db.text("SELECT COUNT(*) FROM transaction")).scalar()
+        print(f"  Rows in rollup: {rolled_up}, in transaction: {ledger}")
+        assert rolled_up == ledger, "❌ monthly_category_totals out of step with transaction"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
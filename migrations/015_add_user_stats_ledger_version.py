@@ -0,0 +1,54 @@
+"""
+Migration 015: Add ledger_version to user_stats
+
+A per-user counter bumped by every write to the user's transactions (and by every
+import or bank sync). In-memory ledger snapshots (snapshot.py) record the version
+they were built from and are rebuilt once it moves on.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 015: Adding ledger_version to user_stats...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE user_stats ADD COLUMN ledger_version INTEGER NOT NULL DEFAULT 0"))
+        print("  ✅ Added 'ledger_version' column")
+        conn.commit()
+    print("✅ Migration 015 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 015: Dropping ledger_version...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE user_stats DROP COLUMN IF EXISTS ledger_version"))
+        conn.commit()
+    print("✅ Downgrade 015 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 015...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = 'user_stats'
+            AND column_name = 'ledger_version'
+        """))
+        assert result.fetchone(), "❌ ledger_version column missing"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,167 @@
+"""
+Migration 016: Store transaction amounts as integer minor units (expand step)
+
+Adds amount_minor BIGINT (whole pence, cents, ...) plus a currency code taken
+from the row's account, so SUMs are exact integer arithmetic, and gives
+monthly_category_totals minor-unit columns alongside the float ones.
+
+This is the expand half of an expand/contract change; nothing the old code reads
+or writes is removed. The backfill works through transaction in id batches,
+committing after each one, and a trigger keeps amount and amount_minor in step
+for rows either version of the code writes meanwhile: the old code only sets
+amount, the new code only amount_minor. Run this, deploy the new code, then run
+migration 021 to drop the float columns once no old process is left.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from money import MINOR_EXPONENTS
+from ledger import rebuild_monthly_totals
+
+BATCH_SIZE = 10_000
+
+
+def _scale(currency_column: str) -> str:
+    """SQL for 10 ** (the currency's minor-unit exponent)."""
+    cases = " ".join(f"WHEN '{code}' THEN {10 ** exponent}" for code, exponent in MINOR_EXPONENTS.items())
+    return f"(CASE {currency_column} {cases} ELSE 100 END)"
+
+
+def _backfill_batches(conn, last_id: int, commit: bool = True) -> int:
+    """Fill currency and amount_minor for rows with id > last_id, a batch per commit. Returns how many."""
+    max_id = conn.execute(db.text("SELECT COALESCE(MAX(id), 0) FROM transaction")).scalar()
+    filled = 0
+    while last_id < max_id:
+        upper = last_id + BATCH_SIZE
+        conn.execute(db.text("""
+            UPDATE transaction t SET currency = UPPER(LEFT(a.currency, 3))
+            FROM account a
+            WHERE a.id = t.account_id
+            AND t.id > :lo AND t.id <= :hi AND t.amount_minor IS NULL
+        """), {"lo": last_id, "hi": upper})
+        filled += conn.execute(db.text(f"""
+            UPDATE transaction
+            SET amount_minor = ROUND(amount::numeric * {_scale("currency")})::bigint
+            WHERE id > :lo AND id <= :hi AND amount_minor IS NULL
+        """), {"lo": last_id, "hi": upper}).rowcount
+        if commit:
+            conn.commit()
+        last_id = upper
+        print(f"  … filled through id {min(upper, max_id)} of {max_id}")
+    return filled
+
+
+def upgrade():
+    print("🔄 Migration 016: Adding integer minor-unit amounts...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE transaction ADD COLUMN amount_minor BIGINT"))
+        conn.execute(db.text("ALTER TABLE transaction ADD COLUMN currency VARCHAR(3) NOT NULL DEFAULT 'GBP'"))
+        # The new code doesn't write amount; the trigger fills it in for the old code
+        conn.execute(db.text("ALTER TABLE transaction ALTER COLUMN amount DROP NOT NULL"))
+        conn.execute(db.text(f"""
+            CREATE OR REPLACE FUNCTION transaction_sync_amount() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' AND NEW.amount_minor IS NULL AND NEW.account_id IS NOT NULL THEN
+                    SELECT UPPER(LEFT(a.currency, 3)) INTO NEW.currency FROM account a WHERE a.id = NEW.account_id;
+                    NEW.currency := COALESCE(NEW.currency, 'GBP');
+                END IF;
+                IF TG_OP = 'INSERT' THEN
+                    IF NEW.amount_minor IS NULL THEN
+                        NEW.amount_minor := ROUND(NEW.amount::numeric * {_scale("NEW.currency")})::bigint;
+                    ELSIF NEW.amount IS NULL THEN
+                        NEW.amount := NEW.amount_minor::float8 / {_scale("NEW.currency")};
+                    END IF;
+                ELSIF NEW.amount IS DISTINCT FROM OLD.amount AND NEW.amount_minor IS NOT DISTINCT FROM OLD.amount_minor THEN
+                    NEW.amount_minor := ROUND(NEW.amount::numeric * {_scale("NEW.currency")})::bigint;
+                ELSIF NEW.amount_minor IS DISTINCT FROM OLD.amount_minor AND NEW.amount IS NOT DISTINCT FROM OLD.amount THEN
+                    NEW.amount := NEW.amount_minor::float8 / {_scale("NEW.currency")};
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        conn.execute(db.text("""
+            CREATE TRIGGER transaction_sync_amount
+            BEFORE INSERT OR UPDATE ON transaction
+            FOR EACH ROW EXECUTE FUNCTION transaction_sync_amount()
+        """))
+        conn.commit()
+        print("  ✅ Added 'amount_minor' and 'currency' columns, kept in step with 'amount' by a trigger")
+
+        filled = _backfill_batches(conn, 0)
+        print(f"  ✅ Backfilled {filled} transactions")
+
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+                ADD COLUMN total_minor BIGINT NOT NULL DEFAULT 0,
+                ADD COLUMN min_minor BIGINT,
+                ADD COLUMN max_minor BIGINT
+        """))
+        conn.commit()
+
+    rebuild_monthly_totals()
+    db.session.commit()
+    print("  ✅ Rebuilt monthly_category_totals in minor units")
+    print("✅ Migration 016 complete. Deploy the new code, then run migration 021.")
+
+
+def downgrade():
+    print("🔄 Downgrade 016: Removing integer minor-unit amounts...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("DROP TRIGGER IF EXISTS transaction_sync_amount ON transaction"))
+        conn.execute(db.text("DROP FUNCTION IF EXISTS transaction_sync_amount()"))
+        conn.execute(db.text(
+            f"UPDATE transaction SET amount = amount_minor::float8 / {_scale('currency')} WHERE amount IS NULL"
+        ))
+        conn.execute(db.text("ALTER TABLE transaction ALTER COLUMN amount SET NOT NULL"))
+        conn.execute(db.text("ALTER TABLE transaction DROP COLUMN amount_minor, DROP COLUMN currency"))
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+                DROP COLUMN total_minor, DROP COLUMN min_minor, DROP COLUMN max_minor
+        """))
+        conn.commit()
+    print("✅ Downgrade 016 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 016...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = 'transaction'
+            AND column_name = 'amount_minor'
+        """)).scalar()
+        assert result == "bigint", "❌ amount_minor column missing"
+
+        unfilled = conn.execute(db.text("SELECT COUNT(*) FROM transaction WHERE amount_minor IS NULL")).scalar()
+        print(f"  Transactions without amount_minor: {unfilled}")
+        assert unfilled == 0, "❌ amount_minor not backfilled"
+
+        drift = conn.execute(db.text("""
+            SELECT COUNT(*) FROM monthly_category_totals m
+            WHERE m.total_minor <> (
+                SELECT COALESCE(SUM(t.amount_minor), 0) FROM transaction t
+                WHERE t.user_id = m.user_id
+                AND COALESCE(t.account_id, 0) = m.account_id
+                AND COALESCE(t.category_id, 0) = m.category_id
+                AND date_trunc('month', t.date)::date = m.month
+            )
+        """)).scalar()
+        print(f"  Monthly totals that don't match the ledger: {drift}")
+        assert drift == 0, "❌ monthly_category_totals out of step with transaction"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,77 @@
+"""
+Migration 017: Add account.latest_balance_id
+
+Denormalised pointer to each account's newest account_balance row, moved by
+balances.record_balance on every sync, so the accounts pages join one balance per
+account instead of loading the whole balance history.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 017: Adding account.latest_balance_id...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            ALTER TABLE account ADD COLUMN latest_balance_id INTEGER
+            REFERENCES account_balance(id) ON DELETE SET NULL
+        """))
+        print("  ✅ Added 'latest_balance_id' column")
+
+        conn.execute(db.text("""
+            CREATE INDEX IF NOT EXISTS ix_account_balance_account_recorded
+            ON account_balance(account_id, recorded_at DESC)
+        """))
+        print("  ✅ Created index ix_account_balance_account_recorded")
+
+        result = conn.execute(db.text("""
+            UPDATE account SET latest_balance_id = latest.id
+            FROM (
+                SELECT DISTINCT ON (account_id) account_id, id
+                FROM account_balance
+                ORDER BY account_id, recorded_at DESC, id DESC
+            ) AS latest
+            WHERE latest.account_id = account.id
+        """))
+        print(f"  ✅ Pointed {result.rowcount} accounts at their latest balance")
+        conn.commit()
+    print("✅ Migration 017 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 017: Dropping account.latest_balance_id...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE account DROP COLUMN IF EXISTS latest_balance_id"))
+        conn.execute(db.text("DROP INDEX IF EXISTS ix_account_balance_account_recorded"))
+        conn.commit()
+    print("✅ Downgrade 017 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 017...")
+    with db.engine.connect() as conn:
+        stale = conn.execute(db.text("""
+            SELECT COUNT(*) FROM account a
+            WHERE a.latest_balance_id IS DISTINCT FROM (
+                SELECT b.id FROM account_balance b WHERE b.account_id = a.id
+                ORDER BY b.recorded_at DESC, b.id DESC LIMIT 1
+            )
+        """)).scalar()
+        print(f"  Accounts not pointing at their newest balance: {stale}")
+        assert stale == 0, "❌ latest_balance_id out of step with account_balance"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
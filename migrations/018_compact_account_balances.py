@@ -0,0 +1,86 @@
+"""
+Migration 018: Compact account_balance history
+
+Adds resolution/min_balance/max_balance to account_balance so old snapshots can be
+folded into hour/day/month buckets (balances.compact_balances), drops snapshots
+that only repeated the previous balance, then runs a first compaction.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from balances import compact_balances, refresh_latest_balances
+
+
+def upgrade():
+    print("🔄 Migration 018: Compacting account_balance...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            ALTER TABLE account_balance
+                ADD COLUMN resolution VARCHAR(5) NOT NULL DEFAULT 'raw',
+                ADD COLUMN min_balance NUMERIC(12, 2),
+                ADD COLUMN max_balance NUMERIC(12, 2)
+        """))
+        print("  ✅ Added 'resolution', 'min_balance' and 'max_balance' columns")
+
+        result = conn.execute(db.text("""
+            DELETE FROM account_balance WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, current_balance,
+                           LAG(current_balance) OVER (PARTITION BY account_id ORDER BY recorded_at, id) AS previous
+                    FROM account_balance
+                ) AS history
+                WHERE current_balance = previous
+            )
+        """))
+        print(f"  ✅ Removed {result.rowcount} snapshots that repeated the previous balance")
+        conn.commit()
+
+    refresh_latest_balances()
+    removed = compact_balances()
+    db.session.commit()
+    print(f"  ✅ Compacted away {removed} old snapshots")
+    print("✅ Migration 018 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 018: Dropping compaction columns...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            ALTER TABLE account_balance
+                DROP COLUMN IF EXISTS resolution,
+                DROP COLUMN IF EXISTS min_balance,
+                DROP COLUMN IF EXISTS max_balance
+        """))
+        conn.commit()
+    print("✅ Downgrade 018 complete (removed snapshots are not restored).")
+
+
+def verify():
+    print("📊 Verifying migration 018...")
+    with db.engine.connect() as conn:
+        rows = conn.execute(db.text(
+            "SELECT resolution, COUNT(*) FROM account_balance GROUP BY resolution ORDER BY resolution"
+        )).all()
+        for resolution, count in rows:
+            print(f"  {resolution}: {count} rows")
+        dangling = conn.execute(db.text("""
+            SELECT COUNT(*) FROM account a
+            WHERE a.latest_balance_id IS NULL
+            AND EXISTS (SELECT 1 FROM account_balance b WHERE b.account_id = a.id)
+        """)).scalar()
+        assert dangling == 0, "❌ accounts with history but no latest_balance_id"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
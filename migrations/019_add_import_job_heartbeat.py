@@ -0,0 +1,54 @@
+"""
+Migration 019: Add import_job.heartbeat_at
+
+Background imports now write their progress to the job row as they go, stamping
+heartbeat_at each time. On startup, a 'running' job whose heartbeat (or start) is
+older than IMPORT_JOB_STALE_SECONDS has lost its worker and is queued again.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+
+
+def upgrade():
+    print("🔄 Migration 019: Adding import_job.heartbeat_at...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE import_job ADD COLUMN heartbeat_at TIMESTAMP"))
+        conn.commit()
+    print("  ✅ Added 'heartbeat_at' column")
+    print("✅ Migration 019 complete. Restart the app to resume interrupted imports.")
+
+
+def downgrade():
+    print("🔄 Downgrade 019: Dropping import_job.heartbeat_at...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE import_job DROP COLUMN IF EXISTS heartbeat_at"))
+        conn.commit()
+    print("✅ Downgrade 019 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 019...")
+    with db.engine.connect() as conn:
+        result = conn.execute(db.text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = 'import_job'
+            AND column_name = 'heartbeat_at'
+        """)).scalar()
+        assert result == "heartbeat_at", "❌ heartbeat_at column missing"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,102 @@
+"""
+Migration 020: Key monthly_category_totals by currency
+
+Totals were summed across currencies and converted with the GBP exponent, so a
+JPY account's spend came out 100x too small. Every cell now holds one currency:
+currency joins the primary key and the rollup is rebuilt from the ledger.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from ledger import rebuild_monthly_totals
+
+
+def upgrade():
+    print("🔄 Migration 020: Adding monthly_category_totals.currency...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text(
+            "ALTER TABLE monthly_category_totals ADD COLUMN currency VARCHAR(3) NOT NULL DEFAULT 'GBP'"
+        ))
+        conn.execute(db.text("ALTER TABLE monthly_category_totals DROP CONSTRAINT monthly_category_totals_pkey"))
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+            ADD PRIMARY KEY (user_id, account_id, category_id, month, currency)
+        """))
+        conn.commit()
+    print("  ✅ Added 'currency' to the primary key")
+
+    rebuild_monthly_totals()
+    db.session.commit()
+    print("  ✅ Rebuilt monthly_category_totals per currency")
+    print("✅ Migration 020 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 020: Merging monthly_category_totals currencies...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("""
+            CREATE TEMP TABLE merged_monthly_totals AS
+            SELECT user_id, account_id, category_id, month,
+                   SUM(total_minor) AS total_minor, SUM(count) AS count,
+                   MIN(min_minor) AS min_minor, MAX(max_minor) AS max_minor,
+                   BOOL_OR(minmax_stale) AS minmax_stale
+            FROM monthly_category_totals
+            GROUP BY user_id, account_id, category_id, month
+        """))
+        conn.execute(db.text("DELETE FROM monthly_category_totals"))
+        conn.execute(db.text("ALTER TABLE monthly_category_totals DROP CONSTRAINT monthly_category_totals_pkey"))
+        conn.execute(db.text("ALTER TABLE monthly_category_totals DROP COLUMN currency"))
+        conn.execute(db.text("""
+            INSERT INTO monthly_category_totals
+                (user_id, account_id, category_id, month, total_minor, count, min_minor, max_minor, minmax_stale)
+            SELECT user_id, account_id, category_id, month, total_minor, count, min_minor, max_minor, minmax_stale
+            FROM merged_monthly_totals
+        """))
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+            ADD PRIMARY KEY (user_id, account_id, category_id, month)
+        """))
+        conn.execute(db.text("DROP TABLE merged_monthly_totals"))
+        conn.commit()
+    print("✅ Downgrade 020 complete.")
+
+
+def verify():
+    print("📊 Verifying migration 020...")
+    with db.engine.connect() as conn:
+        mixed = conn.execute(db.text("""
+            SELECT COUNT(*) FROM (
+                SELECT t.user_id, COALESCE(t.account_id, 0), COALESCE(t.category_id, 0),
+                       date_trunc('month', t.date)::date
+                FROM transaction t
+                GROUP BY 1, 2, 3, 4
+                HAVING COUNT(DISTINCT t.currency) > 1
+            ) cells
+        """)).scalar()
+        split = conn.execute(db.text("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM monthly_category_totals
+                GROUP BY user_id, account_id, category_id, month
+                HAVING COUNT(*) > 1
+            ) cells
+        """)).scalar()
+        print(f"  Cells with more than one currency — ledger: {mixed}, rollup: {split}")
+        assert mixed == split, "❌ monthly_category_totals not split by currency"
+        rolled_up = conn.execute(db.text("SELECT COALESCE(SUM(count), 0) FROM monthly_category_totals")).scalar()
+        ledger = conn.execute(db.text("SELECT COUNT(*) FROM transaction")).scalar()
+        assert rolled_up == ledger, "❌ monthly_category_totals out of step with transaction"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,93 @@
+"""
+Migration 021: Drop the float transaction amounts (contract step of 016)
+
+Run only once every app process is on the minor-unit code. Sweeps up any row
+still missing amount_minor, makes it NOT NULL, removes the trigger migration 016
+used to keep both columns in step, and drops transaction.amount and the float
+columns of monthly_category_totals. Takes a brief table lock for the final sweep.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from money import MINOR_EXPONENTS
+from ledger import rebuild_monthly_totals
+
+
+def _scale(currency_column: str) -> str:
+    """SQL for 10 ** (the currency's minor-unit exponent)."""
+    cases = " ".join(f"WHEN '{code}' THEN {10 ** exponent}" for code, exponent in MINOR_EXPONENTS.items())
+    return f"(CASE {currency_column} {cases} ELSE 100 END)"
+
+
+def upgrade():
+    print("🔄 Migration 021: Dropping float transaction amounts...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("LOCK TABLE transaction IN SHARE ROW EXCLUSIVE MODE"))
+        swept = conn.execute(db.text(f"""
+            UPDATE transaction
+            SET amount_minor = ROUND(amount::numeric * {_scale("currency")})::bigint
+            WHERE amount_minor IS NULL
+        """)).rowcount
+        print(f"  ✅ Filled {swept} rows still missing amount_minor")
+        conn.execute(db.text("ALTER TABLE transaction ALTER COLUMN amount_minor SET NOT NULL"))
+        conn.execute(db.text("DROP TRIGGER IF EXISTS transaction_sync_amount ON transaction"))
+        conn.execute(db.text("DROP FUNCTION IF EXISTS transaction_sync_amount()"))
+        conn.execute(db.text("ALTER TABLE transaction DROP COLUMN amount"))
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+                DROP COLUMN total, DROP COLUMN min_amount, DROP COLUMN max_amount
+        """))
+        conn.commit()
+    print("  ✅ Dropped 'amount' and the float monthly totals")
+
+    rebuild_monthly_totals()
+    db.session.commit()
+    print("✅ Migration 021 complete.")
+
+
+def downgrade():
+    print("🔄 Downgrade 021: Restoring the float amount columns...")
+    with db.engine.connect() as conn:
+        conn.execute(db.text("ALTER TABLE transaction ADD COLUMN amount DOUBLE PRECISION"))
+        conn.execute(db.text(f"UPDATE transaction SET amount = amount_minor::float8 / {_scale('currency')}"))
+        conn.execute(db.text("ALTER TABLE transaction ALTER COLUMN amount_minor DROP NOT NULL"))
+        conn.execute(db.text("""
+            ALTER TABLE monthly_category_totals
+                ADD COLUMN total DOUBLE PRECISION NOT NULL DEFAULT 0,
+                ADD COLUMN min_amount DOUBLE PRECISION,
+                ADD COLUMN max_amount DOUBLE PRECISION
+        """))
+        conn.commit()
+    print("✅ Downgrade 021 complete. Re-run migration 016's trigger setup before serving old code.")
+
+
+def verify():
+    print("📊 Verifying migration 021...")
+    with db.engine.connect() as conn:
+        leftover = conn.execute(db.text("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND ((table_name = 'transaction' AND column_name = 'amount')
+                 OR (table_name = 'monthly_category_totals' AND column_name IN ('total', 'min_amount', 'max_amount')))
+        """)).scalar()
+        assert leftover == 0, "❌ float amount columns still present"
+        nullable = conn.execute(db.text("""
+            SELECT is_nullable FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'transaction' AND column_name = 'amount_minor'
+        """)).scalar()
+        assert nullable == "NO", "❌ amount_minor still nullable"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
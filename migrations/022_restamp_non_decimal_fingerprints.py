@@ -0,0 +1,61 @@
+"""
+Migration 022: Re-fingerprint CSV rows in accounts whose currency isn't 2-decimal
+
+Since migration 016, fingerprints wrote minor units as if every currency had two
+decimal places, so ¥1500 was keyed as "15.00" where the float-era rows have
+"1500.00", and re-uploads to JPY/KWD/... accounts stopped matching. Those
+accounts' CSV rows are re-fingerprinted with the account's currency.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from money import MINOR_EXPONENTS
+from helpers import backfill_fingerprints
+
+
+def _affected_accounts(conn) -> list[int]:
+    return conn.execute(
+        db.text("SELECT id FROM account WHERE UPPER(currency) = ANY(:codes) ORDER BY id"),
+        {"codes": list(MINOR_EXPONENTS)},
+    ).scalars().all()
+
+
+def upgrade():
+    print("🔄 Migration 022: Re-fingerprinting accounts in non-2-decimal currencies...")
+    with db.engine.connect() as conn:
+        account_ids = _affected_accounts(conn)
+    stamped = 0
+    for account_id in account_ids:
+        stamped += backfill_fingerprints(account_id, restamp=True)
+    print(f"  ✅ Re-fingerprinted {stamped} transactions in {len(account_ids)} accounts")
+    print("✅ Migration 022 complete.")
+
+
+def downgrade():
+    print("ℹ️ Downgrade 022: nothing to undo (fingerprints are recomputed, not added).")
+
+
+def verify():
+    print("📊 Verifying migration 022...")
+    with db.engine.connect() as conn:
+        missing = conn.execute(db.text("""
+            SELECT COUNT(*) FROM transaction
+            WHERE fingerprint IS NULL AND plaid_transaction_id IS NULL AND account_id IS NOT NULL
+        """)).scalar()
+        print(f"  CSV rows without a fingerprint: {missing}")
+        assert missing == 0, "❌ some CSV rows were left without a fingerprint"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
@@ -0,0 +1,50 @@
+"""
+Migration 023: Re-fingerprint CSV rows on their raw description
+
+Fingerprints hashed normalised_description, which renormalise_stale_descriptions
+rewrites after a NORMALISER_VERSION bump without touching the fingerprint, so a
+re-uploaded statement then hashed differently and imported every row again. The
+key is now the trimmed description as it appears in the file; every account's
+CSV rows are re-fingerprinted on it.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from helpers import backfill_fingerprints
+
+
+def upgrade():
+    print("🔄 Migration 023: Re-fingerprinting CSV rows on their raw description...")
+    stamped = backfill_fingerprints(restamp=True)
+    print(f"  ✅ Re-fingerprinted {stamped} transactions")
+    print("✅ Migration 023 complete.")
+
+
+def downgrade():
+    print("ℹ️ Downgrade 023: nothing to undo (fingerprints are recomputed, not added).")
+
+
+def verify():
+    print("📊 Verifying migration 023...")
+    with db.engine.connect() as conn:
+        missing = conn.execute(db.text("""
+            SELECT COUNT(*) FROM transaction
+            WHERE fingerprint IS NULL AND plaid_transaction_id IS NULL AND account_id IS NOT NULL
+        """)).scalar()
+        print(f"  CSV rows without a fingerprint: {missing}")
+        assert missing == 0, "❌ some CSV rows were left without a fingerprint"
+    print("✅ Verification passed.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--downgrade' in sys.argv:
+            downgrade()
+        elif '--verify' in sys.argv:
+            verify()
+        else:
+            upgrade()
+            verify()
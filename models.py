@@ -1,13 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy   # Our database helper
 from datetime import datetime
+from itertools import chain
+from flask import g, has_app_context
 from flask_login import UserMixin, current_user
-from sqlalchemy.orm import Query
+from sqlalchemy import event, exists, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Query, Session, aliased
 from sqlalchemy.ext.hybrid import hybrid_property
 
+from money import DEFAULT_CURRENCY, MINOR_EXPONENTS, from_minor, to_minor
+
 
 # This is like the "bridge" between our app and PostgreSQL
 db = SQLAlchemy()
 
+def dialect_insert(table):
+    """Return an INSERT for table that supports on_conflict_do_update/_nothing on the current database."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
 class UserScopedQuery(Query):
     """Custom query class that provides user-scoped filtering."""
 
@@ -64,21 +76,59 @@ class User(UserMixin, db.Model):
 class Transaction(db.Model):
     __tablename__ = "transaction"
     query_class = UserScopedQuery
+    __table_args__ = (
+        # Keyset pagination: WHERE user_id = ? AND (date, id) < (?, ?) ORDER BY date DESC, id DESC
+        db.Index("ix_transaction_user_date_id", "user_id", "date", "id"),
+        # Same, but only the (usually small) uncategorised slice
+        db.Index(
+            "ix_transaction_uncategorised", "user_id", "date", "id",
+            postgresql_where=db.text("category_id IS NULL"),
+            sqlite_where=db.text("category_id IS NULL"),
+        ),
+        # Plaid dedup (migration 003): a bank transaction is imported once per user
+        db.Index(
+            "idx_plaid_tx_user", "user_id", "plaid_transaction_id", unique=True,
+            postgresql_where=db.text("plaid_transaction_id IS NOT NULL"),
+            sqlite_where=db.text("plaid_transaction_id IS NOT NULL"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True, index=True)
     date = db.Column(db.Date, nullable=False)
-    amount = db.Column(db.Float, nullable=False) 
+    amount_minor = db.Column(db.BigInteger, nullable=False)  # whole pence/cents, see money.py
+    currency = db.Column(db.String(3), nullable=False, default=DEFAULT_CURRENCY)
     description = db.Column(db.String(200), nullable=False)
     account = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     normalised_description = db.Column(db.String(200), nullable=True)
+    normaliser_version = db.Column(db.SmallInteger, nullable=True)  # NORMALISER_VERSION that produced it
     plaid_transaction_id = db.Column(db.String(100), nullable=True)
     
     # Relationships
     category_obj = db.relationship('Category', backref='transactions')
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('import_batch.id'), nullable=True, index=True)
+    fingerprint = db.Column(db.String(64), nullable=True, unique=True, index=True)  # CSV rows only, see fingerprint_rows
+
+    @hybrid_property
+    def amount(self):
+        """The amount as an exact Decimal in major units, e.g. Decimal('12.50'). Positive = debit."""
+        return from_minor(self.amount_minor, self.currency)
+
+    @amount.setter
+    def amount(self, value):
+        """Accepts Decimal, int, float or numeric strings; set currency first if it isn't GBP."""
+        self.amount_minor = None if value is None else to_minor(value, self.currency)
+
+    @amount.expression
+    def amount(cls):
+        divisor = db.case(
+            *((cls.currency == code, 10 ** exponent) for code, exponent in MINOR_EXPONENTS.items()),
+            else_=100,
+        )
+        return db.cast(cls.amount_minor, db.Numeric(20, 3)) / divisor
 
     @hybrid_property
     def category(self):
@@ -89,24 +139,16 @@ class Transaction(db.Model):
 
     @category.setter  
     def category(self, value):
-        """Allow setting category by string - finds matching category by name or path"""
+        """Allow setting category by string - finds matching category by name"""
         if value is None:
             self.category_id = None
             return
-        
-        # Import here to avoid circular import
-        from models import Category
-        
-        # Try to find category by full path or name
-        cat = Category.query.for_current_user().filter(
-            (Category.name == value)
-        ).first()
-        
-        if cat:
-            self.category_id = cat.id
-        else:
-            # If not found, leave as None (will handle in migration)
-            self.category_id = None
+
+        # One category load per request/job, however many rows are assigned
+        user_id = self.user_id if self.user_id is not None else current_user.id
+
+        # If not found, leave as None (will handle in migration)
+        self.category_id = category_ids_by_name(user_id).get(value)
 
     def __repr__(self):
         return f"<Transaction {self.description}: £{self.amount}>"
@@ -124,22 +166,147 @@ class Category(db.Model):
     # Relationships
     parent = db.relationship('Category', remote_side=[id], backref='children')
 
+    # is_parent (has children) is a column_property, added after CategoryClosure below
+
     @property
     def full_path(self) -> str:
-        """Return 'Groceries > Supermarket' or just 'Groceries'"""
+        """Return 'Groceries > Supermarket' or just 'Groceries'.
+        Reads self.parent, so load it up front (WITH_CATEGORY_PATHS in blueprints/transactions.py)
+        wherever this runs per row, or every category lazy loads its parent."""
         if self.parent:
             return f"{self.parent.name} > {self.name}"
         return self.name
-    
-    @property
-    def is_parent(self) -> bool:
-        """Check if this category has children"""
-        return len(self.children) > 0
 
     def __repr__(self):
         return f"<Category {self.name}>"
     
 
+class CategoryClosure(db.Model):
+    """Every (ancestor, descendant) pair in a category tree, including each category
+    with itself at depth 0. Kept up to date by category_tree.py; used for rollups."""
+    __tablename__ = "category_closure"
+    __table_args__ = (
+        # transaction.category_id -> every ancestor, without touching the table
+        db.Index("ix_category_closure_descendant", "descendant_id", "ancestor_id"),
+    )
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<CategoryClosure {self.ancestor_id} → {self.descendant_id} ({self.depth})>"
+
+
+# Whether a category has children: a depth-1 closure row under it, selected as part
+# of the category's own SELECT, so reading it never costs a query of its own
+Category.is_parent = db.column_property(
+    exists().where(CategoryClosure.ancestor_id == Category.id, CategoryClosure.depth == 1)
+)
+
+
+class MerchantCategoryStat(db.Model):
+    """How many times a user has filed a normalised description under a category.
+    Kept up to date incrementally by ledger.py; used for category guesses on import."""
+    __tablename__ = "merchant_category_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    normalised_description = db.Column(db.String(200), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MerchantCategoryStat {self.normalised_description} → {self.category_id}: {self.count}>"
+
+
+class UserStats(db.Model):
+    """Dashboard counters for one user, kept up to date incrementally by ledger.py."""
+    __tablename__ = "user_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    uncategorised_count = db.Column(db.Integer, nullable=False, default=0)
+    last_import_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    ledger_version = db.Column(db.Integer, nullable=False, default=0)  # bumped by every ledger write
+
+    def __repr__(self):
+        return f"<UserStats {self.user_id}: {self.total_count} ({self.uncategorised_count} uncategorised)>"
+
+
+class UserAccountStat(db.Model):
+    """Transaction count per account, kept alongside UserStats by ledger.py."""
+    __tablename__ = "user_account_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UserAccountStat {self.user_id}/{self.account_id}: {self.count}>"
+
+
+class MonthlyCategoryTotal(db.Model):
+    """Spend per user, account, category, calendar month and currency, kept up to date by ledger.py.
+    account_id / category_id use 0 for 'none', since they are part of the primary key."""
+    __tablename__ = "monthly_category_totals"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    account_id = db.Column(db.Integer, primary_key=True)   # 0 = no account
+    category_id = db.Column(db.Integer, primary_key=True)  # 0 = uncategorised
+    month = db.Column(db.Date, primary_key=True)           # first day of the month
+    currency = db.Column(db.String(3), primary_key=True, default=DEFAULT_CURRENCY)  # totals are per currency
+    total_minor = db.Column(db.BigInteger, nullable=False, default=0)  # amounts in minor units, see money.py
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_minor = db.Column(db.BigInteger, nullable=True)
+    max_minor = db.Column(db.BigInteger, nullable=True)
+    minmax_stale = db.Column(db.Boolean, nullable=False, default=False)  # an extreme row was removed; recomputed by the write
+
+    def __repr__(self):
+        return f"<MonthlyCategoryTotal {self.user_id}/{self.account_id}/{self.category_id} {self.month}: {self.total_minor} {self.currency}>"
+
+
+class ImportBatch(db.Model):
+    """One CSV upload. Every transaction it created points back here via batch_id."""
+    __tablename__ = "import_batch"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    duplicate_count = db.Column(db.Integer, nullable=False, default=0)  # rows skipped as already imported
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    transactions = db.relationship('Transaction', backref='batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<ImportBatch {self.id} {self.filename} ({self.row_count} rows)>'
+
+
+class ImportJob(db.Model):
+    """A CSV upload queued for background import. The table doubles as the job queue."""
+    __tablename__ = "import_job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)      # original upload name, for display
+    stored_path = db.Column(db.String(500), nullable=False)   # where the upload waits on disk
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # 'queued' | 'running' | 'done' | 'failed'
+    batch_id = db.Column(db.Integer, db.ForeignKey('import_batch.id'), nullable=True)  # set once the import succeeds
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)      # last progress report while running
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
+
 class PlaidItem(db.Model):
     __tablename__ = "plaid_item"
 
@@ -179,26 +346,40 @@ class Account(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Newest balance snapshot, kept up to date by balances.record_balance so pages
+    # showing balances never have to load balance_history
+    latest_balance_id = db.Column(
+        db.Integer,
+        db.ForeignKey('account_balance.id', ondelete='SET NULL', use_alter=True),
+        nullable=True,
+    )
+
     balance_history = db.relationship(
         'AccountBalance',
         backref='account',
+        foreign_keys='AccountBalance.account_id',
         order_by='AccountBalance.recorded_at.desc()',
         cascade='all, delete-orphan',
     )
+    latest_balance = db.relationship('AccountBalance', foreign_keys=[latest_balance_id], post_update=True)
     transactions = db.relationship('Transaction', backref='account_obj', lazy=True)
 
-    @property
-    def latest_balance(self):
-        return self.balance_history[0] if self.balance_history else None
-
     def __repr__(self):
         return f'<Account {self.name} ({self.account_type})>'
 
 
 
 class AccountBalance(db.Model):
-    """Historical balance snapshot for a Accounts. Appended on each sync."""
+    """
+    Historical balance snapshot for an account, written by balances.record_balance
+    whenever a sync sees the balance change. Old snapshots are compacted into
+    hour/day/month buckets holding the last, lowest and highest balance in each.
+    """
     __tablename__ = "account_balance"
+    __table_args__ = (
+        # An account's history newest first (latest balance, refresh_latest_balances)
+        db.Index("ix_account_balance_account_recorded", "account_id", db.text("recorded_at DESC")),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(
@@ -207,5 +388,73 @@ class AccountBalance(db.Model):
         nullable=False,
         index=True,
     )
-    current_balance = db.Column(db.Numeric(12, 2), nullable=False)
-    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    current_balance = db.Column(db.Numeric(12, 2), nullable=False)  # for a bucket: the last balance in it
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # for a bucket: its start
+    resolution = db.Column(db.String(5), nullable=False, default='raw')  # 'raw' | 'hour' | 'day' | 'month'
+    min_balance = db.Column(db.Numeric(12, 2), nullable=True)  # buckets only
+    max_balance = db.Column(db.Numeric(12, 2), nullable=True)  # buckets only
+
+
+def category_ids_by_name(user_id: int) -> dict[str, int]:
+    """
+    {category name: id} for one user, loaded once and kept on flask.g for the rest
+    of the request (or background job). Duplicate names resolve to the lowest id.
+    Dropped whenever a Category is flushed or the session rolls back.
+    """
+    cache = g.setdefault("category_ids", {})
+    ids = cache.get(user_id)
+    if ids is None:
+        ids = {}
+        rows = db.session.execute(
+            select(Category.name, Category.id).where(Category.user_id == user_id).order_by(Category.id)
+        )
+        for name, category_id in rows:
+            ids.setdefault(name, category_id)
+        cache[user_id] = ids
+    return ids
+
+
+def category_paths_by_id(user_id: int) -> dict[int, str]:
+    """
+    {category id: full_path} for one user ('Food > Other', or just 'Food'), in one
+    SELECT joined to the parent. Labels for reports keyed by category id: unlike
+    inverting category_ids_by_name, categories sharing a name each keep theirs.
+    """
+    parent = aliased(Category)
+    rows = db.session.execute(
+        select(Category.id, Category.name, parent.name)
+        .outerjoin(parent, parent.id == Category.parent_id)
+        .where(Category.user_id == user_id)
+    )
+    return {i: f"{parent_name} > {name}" if parent_name else name for i, name, parent_name in rows}
+
+
+def ledger_currencies(user_id: int) -> list[str]:
+    """
+    Currencies the user has transactions in, most transactions first, read from the
+    monthly_category_totals rollup. Amounts are only ever totalled within one of these.
+    """
+    counts = func.sum(MonthlyCategoryTotal.count)
+    rows = db.session.execute(
+        select(MonthlyCategoryTotal.currency)
+        .where(MonthlyCategoryTotal.user_id == user_id)
+        .group_by(MonthlyCategoryTotal.currency)
+        .having(counts > 0)
+        .order_by(counts.desc(), MonthlyCategoryTotal.currency)
+    )
+    return list(rows.scalars())
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_category_ids_on_change(session, flush_context):
+    if has_app_context() and any(
+        isinstance(obj, Category) for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        g.pop("category_ids", None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_category_ids_on_rollback(session, previous_transaction):
+    if has_app_context():
+        g.pop("category_ids", None)
+
@@ -0,0 +1,78 @@
+"""
+Money as integer minor units.
+
+Transaction amounts are stored as whole minor units (pence, cents, yen) in a
+BIGINT column, so SQL SUMs and NumPy aggregates are exact integer arithmetic and
+nothing needs rounding afterwards. Decimal is the view for display and editing;
+floats only appear where they arrive (Plaid JSON, CSV type inference) and are
+rounded to the nearest minor unit once, on the way in.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_CURRENCY = "GBP"
+
+# ISO 4217 currencies whose minor unit isn't 1/100
+MINOR_EXPONENTS = {
+    "JPY": 0, "KRW": 0, "ISK": 0, "CLP": 0, "VND": 0,
+    "BHD": 3, "JOD": 3, "KWD": 3, "OMR": 3, "TND": 3,
+}
+
+
+def minor_exponent(currency: str | None) -> int:
+    """Decimal places of currency's minor unit (2 unless listed in MINOR_EXPONENTS)."""
+    return MINOR_EXPONENTS.get((currency or DEFAULT_CURRENCY).upper(), 2)
+
+
+def to_minor(value, currency: str | None = DEFAULT_CURRENCY) -> int:
+    """
+    An amount in major units (Decimal, int, float or numeric string) as whole minor
+    units, rounding half away from zero: to_minor("12.345") == 1235.
+    Floats go through their shortest repr, so to_minor(0.1 + 0.2) == 30.
+    """
+    amount = value if isinstance(value, Decimal) else Decimal(str(value))
+    return int(amount.scaleb(minor_exponent(currency)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor: int | None, currency: str | None = DEFAULT_CURRENCY) -> Decimal | None:
+    """Whole minor units as an exact Decimal in major units: from_minor(1250) == Decimal("12.50")."""
+    if minor is None:
+        return None
+    return Decimal(int(minor)).scaleb(-minor_exponent(currency))
+
+
+def minor_to_float(minor: int | None, currency: str | None = DEFAULT_CURRENCY) -> float | None:
+    """Major units as a float, for JSON responses."""
+    if minor is None:
+        return None
+    return int(minor) / 10 ** minor_exponent(currency)
+
+
+def to_minor_series(values: pd.Series, currency: str | None = DEFAULT_CURRENCY) -> pd.Series:
+    """
+    Vectorised to_minor for a numeric Series, as nullable Int64. Values that aren't
+    finite numbers become <NA>. Matches to_minor on anything with at most six
+    decimal places: the scaled value is first rounded to 6 places to shed binary
+    noise (2.675 * 100 == 267.49999999999997), then rounded half away from zero.
+    """
+    scaled = pd.to_numeric(values, errors="coerce").astype("float64").to_numpy() * 10 ** minor_exponent(currency)
+    scaled = np.round(scaled, 6)
+    minor = np.trunc(scaled + np.copysign(0.5, scaled))
+    minor[~np.isfinite(minor)] = np.nan
+    return pd.Series(minor, index=values.index).astype("Int64")
+
+
+def format_minor_series(minor: pd.Series, currency: str | None = DEFAULT_CURRENCY) -> pd.Series:
+    """Int minor units as plain decimal strings ("-12.50", "0.05"), without going through floats."""
+    exponent = minor_exponent(currency)
+    values = minor.astype("int64")
+    magnitude = values.abs()
+    sign = pd.Series(np.where(values < 0, "-", ""), index=minor.index)
+    whole = (magnitude // 10 ** exponent).astype(str)
+    if not exponent:
+        return sign + whole
+    fraction = (magnitude % 10 ** exponent).astype(str).str.zfill(exponent)
+    return sign + whole + "." + fraction
@@ -0,0 +1,69 @@
+"""
+Merchant description normaliser.
+
+Strips the variable parts of bank descriptions (dates, references, channel codes)
+so 'BUTTERNUT BOX ON 01 FEB BCC' and 'BUTTERNUT BOX ON 14 MAR BCC' both become
+'BUTTERNUT BOX' and can be matched against each other.
+
+Bump NORMALISER_VERSION whenever the rules below change: every stored
+normalised_description is stamped with the version that produced it, so stale
+rows can be found and re-normalised (see helpers.renormalise_stale_descriptions).
+"""
+from functools import lru_cache
+import re
+
+import pandas as pd
+
+NORMALISER_VERSION = 1
+
+# How many distinct raw descriptions to memoise — merchants repeat a lot
+CACHE_SIZE = 50_000
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Applied in this order, on the whitespace-collapsed (not yet uppercased) text
+_STRIP_PATTERNS = (
+    # Patterns like 'ON 01 FEB', 'ON 12 MAR', etc. (rough heuristic)
+    re.compile(r"\bON\s+\d{1,2}\s+[A-Z]{3}\b"),
+    # Trailing 'BCC', 'POS', etc. (add more as you discover patterns)
+    re.compile(r"\b(BCC|POS|DD|CARD)\b$"),
+    # Date patterns like 12/01/2024, 01-02-2024
+    re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b"),
+    # REF: patterns like REF:123456789
+    re.compile(r"\bREF:\d+\b"),
+)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalise(description: str) -> str:
+    text = " ".join(description.split())
+    for pattern in _STRIP_PATTERNS:
+        text = pattern.sub("", text)
+    # Final cleanup: collapse spaces again and uppercase for consistent matching
+    return " ".join(text.split()).upper()
+
+
+def normalise_description(description: str) -> str:
+    """
+    Normalise a single description. Repeated inputs are answered from an LRU memo.
+    """
+    if not description:
+        return ""
+    return _normalise(description)
+
+
+def normalise_series(descriptions: pd.Series) -> pd.Series:
+    """
+    Normalise a whole column of descriptions with pandas .str methods.
+    Only distinct values are processed; results are broadcast back to every row.
+    Gives exactly the same output as normalise_description, row for row.
+    """
+    codes, uniques = pd.factorize(descriptions.fillna("").astype(str))
+
+    text = pd.Series(uniques, dtype=object)
+    text = text.str.replace(_WHITESPACE, " ", regex=True).str.strip()
+    for pattern in _STRIP_PATTERNS:
+        text = text.str.replace(pattern, "", regex=True)
+    text = text.str.replace(_WHITESPACE, " ", regex=True).str.strip().str.upper()
+
+    return pd.Series(text.to_numpy()[codes], index=descriptions.index, dtype=object)
@@ -1,31 +1,253 @@
+"""
+CSV parsing for bank exports.
+
+Each bank's export layout is a BankFormat profile: which columns hold the date,
+amount and description, the date format, the sign convention and (optionally) a
+fixed encoding. Profiles are registered once at import time, keyed by their
+header row, so detect_format picks the right one with a single dict lookup.
+Each profile also precomputes its parse plan (columns to read, dtypes), and files
+are read with pyarrow's CSV reader when it is installed, pandas' C engine otherwise.
+Amounts come out as int64 minor units (see money.py).
+"""
+import csv
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
 import pandas as pd
 
+from money import DEFAULT_CURRENCY, to_minor_series
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional — pandas' C engine is used instead
+    pa = None
+
+
+@dataclass(frozen=True)
+class BankFormat:
+    """One bank's CSV export layout. Parse plan fields are derived in __post_init__."""
+    name: str
+    header: tuple[str, ...]               # the export's full header row, used for detection
+    date_column: str
+    amount_column: str
+    description_column: str
+    reference_column: str | None = None   # appended to the description when non-empty
+    date_format: str = "%d/%m/%Y"
+    invert_amounts: bool | None = None    # True = file stores expenses as negatives, None = ask the account
+    encoding: str | None = None           # None = detect per file
+    filter_column: str | None = None      # only rows whose value here is in filter_values are imported
+    filter_values: frozenset[str] = frozenset()
+
+    # Parse plan, computed once per profile
+    required: frozenset[str] = field(init=False)
+    usecols: tuple[str, ...] = field(init=False)
+    text_dtypes: dict = field(init=False, compare=False)
+
+    def __post_init__(self):
+        required = (self.date_column, self.amount_column, self.description_column)
+        optional = tuple(c for c in (self.reference_column, self.filter_column) if c)
+        usecols = required + optional
+        object.__setattr__(self, "required", frozenset(required))
+        object.__setattr__(self, "usecols", usecols)
+        # Dates and text are read as plain strings so pandas doesn't guess at them;
+        # the amount is left to type inference, which yields float64 for clean files
+        object.__setattr__(self, "text_dtypes", {c: str for c in usecols if c != self.amount_column})
+
+    def parse(self, df: pd.DataFrame, invert_amounts: bool | None, currency: str = DEFAULT_CURRENCY) -> pd.DataFrame:
+        """
+        Map a raw chunk onto the standard Date, AmountMinor, Description columns, with
+        amounts as nullable Int64 in currency's minor units.
+        Unparseable dates and amounts become NaT/<NA> so the caller can report their rows.
+        Rows the profile's filter rejects (e.g. reverted card payments) are dropped;
+        the index is kept, so row numbers in errors still match the file.
+        invert_amounts is the account's setting, used only when the profile has no
+        sign convention of its own.
+        """
+        if self.filter_column and self.filter_column in df.columns:
+            df = df[df[self.filter_column].fillna("").astype(str).str.strip().isin(self.filter_values)]
+
+        dates = df[self.date_column]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, format=self.date_format, errors="coerce")
+
+        amounts = df[self.amount_column]
+        if not pd.api.types.is_numeric_dtype(amounts):
+            cleaned = amounts.astype(str).str.replace(r"[£$€,\s]", "", regex=True)
+            amounts = pd.to_numeric(cleaned, errors="coerce")
+
+        result = pd.DataFrame(index=df.index)
+        result["Date"] = dates
+        result["AmountMinor"] = to_minor_series(amounts, currency)
+        result["Description"] = df[self.description_column].fillna("").astype(str).str.strip()
+
+        # Append Reference to Description if the column exists and is non-empty
+        if self.reference_column and self.reference_column in df.columns:
+            ref = df[self.reference_column].fillna("").astype(str).str.strip()
+            mask = (ref != "") & (ref != "nan")
+            result.loc[mask, "Description"] = result.loc[mask, "Description"] + " | " + ref[mask]
+
+        # Flip signs if expenses are stored as negatives in the file
+        invert = self.invert_amounts if self.invert_amounts is not None else invert_amounts
+        if invert is True:
+            result["AmountMinor"] = -result["AmountMinor"]
+
+        return result
+
+
+# header (as a set) -> profile, in registration order
+_FORMATS: dict[frozenset[str], BankFormat] = {}
+
+
+def register_format(fmt: BankFormat) -> BankFormat:
+    """Add a profile to the registry. Later registrations win on an identical header."""
+    _FORMATS[frozenset(fmt.header)] = fmt
+    return fmt
+
+
+STANDARD = register_format(BankFormat(
+    name="Standard",
+    header=("Date", "Amount", "Description"),
+    date_column="Date",
+    amount_column="Amount",
+    description_column="Description",
+    reference_column="Reference",
+))
+
+BARCLAYS = register_format(BankFormat(
+    name="Barclays",
+    header=("Number", "Date", "Account", "Amount", "Subcategory", "Memo"),
+    date_column="Date",
+    amount_column="Amount",
+    description_column="Memo",
+    invert_amounts=True,
+))
+
+REVOLUT = register_format(BankFormat(
+    name="Revolut",
+    header=("Type", "Product", "Completed Date", "Description", "Amount", "Fee", "Currency", "State", "Balance"),
+    date_column="Completed Date",
+    amount_column="Amount",
+    description_column="Description",
+    date_format="%d/%m/%Y %H:%M",
+    invert_amounts=True,
+    # Pending and reverted rows have no Completed Date and never moved money
+    filter_column="State",
+    filter_values=frozenset({"COMPLETED"}),
+))
+
+
+def detect_format(columns) -> BankFormat:
+    """
+    Pick the profile for a header row. An exact header match is one dict lookup;
+    otherwise the first profile whose required columns are all present wins
+    (e.g. a standard file with an extra Reference column).
+    Raises ValueError listing the supported formats.
+    """
+    header = frozenset(str(c).strip().lstrip("\ufeff") for c in columns)
+    fmt = _FORMATS.get(header)
+    if fmt is not None:
+        return fmt
+    for fmt in _FORMATS.values():
+        if fmt.required <= header:
+            return fmt
+
+    supported = "; ".join(f"{f.name} ({', '.join(sorted(f.required))})" for f in _FORMATS.values())
+    raise ValueError(f"Unrecognised CSV columns: {', '.join(sorted(header))}. Supported formats: {supported}")
+
+
+def read_header(stream, encoding: str) -> list[str]:
+    """Read the header row of a binary stream, then rewind it."""
+    try:
+        line = stream.readline().decode(encoding)
+    finally:
+        stream.seek(0)
+    return next(csv.reader([line]), [])
+
+
+def read_csv_chunks(stream, fmt: BankFormat, encoding: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Yield the profile's columns in DataFrames of at most chunk_rows rows, using pyarrow
+    when available. The row index carries on across chunks, so row numbers in errors
+    stay file-wide.
+    """
+    if pa is not None:
+        yield from _read_arrow_chunks(stream, fmt, encoding, chunk_rows)
+        return
+
+    with pd.read_csv(
+        stream,
+        encoding=encoding,
+        chunksize=chunk_rows,
+        usecols=lambda c: c in fmt.usecols,  # optional columns may be absent
+        dtype=fmt.text_dtypes,
+        skipinitialspace=True,
+    ) as reader:
+        yield from reader
+
+
+def _read_arrow_chunks(stream, fmt: BankFormat, encoding: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """pyarrow's streaming CSV reader, re-sliced into chunk_rows-sized DataFrames."""
+    header = [c.lstrip("\ufeff") for c in read_header(stream, encoding)]
+    reader = pa_csv.open_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(
+            encoding="utf8" if encoding.startswith("utf-8") else encoding,
+            column_names=header,
+            skip_rows=1,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=[c for c in fmt.usecols if c in header],
+            column_types={c: pa.string() for c in fmt.usecols},
+        ),
+    )
+
+    start = 0
+    pending = None
+    for record_batch in reader:
+        table = pa.Table.from_batches([record_batch])
+        if pending is not None:
+            table = pa.concat_tables([pending, table])
+        while table.num_rows >= chunk_rows:
+            yield _arrow_frame(table.slice(0, chunk_rows), fmt, start)
+            start += chunk_rows
+            table = table.slice(chunk_rows)
+        pending = table
+    if pending is not None and pending.num_rows:
+        yield _arrow_frame(pending, fmt, start)
+
+
+def _arrow_frame(table, fmt: BankFormat, start: int) -> pd.DataFrame:
+    """
+    Convert dates and amounts inside Arrow, so they reach pandas as datetime64 and
+    float64 rather than Python strings. An amount column that won't cast cleanly is
+    left as text for BankFormat.parse to clean up and flag row by row.
+    """
+    index = table.schema.get_field_index(fmt.date_column)
+    dates = pc.strptime(table[fmt.date_column], format=fmt.date_format, unit="s", error_is_null=True)
+    table = table.set_column(index, fmt.date_column, dates)
+
+    try:
+        amounts = pc.cast(table[fmt.amount_column], pa.float64())
+        index = table.schema.get_field_index(fmt.amount_column)
+        table = table.set_column(index, fmt.amount_column, amounts)
+    except pa.ArrowInvalid:
+        pass
+
+    df = table.to_pandas()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
 
 def parse_standard_csv(df: pd.DataFrame, invert_amounts: bool | None) -> pd.DataFrame:
     """
     Parse a standard-format CSV into a normalised DataFrame.
 
     Expected columns: Date (DD-MM-YYYY), Amount, Description, Reference (optional)
-    Returns columns:  Date, Amount, Description
+    Returns columns:  Date, AmountMinor (pence), Description
     """
-    required = {"Date", "Amount", "Description"}
-    missing = required - set(df.columns)
+    missing = STANDARD.required - set(df.columns)
     if missing:
         raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
-
-    result = pd.DataFrame()
-    result["Date"] = pd.to_datetime(df["Date"], format="%d/%m/%Y")
-    result["Amount"] = df["Amount"].astype(float)
-    result["Description"] = df["Description"].astype(str).str.strip()
-
-    # Append Reference to Description if the column exists and is non-empty
-    if "Reference" in df.columns:
-        ref = df["Reference"].astype(str).str.strip()
-        mask = ref.notna() & (ref != "") & (ref != "nan")
-        result.loc[mask, "Description"] = result.loc[mask, "Description"] + " | " + ref[mask]
-
-    # Flip signs if expenses are stored as negatives in the file
-    if invert_amounts is True:
-        result["Amount"] = result["Amount"] * -1
-
-    return result
+    return STANDARD.parse(df, invert_amounts)
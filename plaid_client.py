@@ -1,5 +1,10 @@
 import os
+import socket
+import threading
+from collections.abc import Iterator
+
 import plaid
+from urllib3.connection import HTTPConnection
 from plaid.api import plaid_api
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
 from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
@@ -10,9 +15,22 @@ from plaid.model.country_code import CountryCode
 from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
 
 
-def get_plaid_client() -> plaid_api.PlaidApi:
-    """Build and return a configured Plaid API client.
-    Reads PLAID_ENV from .env to switch between sandbox and production.
+# One client per process, shared by every request and sync worker thread. Its
+# urllib3 pool is thread-safe and keeps connections to Plaid alive between calls,
+# so only the first call pays for the TLS handshake.
+_client: plaid_api.PlaidApi | None = None
+_client_lock = threading.Lock()
+
+
+def _request_timeout() -> tuple[float, float]:
+    """(connect, read) timeout in seconds for every Plaid call, from PLAID_CONNECT_TIMEOUT / PLAID_READ_TIMEOUT."""
+    return float(os.getenv("PLAID_CONNECT_TIMEOUT", "5")), float(os.getenv("PLAID_READ_TIMEOUT", "30"))
+
+
+def _build_plaid_client() -> plaid_api.PlaidApi:
+    """Build a configured Plaid API client.
+    Reads PLAID_ENV from .env to switch between sandbox and production, and
+    PLAID_POOL_SIZE for how many connections to Plaid may be open at once.
     """
     env_map = {
         "sandbox": plaid.Environment.Sandbox,
@@ -28,9 +46,34 @@ def get_plaid_client() -> plaid_api.PlaidApi:
             "secret": os.getenv(secret_key),
         }
     )
+    # Enough connections for every sync worker; TCP keepalive stops idle pooled
+    # connections being dropped silently by NAT/load balancers between syncs
+    config.connection_pool_maxsize = int(os.getenv("PLAID_POOL_SIZE", "10"))
+    config.socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
     return plaid_api.PlaidApi(plaid.ApiClient(config))
 
 
+def get_plaid_client() -> plaid_api.PlaidApi:
+    """Return the process-wide Plaid API client, building it on first use."""
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_plaid_client()
+            client = _client
+    return client
+
+
+def reset_plaid_client() -> None:
+    """Close and forget the shared client, so the next call builds a fresh one (tests, config changes)."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.api_client.close()
+
+
 def create_link_token(user_id: int) -> str:
     """Generate a short-lived link_token for the frontend to open Plaid Link.
     Called when the user clicks 'Connect a Bank'.
@@ -43,7 +86,7 @@ def create_link_token(user_id: int) -> str:
         language="en",
         user=LinkTokenCreateRequestUser(client_user_id=str(user_id))
     )
-    response = client.link_token_create(request)
+    response = client.link_token_create(request, _request_timeout=_request_timeout())
     return response["link_token"]
 
 
@@ -53,22 +96,21 @@ def exchange_public_token(public_token: str) -> dict:
     """
     client = get_plaid_client()
     request = ItemPublicTokenExchangeRequest(public_token=public_token)
-    response = client.item_public_token_exchange(request)
+    response = client.item_public_token_exchange(request, _request_timeout=_request_timeout())
     return {
         "access_token": response["access_token"],
         "item_id": response["item_id"],
     }
 
 
-def sync_transactions(item) -> tuple[list, list, str]:
-    """Fetch new and removed transactions for a linked bank account.
+def iter_transaction_pages(item) -> Iterator[tuple[list, list, list, str]]:
+    """Fetch new, modified and removed transactions for a linked bank account, one page at a time.
     Uses cursor-based pagination — on first sync, cursor is None (full history).
     On subsequent syncs, cursor picks up only new changes (incremental).
-    Returns: (added, removed, next_cursor)
+    Yields (added, modified, removed, next_cursor) per page, so the caller can save each page
+    and checkpoint next_cursor before the next one is requested.
     """
     client = get_plaid_client()
-    added = []
-    removed = []
     cursor = item.cursor  # None on first sync, saved value on subsequent syncs
 
     while True:
@@ -76,24 +118,20 @@ def sync_transactions(item) -> tuple[list, list, str]:
             access_token=item.access_token,
             **( {"cursor": cursor} if cursor else {} )
         )
-        response = client.transactions_sync(request)
-        added.extend(response["added"])
-        removed.extend(response["removed"])
+        response = client.transactions_sync(request, _request_timeout=_request_timeout())
         cursor = response["next_cursor"]
+        yield response["added"], response["modified"], response["removed"], cursor
 
         # Plaid paginates in batches — keep looping until all pages fetched
         if not response["has_more"]:
             break
 
-    return added, removed, cursor
-
-
 
 def get_balances(item) -> list[dict]:
     """Fetch current balances for all accounts in a PlaidItem."""
     client = get_plaid_client()
     request = AccountsBalanceGetRequest(access_token=item.access_token)
-    response = client.accounts_balance_get(request)
+    response = client.accounts_balance_get(request, _request_timeout=_request_timeout())
     return [
         {
             'plaid_account_id': acct.account_id,
@@ -0,0 +1,180 @@
+"""
+Concurrent, streaming Plaid sync for a user's linked banks.
+
+The slow part of a sync is the network: transactions/sync (many pages on a first
+sync) and accounts/balance/get for every PlaidItem. stream_items runs those calls
+for all of a user's items on a small thread pool, so the wait is the slowest bank
+rather than the sum of them, and hands each page back to the calling thread as
+soon as it arrives. The caller saves the page and commits with the item's cursor
+moved to that page's next_cursor, so memory is bounded by a few pages however
+much history there is, and an interrupted sync resumes from the last page saved.
+
+Worker threads only see plain ItemCredentials, never the ORM objects or the
+session; pages travel through a bounded queue, so a slow database holds the
+downloads back instead of letting them pile up. Each item's outcome, including how
+long it took and any error, is kept separately, so one failing or slow bank
+doesn't hold up or fail the others.
+"""
+# Standard library
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import queue
+import threading
+import time
+
+# Third-party
+from flask import Flask
+
+# Local
+from models import PlaidItem
+from plaid_client import iter_transaction_pages, get_balances
+
+
+def init_plaid_sync(app: Flask) -> None:
+    """Set config defaults."""
+    app.config.setdefault("PLAID_SYNC_WORKERS", 4)
+    app.config.setdefault("PLAID_SYNC_TIMEOUT", 60)     # seconds a bank may take to answer, then it is failed
+    app.config.setdefault("PLAID_SYNC_QUEUE_PAGES", 4)  # pages downloaded ahead of the database
+
+
+@dataclass(frozen=True)
+class ItemCredentials:
+    """What the Plaid calls need from a PlaidItem, copied out of the session."""
+    access_token: str
+    cursor: str | None
+
+
+@dataclass(frozen=True)
+class TransactionPage:
+    """One transactions/sync page."""
+    added: list
+    modified: list
+    removed: list
+    next_cursor: str
+
+
+@dataclass
+class ItemSync:
+    """Progress of one item: pages fetched so far, then its balances or the error that stopped it."""
+    item_id: int
+    institution_name: str
+    pages: int = 0
+    balances: list[dict] = field(default_factory=list)
+    seconds: float = 0.0
+    finished: bool = False
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _Cancelled(Exception):
+    """Raised in a worker when the consumer has stopped listening."""
+
+
+def stream_items(
+    items: list[PlaidItem], max_workers: int, timeout: float | None = None, queue_pages: int = 4,
+) -> Iterator[tuple[ItemSync, TransactionPage | None]]:
+    """
+    Sync every item concurrently on up to max_workers threads, yielding in the
+    caller's thread:
+      (status, page)  for each transactions page, in order within an item
+      (status, None)  once per item when it has finished: status.balances is filled
+                      in, or status.error says why it stopped (including a timeout)
+    An item times out when Plaid has gone timeout seconds without answering it.
+    Time a worker spends waiting for the caller to take its pages doesn't count,
+    so a long first sync isn't cut off while the caller is busy saving pages.
+    At most queue_pages pages are waiting at any time. Closing the generator early
+    stops the workers at their next page.
+    """
+    statuses = {item.id: ItemSync(item_id=item.id, institution_name=item.institution_name) for item in items}
+    if not items:
+        return
+
+    events = queue.Queue(maxsize=queue_pages)
+    stop = threading.Event()
+    abandoned = set()   # items timed out: their workers stop at the next page
+    waiting_since = {}  # item_id -> when its worker last started waiting on Plaid (once it has started)
+    queued = set()      # items whose worker is blocked handing a page over
+
+    def put(item_id: int, event) -> None:
+        queued.add(item_id)
+        try:
+            while not stop.is_set() and item_id not in abandoned:
+                try:
+                    events.put(event, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise _Cancelled()
+        finally:
+            queued.discard(item_id)
+            waiting_since[item_id] = time.monotonic()
+
+    def work(item_id: int, credentials: ItemCredentials) -> None:
+        started = time.perf_counter()
+        waiting_since[item_id] = time.monotonic()
+        try:
+            for added, modified, removed, next_cursor in iter_transaction_pages(credentials):
+                put(item_id, (item_id, TransactionPage(added, modified, removed, next_cursor), None))
+            put(item_id, (item_id, get_balances(credentials), time.perf_counter() - started))
+        except _Cancelled:
+            pass
+        except Exception as e:
+            try:
+                put(item_id, (item_id, e, time.perf_counter() - started))
+            except _Cancelled:
+                pass
+
+    def stalled() -> list[ItemSync]:
+        """Unfinished items whose worker has waited on Plaid for longer than timeout."""
+        if timeout is None:
+            return []
+        now = time.monotonic()
+        return [
+            status for item_id, status in statuses.items()
+            if not status.finished and item_id in waiting_since and item_id not in queued
+            and now - waiting_since[item_id] > timeout
+        ]
+
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="plaid-sync")
+    try:
+        for item in items:
+            pool.submit(work, item.id, ItemCredentials(access_token=item.access_token, cursor=item.cursor))
+
+        pending = len(items)
+        poll = 0.1 if timeout is None else min(timeout, 0.1)
+        while pending:
+            try:
+                item_id, payload, seconds = events.get(timeout=poll)
+            except queue.Empty:
+                for status in stalled():
+                    abandoned.add(status.item_id)
+                    status.finished = True
+                    status.seconds = time.perf_counter() - started
+                    status.error = f"timed out: no response from the bank for {timeout:g}s"
+                    pending -= 1
+                    yield status, None
+                continue
+            status = statuses[item_id]
+            if status.finished:
+                continue  # a late event from an item that already timed out
+            if isinstance(payload, TransactionPage):
+                status.pages += 1
+                yield status, payload
+                continue
+            status.finished = True
+            status.seconds = seconds
+            if isinstance(payload, Exception):
+                status.error = str(payload) or type(payload).__name__
+            else:
+                status.balances = payload
+            pending -= 1
+            yield status, None
+    finally:
+        # Don't keep the request waiting on a bank that has already timed out
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,264 @@
+"""
+In-memory columnar snapshots of a user's ledger for analytics.
+
+A LedgerSnapshot holds one user's transactions as parallel NumPy arrays, loaded
+with a single SELECT, so totals, averages, percentiles and group-bys are
+vectorised operations rather than a SQL aggregate per request. Snapshots are
+cached per process in an LRU capped at LEDGER_SNAPSHOT_CACHE_BYTES and tagged
+with the user_stats.ledger_version they were built from. Every ledger write
+bumps that version (ledger.py), so a cached snapshot is only served while it is
+still current.
+"""
+# Standard library
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import date
+import threading
+
+# Third-party
+import numpy as np
+import pandas as pd
+from flask import Flask, current_app
+from sqlalchemy import select
+
+# Local
+from models import db, category_paths_by_id, Account, Transaction, UserStats
+from money import DEFAULT_CURRENCY, minor_exponent, minor_to_float
+
+
+GROUP_BYS = ("category", "account", "merchant", "month")
+
+
+@dataclass(frozen=True, eq=False)
+class LedgerSnapshot:
+    """One user's ledger as parallel arrays, one element per transaction."""
+    user_id: int
+    version: int               # user_stats.ledger_version it was built from
+    days: np.ndarray           # int64 days since 1970-01-01
+    pence: np.ndarray          # int64 amount_minor
+    category: np.ndarray       # int32 category id, 0 = uncategorised
+    account: np.ndarray        # int32 account id, 0 = none
+    merchant: np.ndarray       # int32 index into merchants, -1 = no normalised description
+    currency: np.ndarray       # int32 index into currencies
+    merchants: tuple[str, ...]
+    currencies: tuple[str, ...]
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @cached_property
+    def nbytes(self) -> int:
+        arrays = (self.days, self.pence, self.category, self.account, self.merchant, self.currency)
+        strings = self.merchants + self.currencies
+        return sum(a.nbytes for a in arrays) + sum(len(m) + 49 for m in strings)  # ~49 bytes per str object
+
+    @cached_property
+    def currencies_by_use(self) -> list[str]:
+        """The ledger's currencies, most transactions first."""
+        counts = np.bincount(self.currency, minlength=len(self.currencies))
+        return [self.currencies[i] for i in np.lexsort((self.currencies, -counts))]
+
+    def mask(self, start: date | None = None, end: date | None = None, account_id: int | None = None,
+             currency: str | None = None) -> np.ndarray:
+        """
+        Boolean selector for start <= date <= end (inclusive) and, optionally, one
+        account and one currency.
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if start is not None:
+            selected &= self.days >= _day_number(start)
+        if end is not None:
+            selected &= self.days <= _day_number(end)
+        if account_id is not None:
+            selected &= self.account == account_id
+        if currency is not None:
+            code = self.currencies.index(currency) if currency in self.currencies else -1
+            selected &= self.currency == code
+        return selected
+
+    def summary(self, selected: np.ndarray, currency: str | None = DEFAULT_CURRENCY) -> dict:
+        """
+        Count, total, mean, median, 90th percentile, min and max of the selected
+        amounts, in major units of currency; the selection must be in that currency alone.
+        """
+        pence = self.pence[selected]
+        if not len(pence):
+            return {"count": 0, "total": 0.0, "mean": None, "median": None, "p90": None, "min": None, "max": None}
+        exponent = minor_exponent(currency)
+        median, p90 = np.percentile(pence, [50, 90])
+        return {
+            "count": int(len(pence)),
+            "total": minor_to_float(pence.sum(), currency),
+            "mean": round(float(pence.mean()) / 10 ** exponent, exponent),
+            "median": round(float(median) / 10 ** exponent, exponent),
+            "p90": round(float(p90) / 10 ** exponent, exponent),
+            "min": minor_to_float(pence.min(), currency),
+            "max": minor_to_float(pence.max(), currency),
+        }
+
+    def group_totals(self, by: str, selected: np.ndarray) -> list[tuple[int, int, int]]:
+        """
+        (key, count, total pence) per distinct key among the selected rows, biggest
+        total first. by is one of GROUP_BYS; month keys are months since 1970-01.
+        """
+        if by == "month":
+            keys = self.days[selected].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        else:
+            keys = getattr(self, by)[selected]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique))
+        totals = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(totals, inverse, self.pence[selected])  # exact integer sums, unlike bincount's float weights
+        order = np.lexsort((unique, -totals))
+        return [(int(unique[i]), int(counts[i]), int(totals[i])) for i in order]
+
+
+def _day_number(day: date) -> int:
+    return int(np.datetime64(day, "D").astype(np.int64))
+
+
+def build_snapshot(user_id: int, version: int) -> LedgerSnapshot:
+    """Load a user's ledger into a LedgerSnapshot with one SELECT."""
+    tx = Transaction.__table__
+    rows = db.session.execute(
+        select(tx.c.date, tx.c.amount_minor, tx.c.category_id, tx.c.account_id, tx.c.normalised_description,
+               tx.c.currency)
+        .where(tx.c.user_id == user_id)
+    ).all()
+    dates, amounts, categories, accounts, merchants, currencies = zip(*rows) if rows else ((),) * 6
+
+    codes, uniques = pd.factorize(pd.Series(merchants, dtype=object))
+    currency_codes, currency_uniques = pd.factorize(
+        pd.Series([c or DEFAULT_CURRENCY for c in currencies], dtype=object)
+    )
+    return LedgerSnapshot(
+        user_id=user_id,
+        version=version,
+        days=np.array(dates, dtype="datetime64[D]").astype(np.int64),
+        pence=np.array(amounts, dtype=np.int64),
+        category=np.array([c or 0 for c in categories], dtype=np.int32),
+        account=np.array([a or 0 for a in accounts], dtype=np.int32),
+        merchant=codes.astype(np.int32),
+        currency=currency_codes.astype(np.int32),
+        merchants=tuple(uniques),
+        currencies=tuple(currency_uniques),
+    )
+
+
+class SnapshotCache:
+    """Thread-safe LRU of LedgerSnapshots keyed by user, bounded by total nbytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, LedgerSnapshot] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, version: int, build: Callable[[], LedgerSnapshot]) -> LedgerSnapshot:
+        """The cached snapshot if it was built from version, else build() one and cache it."""
+        with self._lock:
+            snapshot = self._entries.get(user_id)
+            if snapshot is not None and snapshot.version == version:
+                self._entries.move_to_end(user_id)
+                return snapshot
+
+        # Built outside the lock so one user's load doesn't block everyone else's reads
+        snapshot = build()
+        self.put(snapshot)
+        return snapshot
+
+    def put(self, snapshot: LedgerSnapshot) -> None:
+        """Cache snapshot (replacing the user's old one), evicting least recently used ones to fit."""
+        with self._lock:
+            current = self._entries.get(snapshot.user_id)
+            if current is not None and current.version > snapshot.version:
+                return  # a concurrent request already cached something newer
+            self._discard(snapshot.user_id)
+            if snapshot.nbytes > self.max_bytes:
+                return  # would evict everything else and still not fit
+            self._entries[snapshot.user_id] = snapshot
+            self._bytes += snapshot.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._discard(user_id)
+
+    def _discard(self, user_id: int) -> None:
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+
+
+def init_snapshot_cache(app: Flask) -> None:
+    """Set config defaults and attach the app's snapshot cache."""
+    app.config.setdefault("LEDGER_SNAPSHOT_CACHE_BYTES", 64 * 1024 * 1024)
+    app.extensions["ledger_snapshots"] = SnapshotCache(app.config["LEDGER_SNAPSHOT_CACHE_BYTES"])
+
+
+def ledger_version(user_id: int) -> int:
+    """The user's current ledger_version (0 before their first write)."""
+    version = db.session.execute(
+        select(UserStats.ledger_version).where(UserStats.user_id == user_id)
+    ).scalar()
+    return version or 0
+
+
+def get_snapshot(user_id: int) -> LedgerSnapshot:
+    """
+    The user's snapshot from the app cache, rebuilt if the ledger has changed since.
+    The version is read before the ledger, so a write landing in between only makes
+    the snapshot newer than its tag, which costs one extra rebuild, never a stale read.
+    """
+    version = ledger_version(user_id)
+    cache = current_app.extensions["ledger_snapshots"]
+    return cache.get(user_id, version, lambda: build_snapshot(user_id, version))
+
+
+def ledger_summary(user_id: int, start: date | None = None, end: date | None = None,
+                   account_id: int | None = None, group_by: str | None = None,
+                   currency: str | None = None) -> dict:
+    """
+    Summary statistics of the user's transactions in start..end (inclusive), optionally
+    for one account, plus per-group counts and totals when group_by is one of GROUP_BYS.
+    Only transactions in currency (default: the user's most used) are included, so
+    nothing is summed across currencies.
+    """
+    snapshot = get_snapshot(user_id)
+    currency = (currency or next(iter(snapshot.currencies_by_use), DEFAULT_CURRENCY)).upper()
+    selected = snapshot.mask(start, end, account_id, currency)
+    result = {
+        "currency": currency,
+        "currencies": snapshot.currencies_by_use,
+        "summary": snapshot.summary(selected, currency),
+    }
+    if group_by is None:
+        return result
+
+    groups = snapshot.group_totals(group_by, selected)
+    if group_by == "category":
+        labels = {0: "Uncategorised", **category_paths_by_id(user_id)}
+    elif group_by == "account":
+        owned = db.session.execute(select(Account.id, Account.name).where(Account.user_id == user_id))
+        labels = {0: "No account", **dict(owned.all())}
+    elif group_by == "merchant":
+        labels = dict(enumerate(snapshot.merchants))
+    else:
+        labels = {key: str(np.datetime64(key, "M")) for key, _, _ in groups}
+
+    result["groups"] = [
+        {"key": key, "label": labels.get(key), "count": count, "total": minor_to_float(total, currency)}
+        for key, count, total in groups
+    ]
+    return result
@@ -11,6 +11,7 @@ TEST_CONFIG = {
     "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
     "SECRET_KEY": "test-secret",
     "WTF_CSRF_ENABLED": False,
+    "IMPORT_JOBS_RESUME": False,  # tests resume import jobs explicitly
 }
 
 
@@ -54,3 +55,13 @@ def two_users(app):
         db.session.commit()
 
         yield alice.id, bob.id
+
+
+@pytest.fixture
+def auth_client(client, two_users):
+    """A test client logged in as Alice (the first of two_users)."""
+    alice_id, _ = two_users
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(alice_id)
+        sess["_fresh"] = True
+    return client
@@ -0,0 +1,137 @@
+"""Tests for balance snapshots and the latest-balance pointer (balances.py)."""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from balances import compact_balances, net_worth_series, record_balance, refresh_latest_balances
+from models import db, Account, AccountBalance, PlaidItem
+from tests.test_transaction_views import count_queries
+
+
+@pytest.fixture
+def bank(app, two_users):
+    """A linked bank for Alice with three accounts. Returns the account ids."""
+    alice_id, _ = two_users
+    item = PlaidItem(user_id=alice_id, access_token="token", item_id="item", institution_name="Monzo")
+    db.session.add(item)
+    db.session.flush()
+    accounts = [Account(user_id=alice_id, name=f"Acct{i}", account_type="automatic", plaid_item_id=item.id)
+                for i in range(3)]
+    db.session.add_all(accounts)
+    db.session.commit()
+    return [a.id for a in accounts]
+
+
+def test_pointer_follows_the_newest_snapshot(bank):
+    account_id = bank[0]
+    now = datetime(2024, 6, 1, 12)
+    newest = record_balance(account_id, Decimal("10.00"), now)
+    record_balance(account_id, Decimal("5.00"), now - timedelta(hours=1))  # arrives late
+    db.session.commit()
+
+    account = db.session.get(Account, account_id)
+    assert account.latest_balance_id == newest.id
+    assert account.latest_balance.current_balance == Decimal("10.00")
+
+    db.session.delete(newest)
+    db.session.commit()
+    refresh_latest_balances([account_id])
+    db.session.commit()
+    db.session.refresh(account)
+    assert account.latest_balance.current_balance == Decimal("5.00")
+
+
+def test_accounts_page_query_count_does_not_grow_with_history(auth_client, bank):
+    start = datetime(2024, 1, 1)
+    for account_id in bank:
+        record_balance(account_id, Decimal("1.00"), start)
+    db.session.commit()
+    db.session.expire_all()
+    with count_queries() as small:
+        auth_client.get("/accounts")
+
+    for hour in range(1, 30):
+        for account_id in bank:
+            record_balance(account_id, Decimal(hour), start + timedelta(hours=hour))
+    db.session.commit()
+    db.session.expire_all()
+    with count_queries() as large:
+        page = auth_client.get("/accounts").get_data(as_text=True)
+
+    assert "GBP 29.00" in page
+    assert len(large) == len(small) == 3  # items, their accounts with balances, manual accounts
+
+
+def test_unchanged_balances_are_not_recorded(bank):
+    account_id = bank[0]
+    first = record_balance(account_id, 12.5, datetime(2024, 6, 1, 9))
+    assert record_balance(account_id, Decimal("12.50"), datetime(2024, 6, 1, 10)) is None
+    assert record_balance(account_id, 13, datetime(2024, 6, 1, 11)) is not None
+    db.session.commit()
+    assert AccountBalance.query.filter_by(account_id=account_id).count() == 2
+    assert first.current_balance == Decimal("12.50")
+
+
+def test_compaction_keeps_last_min_and_max_per_bucket(bank):
+    account_id = bank[0]
+    now = datetime(2024, 6, 30, 12)
+    # Every 20 minutes for the last 5 days, swinging between three values
+    values = [Decimal(v) for v in ("10.00", "30.00", "20.00")]
+    for step in range(5 * 24 * 3 + 1):
+        record_balance(account_id, values[step % 3], now - timedelta(minutes=20 * step))
+    db.session.commit()
+
+    removed = compact_balances(now=now)
+    db.session.commit()
+    assert removed > 0
+
+    history = AccountBalance.query.filter_by(account_id=account_id)
+    cutoff = datetime(2024, 6, 28, 12)
+    assert history.filter(AccountBalance.recorded_at < cutoff).filter_by(resolution="raw").count() == 0
+    hourly = history.filter_by(resolution="hour").order_by(AccountBalance.recorded_at).all()
+    assert len(hourly) == 24 * 3
+    assert all((h.min_balance, h.max_balance) == (Decimal("10.00"), Decimal("30.00")) for h in hourly)
+
+    account = db.session.get(Account, account_id)
+    assert account.latest_balance.recorded_at == now  # untouched raw snapshot
+
+    assert compact_balances(now=now) == 0  # nothing left to fold
+
+
+def test_net_worth_series_carries_balances_forward_and_subtracts_credit(bank):
+    savings, card, _ = bank
+    db.session.get(Account, card).subtype = "credit"
+    record_balance(savings, 100, datetime(2024, 1, 1, 9))
+    record_balance(card, 30, datetime(2024, 1, 2, 9))
+    record_balance(savings, 150, datetime(2024, 1, 4, 9))
+    db.session.commit()
+
+    series = net_worth_series(db.session.get(Account, savings).user_id, "day", end=datetime(2024, 1, 5))["series"]
+    assert [(p["at"].day, p["net_worth"]) for p in series] == [(1, 100.0), (2, 70.0), (3, 70.0), (4, 120.0), (5, 120.0)]
+
+
+def test_net_worth_series_is_per_currency(bank):
+    pounds, _, yen = bank
+    db.session.get(Account, yen).currency = "JPY"
+    record_balance(pounds, 100, datetime(2024, 1, 1, 9))
+    record_balance(yen, 50000, datetime(2024, 1, 1, 9))
+    db.session.commit()
+    user_id = db.session.get(Account, pounds).user_id
+
+    gbp = net_worth_series(user_id, "day", end=datetime(2024, 1, 2))
+    assert (gbp["currency"], gbp["currencies"]) == ("GBP", ["GBP", "JPY"])
+    assert [p["net_worth"] for p in gbp["series"]] == [100.0, 100.0]
+    jpy = net_worth_series(user_id, "day", end=datetime(2024, 1, 2), currency="jpy")
+    assert [p["net_worth"] for p in jpy["series"]] == [50000.0, 50000.0]
+
+
+def test_net_worth_endpoint(auth_client, bank):
+    record_balance(bank[0], 42, datetime(2024, 3, 10))
+    db.session.commit()
+
+    body = auth_client.get("/analytics/net-worth?resolution=month&end=2024-04-30").get_json()
+    assert body["currency"] == "GBP"
+    assert body["series"] == [{"at": "2024-03-01T00:00:00", "net_worth": 42.0},
+                              {"at": "2024-04-01T00:00:00", "net_worth": 42.0}]
+    assert auth_client.get("/analytics/net-worth?resolution=week").status_code == 400
@@ -0,0 +1,113 @@
+"""Tests for the category closure table and spending rollups."""
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from category_tree import category_rollup, rebuild_category_closure
+from models import db, Category, CategoryClosure, Transaction
+
+
+def closure_rows():
+    return sorted(
+        (row.ancestor_id, row.descendant_id, row.depth) for row in CategoryClosure.query.all()
+    )
+
+
+def assert_matches_rebuild():
+    """The incrementally maintained closure equals one rebuilt from parent_id."""
+    maintained = closure_rows()
+    rebuild_category_closure()
+    assert maintained == closure_rows()
+
+
+@pytest.fixture
+def tree(app, two_users):
+    """Alice's Food > Groceries > Organic and Transport, all added in one flush."""
+    alice_id, _ = two_users
+    food = Category(user_id=alice_id, name="Food")
+    groceries = Category(user_id=alice_id, name="Groceries", parent=food)
+    organic = Category(user_id=alice_id, name="Organic", parent=groceries)
+    transport = Category(user_id=alice_id, name="Transport")
+    db.session.add_all([organic, transport, groceries, food])
+    db.session.commit()
+    return food, groceries, organic, transport
+
+
+def test_closure_follows_inserts_moves_and_deletes(tree):
+    food, groceries, organic, transport = tree
+    assert (food.id, organic.id, 2) in closure_rows()
+    assert_matches_rebuild()
+
+    groceries.parent_id = transport.id  # moves Organic along with it
+    db.session.commit()
+    assert (transport.id, organic.id, 2) in closure_rows()
+    assert (food.id, organic.id, 2) not in closure_rows()
+    assert_matches_rebuild()
+
+    db.session.delete(organic)
+    db.session.commit()
+    assert_matches_rebuild()
+
+
+def test_is_parent_is_loaded_with_the_category(tree):
+    food, groceries, organic, transport = tree
+    db.session.expire_all()
+    loaded = Category.query.filter(Category.id.in_([food.id, organic.id, transport.id])).all()
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        flags = {c.name: c.is_parent for c in loaded}
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert flags == {"Food": True, "Organic": False, "Transport": False}
+    assert statements == []
+
+    db.session.add(Category(user_id=transport.user_id, name="Trains", parent=transport))
+    db.session.commit()
+    assert transport.is_parent
+
+
+def test_category_cannot_move_under_its_own_subcategory(tree):
+    food, _, organic, _ = tree
+    food.parent_id = organic.id
+    with pytest.raises(ValueError, match="own subcategories"):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_rollup_includes_subcategories_within_the_date_range(tree, two_users):
+    food, groceries, organic, transport = tree
+    alice_id, _ = two_users
+
+    def spend(category, amount, day=15):
+        return Transaction(user_id=alice_id, date=date(2024, 5, day), amount=amount,
+                           description="x", account="Main", category_id=category.id)
+
+    db.session.add_all([
+        spend(food, 1.0), spend(groceries, 10.0), spend(organic, 100.0), spend(transport, 5.0),
+        spend(organic, 1000.0, day=31),  # outside the range
+    ])
+    db.session.commit()
+
+    top = category_rollup(alice_id, date(2024, 5, 1), date(2024, 5, 30))
+    assert [(r["name"], r["total"]) for r in top] == [("Food", 111.0), ("Transport", 5.0)]
+
+    inside_food = category_rollup(alice_id, date(2024, 5, 1), date(2024, 5, 30), parent_id=food.id)
+    assert [(r["name"], r["total"]) for r in inside_food] == [("Groceries", 110.0)]
+
+    # Yen are totalled on their own, in whole yen
+    db.session.add(Transaction(user_id=alice_id, date=date(2024, 5, 15), currency="JPY", amount=1500,
+                               description="x", account="Main", category_id=organic.id))
+    db.session.commit()
+    assert category_rollup(alice_id, date(2024, 5, 1), date(2024, 5, 30)) == top
+    yen = category_rollup(alice_id, date(2024, 5, 1), date(2024, 5, 30), currency="JPY")
+    assert [(r["name"], r["total"]) for r in yen] == [("Food", 1500.0)]
+
+
+def test_rollup_endpoint(auth_client, tree):
+    body = auth_client.get("/analytics/category-rollup?start=2024-01-01&end=2024-12-31").get_json()
+    assert body["categories"] == []
+    assert auth_client.get("/analytics/category-rollup?start=nope").status_code == 400
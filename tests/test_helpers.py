@@ -5,7 +5,27 @@ Tests for helper functions in helpers.py
 Run with: pytest
 """
 
-from helpers import normalise_description
+from collections import Counter
+from datetime import date
+import hashlib
+import io
+
+import pandas as pd
+import pytest
+
+import helpers
+
+from helpers import (
+    normalise_description,
+    save_transactions,
+    guess_categories_from_history,
+    transaction_row,
+    build_transactions_from_df,
+    fingerprint_rows,
+    import_csv_stream,
+    backfill_fingerprints,
+)
+from models import db, Transaction, Category, Account
 
 
 def test_normalise_description_removes_dates():
@@ -40,3 +60,200 @@ def test_normalise_description_already_clean():
     input_text = "SAINSBURYS"
     result = normalise_description(input_text)
     assert result == "SAINSBURYS"
+
+
+def test_save_transactions_returns_ids_in_order(app, two_users):
+    """Bulk save returns the new IDs in input order, across several chunks."""
+    alice_id, _ = two_users
+    with app.app_context():
+        rows = [
+            transaction_row(
+                user_id=alice_id,
+                date=date(2024, 2, i + 1),
+                amount=float(i),
+                description=f"SHOP {i}",
+                account="Main",
+            )
+            for i in range(5)
+        ]
+        ids = save_transactions(rows, chunk_size=2)
+
+        assert len(ids) == 5
+        saved = {t.id: t.description for t in Transaction.query.filter(Transaction.id.in_(ids))}
+        assert [saved[i] for i in ids] == [f"SHOP {i}" for i in range(5)]
+
+
+def test_save_transactions_is_all_or_nothing(app, two_users):
+    """One bad row rolls back every chunk, including ones already sent."""
+    alice_id, _ = two_users
+    with app.app_context():
+        good = transaction_row(user_id=alice_id, date=date(2024, 2, 1), amount=1.0,
+                               description="GOOD", account="Main")
+        bad = transaction_row(user_id=alice_id, date=None, amount=2.0,
+                              description="BAD", account="Main")
+
+        with pytest.raises(ValueError, match="No transactions were saved"):
+            save_transactions([good, bad], chunk_size=1)
+
+        assert Transaction.query.for_user(alice_id).count() == 1
+
+
+def test_guess_categories_from_history_picks_most_common(app, two_users):
+    """Each description maps to its most frequently used category for that user only."""
+    alice_id, bob_id = two_users
+    with app.app_context():
+        groceries = Category(user_id=alice_id, name="Groceries")
+        coffee = Category(user_id=alice_id, name="Coffee")
+        bobs = Category(user_id=bob_id, name="Bob stuff")
+        db.session.add_all([groceries, coffee, bobs])
+        db.session.flush()
+
+        def tx(user_id, norm, category_id):
+            return Transaction(user_id=user_id, date=date(2024, 3, 1), amount=1.0,
+                               description=norm, account="Main",
+                               normalised_description=norm, category_id=category_id)
+
+        db.session.add_all([
+            tx(alice_id, "TESCO", groceries.id),
+            tx(alice_id, "TESCO", groceries.id),
+            tx(alice_id, "TESCO", coffee.id),
+            tx(alice_id, "PRET", coffee.id),
+            tx(alice_id, "PRET", None),
+            tx(bob_id, "COSTA", bobs.id),
+        ])
+        db.session.commit()
+
+        guesses = guess_categories_from_history(["TESCO", "PRET", "COSTA", "UNKNOWN", ""], alice_id)
+
+        assert guesses == {"TESCO": groceries.id, "PRET": coffee.id}
+
+
+def test_build_transactions_from_df_builds_rows(app, two_users):
+    """Each DataFrame row becomes a plain dict ready for the bulk writer."""
+    alice_id, _ = two_users
+    standard_df = pd.DataFrame({
+        "Date": pd.to_datetime(["01/02/2026", "02/02/2026"], format="%d/%m/%Y"),
+        "AmountMinor": pd.array([1250, 300], dtype="Int64"),
+        "Description": ["TESCO 12/01/2024", "PRET REF:999"],
+    })
+    with app.app_context():
+        rows = build_transactions_from_df(standard_df, alice_id, None, "Main")
+
+    assert [r["date"] for r in rows] == [date(2026, 2, 1), date(2026, 2, 2)]
+    assert [r["amount_minor"] for r in rows] == [1250, 300]
+    assert [r["normalised_description"] for r in rows] == ["TESCO", "PRET"]
+    assert all(r["user_id"] == alice_id and r["account"] == "Main" for r in rows)
+
+
+def test_build_transactions_from_df_reports_invalid_rows(app, two_users):
+    """Invalid dates and amounts are reported with their row numbers."""
+    alice_id, _ = two_users
+    standard_df = pd.DataFrame({
+        "Date": pd.to_datetime(["01/02/2026", None, None], format="%d/%m/%Y"),
+        "AmountMinor": pd.array([100, 200, None], dtype="Int64"),
+        "Description": ["A", "B", "C"],
+    })
+    with app.app_context():
+        with pytest.raises(ValueError, match=r"Invalid date on rows 2, 3; Invalid amount on row 3"):
+            build_transactions_from_df(standard_df, alice_id, None, "Main")
+
+
+def test_fingerprint_ordinals_carry_across_chunks():
+    """Identical rows get distinct fingerprints, numbered across chunks, and re-fingerprint the same."""
+    def chunk():
+        return (pd.Series(pd.to_datetime(["2025-01-01"])), pd.Series([350]), pd.Series(["PRET"]))
+
+    seen = Counter()
+    first = fingerprint_rows(7, *chunk(), seen)
+    second = fingerprint_rows(7, *chunk(), seen)
+    assert first != second
+
+    both = fingerprint_rows(7, *(pd.concat([a, b], ignore_index=True) for a, b in zip(chunk(), chunk())))
+    assert both == first + second
+    assert fingerprint_rows(8, *chunk()) != first  # account is part of the key
+    # amounts are keyed as pounds and pence, as they were when the column was a float
+    assert first[0] == hashlib.sha256(b"7|2025-01-01|3.50|PRET|1").hexdigest()
+
+
+def test_fingerprint_amounts_use_the_account_currency():
+    """Written as major units to two places whatever the currency, as the float column gave them."""
+    day, norm = pd.Series(pd.to_datetime(["2025-01-01"])), pd.Series(["LAWSON"])
+    yen = fingerprint_rows(7, day, pd.Series([1500]), norm, currency="JPY")
+    assert yen[0] == hashlib.sha256(b"7|2025-01-01|1500.00|LAWSON|1").hexdigest()
+    dinar = fingerprint_rows(7, day, pd.Series([-1505]), norm, currency="KWD")
+    assert dinar[0] == hashlib.sha256(b"7|2025-01-01|-1.51|LAWSON|1").hexdigest()
+
+
+def test_restamp_recomputes_fingerprints_with_the_account_currency(app, two_users):
+    alice_id, _ = two_users
+    with app.app_context():
+        yen = Account(user_id=alice_id, name="Tokyo", account_type="manual", currency="JPY")
+        db.session.add(yen)
+        db.session.commit()
+        save_transactions([
+            transaction_row(user_id=alice_id, account_id=yen.id, account="Tokyo", date=date(2025, 1, 1),
+                            amount=1500, currency="JPY", description="LAWSON", normalised_description="LAWSON",
+                            fingerprint=f"keyed-as-pounds-{i}")
+            for i in range(2)
+        ])
+
+        assert backfill_fingerprints(yen.id) == 0  # already stamped, left alone
+        assert backfill_fingerprints(yen.id, restamp=True) == 2
+        expected = fingerprint_rows(yen.id, pd.Series(pd.to_datetime(["2025-01-01"] * 2)), pd.Series([1500, 1500]),
+                                    pd.Series(["LAWSON", "LAWSON"]), currency="JPY")
+        stored = [t.fingerprint for t in Transaction.query.filter_by(account_id=yen.id).order_by(Transaction.id)]
+        assert stored == expected
+
+
+def _csv_stream(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_import_csv_stream_inserts_every_chunk(app, two_users):
+    """A file read in small chunks still imports every row."""
+    alice_id, _ = two_users
+    with app.app_context():
+        account = Account(user_id=alice_id, name="Amex", account_type="manual")
+        db.session.add(account)
+        db.session.commit()
+
+        with open("tests/fixtures/sample-amex.csv", "rb") as f:
+            expected = len(pd.read_csv(f))
+            f.seek(0)
+            batch = import_csv_stream(f, account, alice_id, chunk_rows=3)
+
+        assert batch.row_count == expected
+        assert Transaction.query.filter_by(batch_id=batch.id).count() == expected
+
+
+def test_import_csv_stream_atomic_rolls_back_earlier_chunks(app, two_users):
+    """A bad row in a later chunk leaves nothing behind in atomic mode."""
+    alice_id, _ = two_users
+    csv = "Date,Amount,Description\n01/01/2025,1,A\n02/01/2025,2,B\n03/01/2025,oops,C\n"
+    with app.app_context():
+        account = Account(user_id=alice_id, name="Main", account_type="manual")
+        db.session.add(account)
+        db.session.commit()
+
+        with pytest.raises(ValueError, match="No transactions were saved"):
+            import_csv_stream(_csv_stream(csv), account, alice_id, chunk_rows=2)
+        assert Transaction.query.filter_by(account_id=account.id).count() == 0
+
+        with pytest.raises(ValueError, match="2 transactions were saved"):
+            import_csv_stream(_csv_stream(csv), account, alice_id, chunk_rows=2, atomic=False)
+        assert Transaction.query.filter_by(account_id=account.id).count() == 2
+
+
+def test_reupload_after_a_normaliser_change_is_still_deduplicated(app, two_users, monkeypatch):
+    """Fingerprints key on the raw description, so a new normaliser doesn't make old rows look new."""
+    alice_id, _ = two_users
+    csv = "Date,Amount,Description\n01/01/2025,3.50,PRET A MANGER 0123\n02/01/2025,2.00,TESCO STORES\n"
+    with app.app_context():
+        account = Account(user_id=alice_id, name="Main", account_type="manual")
+        db.session.add(account)
+        db.session.commit()
+        import_csv_stream(_csv_stream(csv), account, alice_id)
+
+        monkeypatch.setattr(helpers, "normalise_series", lambda descriptions: descriptions.str.lower())
+        batch = import_csv_stream(_csv_stream(csv), account, alice_id)
+        assert (batch.row_count, batch.duplicate_count) == (0, 2)
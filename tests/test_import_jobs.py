@@ -0,0 +1,128 @@
+"""Tests for background CSV import jobs (import_jobs.py)."""
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from import_jobs import record_progress, resume_import_jobs, run_import_job
+from models import db, Account, ImportJob, Transaction
+
+
+CSV = b"Date,Amount,Description\n01/01/2025,1.50,TESCO\n02/01/2025,2.00,PRET\n"
+
+
+@pytest.fixture
+def account(app, two_users, tmp_path):
+    """A manual account for Alice, with every upload routed to a background job."""
+    alice_id, _ = two_users
+    app.config.update(IMPORT_BACKGROUND_MIN_BYTES=0, IMPORT_JOBS_SYNC=True, IMPORT_UPLOAD_DIR=str(tmp_path))
+    acct = Account(user_id=alice_id, name="Main", account_type="manual")
+    db.session.add(acct)
+    db.session.commit()
+    return acct.id
+
+
+def upload(client, account_id, content):
+    return client.post(
+        "/upload-csv",
+        data={"account_id": str(account_id), "file": (io.BytesIO(content), "statement.csv")},
+        content_type="multipart/form-data",
+    )
+
+
+def test_large_upload_becomes_a_job(app, auth_client, account, tmp_path):
+    response = upload(auth_client, account, CSV)
+    job = ImportJob.query.one()
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith(f"/imports/{job.id}/view")
+
+    status = auth_client.get(f"/imports/{job.id}").get_json()
+    assert status["status"] == "done"
+    assert status["rows_processed"] == 2
+    assert status["error"] is None
+    assert Transaction.query.filter_by(account_id=account).count() == 2
+    assert list(tmp_path.iterdir()) == []  # stored upload cleaned up
+
+
+def test_failed_job_reports_error_and_saves_nothing(app, auth_client, account):
+    upload(auth_client, account, CSV + b"03/01/2025,oops,BAD\n")
+    job = ImportJob.query.one()
+
+    status = auth_client.get(f"/imports/{job.id}").get_json()
+    assert status["status"] == "failed"
+    assert "No transactions were saved" in status["error"]
+    assert Transaction.query.filter_by(account_id=account).count() == 0
+
+
+def test_job_only_runs_once(app, auth_client, account):
+    upload(auth_client, account, CSV)
+    job = ImportJob.query.one()
+
+    run_import_job(app, job.id)  # already done — must not import again
+    assert Transaction.query.filter_by(account_id=account).count() == 2
+
+
+def test_other_users_cannot_see_job(app, client, account, two_users):
+    _, bob_id = two_users
+    job = ImportJob(user_id=two_users[0], account_id=account, filename="a.csv", stored_path="/nope")
+    db.session.add(job)
+    db.session.commit()
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(bob_id)
+    assert client.get(f"/imports/{job.id}").status_code == 404
+
+
+def test_startup_recovers_jobs_whose_worker_died(app, account, tmp_path):
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    upload_path = tmp_path / "orphan.csv"
+    upload_path.write_bytes(CSV)
+
+    def job(status, path, **times):
+        j = ImportJob(user_id=db.session.get(Account, account).user_id, account_id=account,
+                      filename="a.csv", stored_path=str(path), status=status, **times)
+        db.session.add(j)
+        return j
+
+    orphaned = job("running", upload_path, started_at=an_hour_ago)
+    lost = job("running", tmp_path / "gone.csv", started_at=an_hour_ago)
+    alive = job("running", tmp_path / "other.csv", started_at=an_hour_ago, heartbeat_at=datetime.utcnow())
+    db.session.commit()
+
+    assert resume_import_jobs(app) == [orphaned.id]
+    db.session.expire_all()
+    assert orphaned.status == "done" and orphaned.rows_processed == 2
+    assert not upload_path.exists()
+    assert lost.status == "failed" and "no longer available" in lost.error
+    assert alive.status == "running"  # still reporting progress, left alone
+    assert Transaction.query.filter_by(account_id=account).count() == 2
+
+
+def test_jobs_resume_on_the_first_request_not_at_app_creation(app, client, account, tmp_path):
+    upload_path = tmp_path / "waiting.csv"
+    upload_path.write_bytes(CSV)
+    job = ImportJob(user_id=db.session.get(Account, account).user_id, account_id=account,
+                    filename="a.csv", stored_path=str(upload_path))
+    db.session.add(job)
+    db.session.commit()
+    assert job.status == "queued"
+
+    app.config["IMPORT_JOBS_RESUME"] = True
+    assert ImportJob.query.filter_by(status="queued").count() == 1  # create_app started nothing
+    client.get("/")
+    db.session.expire_all()
+    assert job.status == "done"
+    assert Transaction.query.filter_by(account_id=account).count() == 2
+
+
+def test_progress_is_read_from_the_job_row(app, auth_client, account):
+    job = ImportJob(user_id=db.session.get(Account, account).user_id, account_id=account, filename="a.csv",
+                    stored_path="/nope", status="running", started_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    record_progress(job.id, 1500)  # as a worker in another process would
+    db.session.expire_all()
+    status = auth_client.get(f"/imports/{job.id}").get_json()
+    assert status["rows_processed"] == 1500
+    assert db.session.get(ImportJob, job.id).heartbeat_at is not None
@@ -0,0 +1,258 @@
+"""Tests for incremental upkeep of derived ledger tables (ledger.py)."""
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from helpers import (
+    save_transactions, transaction_row, delete_plaid_transactions, get_dashboard_stats, monthly_spend_matrix,
+)
+from ledger import (
+    rebuild_merchant_stats, rebuild_monthly_totals, rebuild_user_stats, record_import,
+    refresh_stale_monthly_totals,
+)
+from models import db, Account, Transaction, Category, MerchantCategoryStat, MonthlyCategoryTotal
+
+
+def stats_for(user_id: int) -> dict:
+    return {
+        (s.normalised_description, s.category_id): s.count
+        for s in MerchantCategoryStat.query.filter_by(user_id=user_id)
+    }
+
+
+@pytest.fixture
+def categories(app, two_users):
+    """Two categories for Alice. Returns (alice_id, groceries_id, coffee_id)."""
+    alice_id, _ = two_users
+    with app.app_context():
+        groceries = Category(user_id=alice_id, name="Groceries")
+        coffee = Category(user_id=alice_id, name="Coffee")
+        db.session.add_all([groceries, coffee])
+        db.session.commit()
+        yield alice_id, groceries.id, coffee.id
+
+
+def make_row(user_id, norm, category_id, plaid_id=None, account_id=None, day=date(2024, 5, 1), amount=3.0,
+             currency=None):
+    return transaction_row(user_id=user_id, date=day, amount=amount, currency=currency,
+                           description=norm, account="Main", normalised_description=norm,
+                           category_id=category_id, plaid_transaction_id=plaid_id,
+                           account_id=account_id)
+
+
+def test_bulk_insert_counts_categorised_rows(app, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        save_transactions([
+            make_row(alice_id, "TESCO", groceries),
+            make_row(alice_id, "TESCO", groceries),
+            make_row(alice_id, "PRET", coffee),
+            make_row(alice_id, "PRET", None),
+        ])
+        assert stats_for(alice_id) == {("TESCO", groceries): 2, ("PRET", coffee): 1}
+
+
+def test_orm_recategorise_moves_the_count(app, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        ids = save_transactions([make_row(alice_id, "TESCO", groceries)])
+
+        tx = db.session.get(Transaction, ids[0])
+        db.session.commit()          # expire it, like a request that commits before editing
+        tx.category_id = coffee
+        db.session.commit()
+
+        assert stats_for(alice_id) == {("TESCO", coffee): 1}
+
+
+def test_orm_delete_removes_empty_stats(app, categories):
+    alice_id, groceries, _ = categories
+    with app.app_context():
+        ids = save_transactions([make_row(alice_id, "TESCO", groceries)] * 2)
+
+        db.session.delete(db.session.get(Transaction, ids[0]))
+        db.session.commit()
+        assert stats_for(alice_id) == {("TESCO", groceries): 1}
+
+        db.session.delete(db.session.get(Transaction, ids[1]))
+        db.session.commit()
+        assert stats_for(alice_id) == {}
+
+
+def test_plaid_delete_updates_stats(app, categories):
+    alice_id, groceries, _ = categories
+    with app.app_context():
+        save_transactions([make_row(alice_id, "TESCO", groceries, plaid_id="p1"),
+                           make_row(alice_id, "TESCO", groceries, plaid_id="p2")])
+
+        assert delete_plaid_transactions(alice_id, ["p1", "unknown"]) == 1
+        db.session.commit()
+        assert stats_for(alice_id) == {("TESCO", groceries): 1}
+
+
+def test_rebuild_matches_incremental(app, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        save_transactions([make_row(alice_id, "TESCO", groceries),
+                           make_row(alice_id, "PRET", coffee)])
+        incremental = stats_for(alice_id)
+
+        rebuild_merchant_stats(alice_id)
+        db.session.commit()
+        assert stats_for(alice_id) == incremental
+
+
+def test_dashboard_stats_follow_every_write_path(app, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        account = Account(user_id=alice_id, name="Amex", account_type="manual")
+        db.session.add(account)
+        db.session.commit()
+
+        ids = save_transactions([
+            make_row(alice_id, "TESCO", None, account_id=account.id),
+            make_row(alice_id, "PRET", coffee, plaid_id="p1", account_id=account.id),
+        ])
+        tx = db.session.get(Transaction, ids[0])
+        tx.category_id = groceries                        # ORM recategorise
+        db.session.commit()
+        delete_plaid_transactions(alice_id, ["p1"])       # bulk delete
+        record_import(alice_id)
+        db.session.commit()
+
+        stats = get_dashboard_stats(alice_id)
+        # the fixture's "Alice coffee" (uncategorised, no account) + TESCO
+        assert (stats["total"], stats["uncategorised"]) == (2, 1)
+        assert stats["accounts"] == [{"name": "Amex", "count": 1}]
+        assert stats["last_import_at"] is not None
+
+        rebuild_user_stats(alice_id)
+        db.session.commit()
+        assert get_dashboard_stats(alice_id) == stats
+
+
+def monthly_for(user_id: int) -> dict:
+    return {
+        (m.account_id, m.category_id, m.month): (m.total_minor, m.count, m.min_minor, m.max_minor)
+        for m in MonthlyCategoryTotal.query.filter_by(user_id=user_id)
+    }
+
+
+def test_monthly_totals_follow_every_write_path(app, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        ids = save_transactions([
+            make_row(alice_id, "TESCO", groceries, amount=10.0),
+            make_row(alice_id, "TESCO", groceries, amount=40.0),
+            make_row(alice_id, "PRET", coffee, plaid_id="p1", day=date(2024, 6, 3), amount=4.5),
+        ])
+        assert monthly_for(alice_id)[(0, groceries, date(2024, 5, 1))] == (5000, 2, 1000, 4000)
+
+        tx = db.session.get(Transaction, ids[1])
+        db.session.commit()
+        tx.amount = 25.0                                  # ORM edit removes the month's max
+        db.session.commit()
+        tx = db.session.get(Transaction, ids[0])
+        tx.category_id = coffee                           # ORM recategorise
+        tx.date = date(2024, 6, 20)                       # ...into another month
+        db.session.commit()
+        delete_plaid_transactions(alice_id, ["p1"])       # bulk delete
+        db.session.commit()
+
+        # min/max were recomputed by the writes themselves
+        assert not MonthlyCategoryTotal.query.filter_by(minmax_stale=True).count()
+        incremental = monthly_for(alice_id)
+        assert incremental[(0, groceries, date(2024, 5, 1))] == (2500, 1, 2500, 2500)
+        assert incremental[(0, coffee, date(2024, 6, 1))] == (1000, 1, 1000, 1000)
+
+        rebuild_monthly_totals(alice_id)
+        db.session.commit()
+        assert monthly_for(alice_id) == incremental
+
+
+def test_monthly_totals_endpoint(app, auth_client, categories):
+    alice_id, groceries, coffee = categories
+    with app.app_context():
+        ids = save_transactions([
+            make_row(alice_id, "TESCO", groceries, amount=10.0),
+            make_row(alice_id, "TESCO", groceries, amount=40.0),
+            make_row(alice_id, "PRET", coffee, day=date(2024, 6, 3), amount=4.5),
+            make_row(alice_id, "PRET", coffee, day=date(2024, 8, 3), amount=4.5),
+        ])
+        db.session.delete(db.session.get(Transaction, ids[1]))  # the month's max goes
+        db.session.commit()
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = auth_client.get("/analytics/monthly-totals?start=2024-05&end=2024-07")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # Served from the rollup alone: no ledger scan, no writes
+    assert not [s for s in statements if '"transaction"' in s or "transaction." in s]
+    assert not [s for s in statements if s.split()[0] in ("INSERT", "UPDATE", "DELETE")]
+    data = response.get_json()
+    assert data["months"] == ["2024-05", "2024-06", "2024-07"]
+    by_name = {c["name"]: c for c in data["categories"]}
+    assert by_name["Groceries"]["cells"] == {"2024-05": {"total": 10.0, "count": 1, "min": 10.0, "max": 10.0}}
+    assert by_name["Coffee"]["total"] == 4.5
+
+    assert auth_client.get("/analytics/monthly-totals?start=May").status_code == 400
+
+
+def test_refresh_stale_monthly_totals_sweeps_flagged_cells(app, categories):
+    """Cells flagged before min/max moved into the write path can be repaired in one sweep."""
+    alice_id, groceries, _ = categories
+    with app.app_context():
+        save_transactions([make_row(alice_id, "TESCO", groceries, amount=10.0),
+                           make_row(alice_id, "TESCO", groceries, amount=40.0)])
+        cell = MonthlyCategoryTotal.query.filter_by(user_id=alice_id, category_id=groceries).one()
+        cell.min_minor, cell.max_minor, cell.minmax_stale = -1, 99999, True
+        db.session.commit()
+
+        assert refresh_stale_monthly_totals() == 1
+        db.session.commit()
+        assert monthly_for(alice_id)[(0, groceries, date(2024, 5, 1))] == (5000, 2, 1000, 4000)
+
+
+def test_monthly_totals_are_kept_per_currency(app, categories):
+    alice_id, groceries, _ = categories
+    with app.app_context():
+        save_transactions([
+            make_row(alice_id, "TESCO", groceries, amount=10.0),
+            make_row(alice_id, "TESCO", groceries, amount=12.5),
+            make_row(alice_id, "LAWSON", groceries, amount=1500, currency="JPY"),
+        ])
+        db.session.commit()
+        cells = {m.currency: (m.total_minor, m.count)
+                 for m in MonthlyCategoryTotal.query.filter_by(user_id=alice_id, category_id=groceries)}
+        assert cells == {"GBP": (2250, 2), "JPY": (1500, 1)}
+
+        may = date(2024, 5, 1)
+        gbp = monthly_spend_matrix(alice_id, may, may)  # most of Alice's rows are in pounds
+        assert (gbp["currency"], gbp["currencies"]) == ("GBP", ["GBP", "JPY"])
+        assert gbp["categories"][0]["cells"]["2024-05"] == {"total": 22.5, "count": 2, "min": 10.0, "max": 12.5}
+        jpy = monthly_spend_matrix(alice_id, may, may, currency="JPY")
+        assert jpy["categories"][0]["cells"]["2024-05"] == {"total": 1500.0, "count": 1, "min": 1500.0, "max": 1500.0}
+
+
+def test_monthly_matrix_labels_categories_that_share_a_name(app, categories):
+    alice_id, _, _ = categories
+    with app.app_context():
+        food, travel = Category(user_id=alice_id, name="Food"), Category(user_id=alice_id, name="Travel")
+        db.session.add_all([food, travel])
+        db.session.flush()
+        food_other = Category(user_id=alice_id, name="Other", parent_id=food.id)
+        travel_other = Category(user_id=alice_id, name="Other", parent_id=travel.id)
+        db.session.add_all([food_other, travel_other])
+        db.session.flush()
+        save_transactions([make_row(alice_id, "MARKET", food_other.id, amount=5.0),
+                           make_row(alice_id, "TAXI", travel_other.id, amount=20.0)])
+
+        matrix = monthly_spend_matrix(alice_id, date(2024, 5, 1), date(2024, 5, 1))
+        assert [(c["category_id"], c["name"]) for c in matrix["categories"]] == [
+            (travel_other.id, "Travel > Other"), (food_other.id, "Food > Other"),
+        ]
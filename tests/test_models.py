@@ -1,5 +1,9 @@
 """Tests for UserScopedQuery — verifies user data isolation."""
-from models import Transaction
+from datetime import date
+
+from sqlalchemy import event
+
+from models import db, category_ids_by_name, Category, Transaction
 
 
 class TestUserScopedQuery:
@@ -36,3 +40,42 @@ class TestUserScopedQuery:
         with app.app_context():
             total = Transaction.query.count()
             assert total == 2
+
+
+class TestCategoryResolver:
+    """The Transaction.category setter resolves names from one cached load per request."""
+
+    def test_bulk_assignment_loads_categories_once(self, app, two_users):
+        alice_id, _ = two_users
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if "FROM category" in statement:
+                statements.append(statement)
+
+        with app.test_request_context():
+            db.session.add(Category(user_id=alice_id, name="Coffee"))
+            db.session.commit()
+            txs = [Transaction(user_id=alice_id, date=date(2024, 1, d), amount=1.0,
+                               description="x", account="Main") for d in range(1, 21)]
+
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                for tx in txs:
+                    tx.category = "Coffee"
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+
+            assert len(statements) == 1
+            assert {tx.category_id for tx in txs} == {category_ids_by_name(alice_id)["Coffee"]}
+
+    def test_new_categories_invalidate_the_cache(self, app, two_users):
+        alice_id, bob_id = two_users
+        with app.test_request_context():
+            assert category_ids_by_name(alice_id) == {}
+
+            db.session.add(Category(user_id=alice_id, name="Rent"))
+            db.session.commit()
+
+            assert list(category_ids_by_name(alice_id)) == ["Rent"]
+            assert category_ids_by_name(bob_id) == {}
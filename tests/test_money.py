@@ -0,0 +1,46 @@
+"""Tests for integer minor-unit money handling (money.py) and Transaction.amount."""
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+
+from models import db, Transaction
+from money import format_minor_series, from_minor, to_minor, to_minor_series
+
+
+def test_to_minor_rounds_half_away_from_zero():
+    assert to_minor("12.345") == 1235
+    assert to_minor(-2.675) == -268
+    assert to_minor(0.1 + 0.2) == 30
+    assert to_minor(Decimal("1500"), "JPY") == 1500
+    assert from_minor(1250) == Decimal("12.50")
+    assert from_minor(1250, "KWD") == Decimal("1.250")
+
+
+def test_series_helpers_match_the_scalar_ones():
+    values = pd.Series([2.675, -0.005, 12.5, float("nan"), float("inf")])
+    minor = to_minor_series(values)
+    assert str(minor.dtype) == "Int64"
+    assert minor.tolist()[:3] == [to_minor(2.675), to_minor(-0.005), 1250]
+    assert minor[3:].isna().all()
+
+    assert format_minor_series(pd.Series([1250, -5, 0])).tolist() == ["12.50", "-0.05", "0.00"]
+
+
+def test_transaction_amount_is_an_exact_decimal_view(app, two_users):
+    alice_id, _ = two_users
+    db.session.add_all([
+        Transaction(user_id=alice_id, date=date(2024, 2, 1), amount=0.1, description="A", account="Main"),
+        Transaction(user_id=alice_id, date=date(2024, 2, 1), amount="0.2", description="B", account="Main"),
+    ])
+    db.session.commit()
+
+    tx = Transaction.query.filter_by(description="A").one()
+    assert tx.amount_minor == 10 and tx.amount == Decimal("0.10")
+
+    total = db.session.execute(
+        db.select(db.func.sum(Transaction.amount_minor)).where(Transaction.date == date(2024, 2, 1))
+    ).scalar()
+    assert total == 30
+    dearer = Transaction.query.filter(Transaction.date == date(2024, 2, 1), Transaction.amount > Decimal("0.15"))
+    assert dearer.one().description == "B"
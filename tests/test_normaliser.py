@@ -0,0 +1,57 @@
+"""Tests for the description normaliser engine in normaliser.py"""
+import pandas as pd
+
+from normaliser import NORMALISER_VERSION, normalise_description, normalise_series, _normalise
+from helpers import renormalise_stale_descriptions
+from models import db, Transaction
+
+
+SAMPLES = [
+    "BUTTERNUT BOX ON 01 FEB BCC",
+    "TESCO SUPERSTORE 12/01/2024",
+    "AMAZON REF:123456789",
+    "  costa   coffee  POS",
+    "THE EGGFREE CAKEBO    \tON 04 FEB CPM\t",
+    "SAINSBURYS",
+    "",
+]
+
+
+def test_series_matches_scalar_for_every_row():
+    """normalise_series gives the same answer as normalise_description, row for row."""
+    series = pd.Series(SAMPLES + SAMPLES[::-1] + [None], index=range(100, 100 + 2 * len(SAMPLES) + 1))
+    result = normalise_series(series)
+
+    assert list(result.index) == list(series.index)
+    assert result.tolist() == [normalise_description(d) for d in series]
+
+
+def test_repeated_descriptions_hit_the_memo():
+    """The same raw description is only normalised once."""
+    _normalise.cache_clear()
+    for _ in range(3):
+        normalise_description("PRET A MANGER ON 02 MAR")
+
+    info = _normalise.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def test_renormalise_stale_descriptions(app, two_users):
+    """Rows without the current version get re-normalised and stamped."""
+    alice_id, _ = two_users
+    with app.app_context():
+        db.session.add(Transaction(
+            user_id=alice_id, date=pd.Timestamp("2024-01-03").date(), amount=4.0,
+            description="TESCO 12/01/2024", account="Main",
+            normalised_description="OLD VALUE", normaliser_version=NORMALISER_VERSION - 1,
+        ))
+        db.session.commit()
+
+        # Two fixture rows (never stamped) plus the outdated one
+        assert renormalise_stale_descriptions(batch_size=2) == 3
+        assert renormalise_stale_descriptions() == 0
+
+        refreshed = Transaction.query.filter_by(description="TESCO 12/01/2024").one()
+        assert refreshed.normalised_description == "TESCO"
+        assert refreshed.normaliser_version == NORMALISER_VERSION
@@ -1,6 +1,19 @@
+import io
+
 import pandas as pd
 import pytest
-from parsers import parse_standard_csv
+
+import parsers
+from helpers import iter_csv_chunks
+from parsers import (
+    BARCLAYS,
+    REVOLUT,
+    STANDARD,
+    detect_format,
+    parse_standard_csv,
+    read_csv_chunks,
+    read_header,
+)
 
 
 def test_basic_parse():
@@ -9,9 +22,9 @@ def test_basic_parse():
     df = parse_standard_csv(raw_df, invert_amounts=False)
 
     assert len(df) > 0
-    assert list(df.columns) == ["Date", "Amount", "Description"]
+    assert list(df.columns) == ["Date", "AmountMinor", "Description"]
     assert pd.api.types.is_datetime64_any_dtype(df["Date"])
-    assert pd.api.types.is_float_dtype(df["Amount"])
+    assert pd.api.types.is_integer_dtype(df["AmountMinor"])
 
 
 def test_invert_amounts():
@@ -22,7 +35,7 @@ def test_invert_amounts():
         "Description": ["Grocery shop"],
     })
     df = parse_standard_csv(raw_df, invert_amounts=True)
-    assert df["Amount"].iloc[0] == 50.0
+    assert df["AmountMinor"].iloc[0] == 5000
 
 
 def test_reference_appended_to_description():
@@ -46,3 +59,68 @@ def test_missing_required_column_raises():
     })
     with pytest.raises(ValueError, match="Description"):
         parse_standard_csv(raw_df, invert_amounts=False)
+
+
+@pytest.mark.parametrize("fixture, name", [
+    ("sample-amex.csv", "Standard"),
+    ("sample-barclays.csv", "Barclays"),
+    ("sample-revolut.csv", "Revolut"),
+])
+def test_detect_format_from_header(fixture, name):
+    """Each bank export is recognised from its header row alone."""
+    with open(f"tests/fixtures/{fixture}", "rb") as f:
+        assert detect_format(read_header(f, "utf-8-sig")).name == name
+        assert f.tell() == 0
+
+
+def test_detect_format_allows_optional_columns_and_rejects_unknown():
+    assert detect_format(["Date", "Amount", "Description", "Reference"]) is STANDARD
+    with pytest.raises(ValueError, match="Supported formats"):
+        detect_format(["When", "How much"])
+
+
+@pytest.fixture(params=["pyarrow", "c"])
+def engine(request, monkeypatch):
+    """Run a test against both readers (pyarrow only if it is installed)."""
+    if request.param == "pyarrow":
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(parsers, "pa", None)
+    return request.param
+
+
+def test_read_csv_chunks_parses_barclays(engine):
+    """Barclays stores spending as negatives; amounts come out positive = debit."""
+    with open("tests/fixtures/sample-barclays.csv", "rb") as f:
+        chunks = list(read_csv_chunks(f, BARCLAYS, "utf-8-sig", chunk_rows=2))
+    df = pd.concat([BARCLAYS.parse(c, invert_amounts=None) for c in chunks])
+
+    assert list(df.index) == list(range(len(df)))  # row numbers stay file-wide
+    assert pd.api.types.is_integer_dtype(df["AmountMinor"])
+    assert df["AmountMinor"].iloc[0] == 3299
+    assert df["Date"].iloc[0] == pd.Timestamp(2026, 2, 5)
+    assert df["Description"].iloc[0].startswith("THE EGGFREE CAKEBO")
+
+
+def test_read_csv_chunks_flags_bad_values_per_row(engine):
+    """Unparseable dates and amounts become NaT/NA instead of failing the whole file."""
+    data = io.BytesIO(b"Date,Amount,Description\n01/01/2025,\"1,200.50\",A\nnope,oops,B\n")
+    df = STANDARD.parse(next(read_csv_chunks(data, STANDARD, "utf-8-sig", 10)), invert_amounts=None)
+
+    assert df["AmountMinor"].iloc[0] == 120050
+    assert pd.isna(df["Date"].iloc[1]) and pd.isna(df["AmountMinor"].iloc[1])
+
+
+def test_revolut_export_parses_end_to_end(engine):
+    """Reverted rows (no Completed Date) are dropped, everything else parses cleanly."""
+    with open("tests/fixtures/sample-revolut.csv", "rb") as f:
+        df = pd.concat(list(iter_csv_chunks(f, chunk_rows=500, invert_amounts=None)))
+
+    raw = pd.read_csv("tests/fixtures/sample-revolut.csv")
+    completed = raw.index[raw["State"] == "COMPLETED"]
+    assert len(df) == len(completed) == 2097
+    assert list(df.index) == list(completed)  # row numbers still match the file
+    assert not df["Date"].isna().any() and not df["AmountMinor"].isna().any()
+    assert df["Date"].iloc[0] == pd.Timestamp(2021, 2, 2, 16, 23)
+    assert df["AmountMinor"].iloc[0] == -90  # money in; Revolut stores spending as negatives
+    assert REVOLUT.filter_column in REVOLUT.usecols
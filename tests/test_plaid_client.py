@@ -0,0 +1,39 @@
+"""Tests for the shared Plaid API client (plaid_client.py). No network calls are made."""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import plaid_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    monkeypatch.setenv("PLAID_POOL_SIZE", "7")
+    monkeypatch.setenv("PLAID_READ_TIMEOUT", "12")
+    plaid_client.reset_plaid_client()
+    yield
+    plaid_client.reset_plaid_client()
+
+
+def test_client_is_built_once_and_shared_across_threads():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: plaid_client.get_plaid_client(), range(32)))
+    assert len({id(c) for c in clients}) == 1
+    assert clients[0].api_client.rest_client.pool_manager.connection_pool_kw["maxsize"] == 7
+
+    plaid_client.reset_plaid_client()
+    assert plaid_client.get_plaid_client() is not clients[0]
+
+
+def test_calls_pass_the_configured_timeouts(monkeypatch):
+    client = plaid_client.get_plaid_client()
+    seen = {}
+
+    def call_api(*args, **kwargs):
+        seen["timeout"] = kwargs["_request_timeout"]
+        return SimpleNamespace(accounts=[])
+
+    monkeypatch.setattr(client.api_client, "call_api", call_api)
+    assert plaid_client.get_balances(SimpleNamespace(access_token="token")) == []
+    assert seen["timeout"] == (5.0, 12.0)
@@ -0,0 +1,183 @@
+"""Tests for the concurrent, page-by-page Plaid sync (plaid_sync.py and POST /plaid/sync)."""
+from datetime import date
+import threading
+import time
+
+import pytest
+
+import helpers
+import plaid_sync
+from helpers import (
+    build_transactions_from_plaid, bulk_insert_transactions, delete_plaid_transactions, get_dashboard_stats,
+    update_plaid_transactions,
+)
+from ledger import rebuild_monthly_totals
+from models import db, Account, MonthlyCategoryTotal, PlaidItem, Transaction
+
+
+@pytest.fixture
+def banks(app, two_users):
+    """Three linked banks for Alice, one account each. Returns the PlaidItem ids."""
+    alice_id, _ = two_users
+    ids = []
+    for name in ("Monzo", "Barclays", "Starling"):
+        item = PlaidItem(user_id=alice_id, access_token=f"token-{name}", item_id=name, institution_name=name)
+        db.session.add(item)
+        db.session.flush()
+        db.session.add(Account(user_id=alice_id, name=name, account_type="automatic",
+                               plaid_item_id=item.id, plaid_account_id=f"acct-{name}"))
+        ids.append(item.id)
+    db.session.commit()
+    return ids
+
+
+def fake_plaid(monkeypatch, fail=(), delay=0.0, pages=2, break_after=None):
+    """
+    Stub the Plaid calls: pages transaction pages of one transaction each, then one
+    balance, per bank. Banks named in fail raise on their first page; break_after=n
+    makes every bank raise after its nth page. Pages resume after the item's cursor.
+    """
+    in_flight = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def iter_transaction_pages(credentials):
+        name = credentials.access_token.removeprefix("token-")
+        first = int(credentials.cursor.rsplit("-", 1)[1]) + 1 if credentials.cursor else 1
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        time.sleep(delay)
+        with lock:
+            in_flight["now"] -= 1
+        if name in fail:
+            raise ConnectionError(f"{name} is down")
+        for n in range(first, pages + 1):
+            if break_after is not None and n > break_after:
+                raise ConnectionError("connection reset")
+            added = [{"transaction_id": f"tx-{name}-{n}", "name": f"{name} coffee", "date": date(2024, 5, n),
+                      "amount": 2.5, "account_id": f"acct-{name}"}]
+            yield added, [], [], f"cursor-{name}-{n}"
+
+    def get_balances(credentials):
+        name = credentials.access_token.removeprefix("token-")
+        return [{"plaid_account_id": f"acct-{name}", "current": 100.0, "currency": "GBP"}]
+
+    monkeypatch.setattr(plaid_sync, "iter_transaction_pages", iter_transaction_pages)
+    monkeypatch.setattr(plaid_sync, "get_balances", get_balances)
+    return in_flight
+
+
+def test_stream_items_runs_banks_concurrently_and_isolates_failures(app, banks, monkeypatch):
+    in_flight = fake_plaid(monkeypatch, fail={"Barclays"}, delay=0.2)
+    items = [db.session.get(PlaidItem, i) for i in banks]
+
+    events = list(plaid_sync.stream_items(items, max_workers=4))
+
+    assert in_flight["peak"] == 3
+    pages = [(s.item_id, p.next_cursor) for s, p in events if p is not None]
+    assert [c for i, c in pages if i == banks[0]] == ["cursor-Monzo-1", "cursor-Monzo-2"]
+    finished = {s.institution_name: s for s, p in events if p is None}
+    assert {n: s.ok for n, s in finished.items()} == {"Monzo": True, "Barclays": False, "Starling": True}
+    assert finished["Barclays"].error == "Barclays is down"
+    assert finished["Monzo"].pages == 2 and len(finished["Monzo"].balances) == 1
+    assert all(s.seconds >= 0.2 for s in finished.values())
+
+
+def test_stream_items_times_out_stragglers(app, banks, monkeypatch):
+    fake_plaid(monkeypatch, delay=0.5)
+    events = list(plaid_sync.stream_items([db.session.get(PlaidItem, banks[0])], max_workers=1, timeout=0.05))
+    assert len(events) == 1
+    status, page = events[0]
+    assert page is None and status.error.startswith("timed out")
+
+
+def test_time_spent_saving_pages_does_not_count_towards_the_timeout(app, banks, monkeypatch):
+    fake_plaid(monkeypatch, pages=3)
+    events = []
+    for status, page in plaid_sync.stream_items([db.session.get(PlaidItem, banks[0])], max_workers=1, timeout=0.1):
+        events.append((status, page))
+        time.sleep(0.25)  # a slow commit, longer than the timeout
+    status, page = events[-1]
+    assert page is None and status.ok and status.pages == 3
+
+
+def test_interrupted_sync_resumes_from_the_last_saved_page(auth_client, banks, monkeypatch):
+    fake_plaid(monkeypatch, pages=3, break_after=1)
+    auth_client.post("/plaid/sync", data={"item_id": banks[0]})
+    assert db.session.get(PlaidItem, banks[0]).cursor == "cursor-Monzo-1"
+    assert Transaction.query.filter(Transaction.plaid_transaction_id.like("tx-Monzo-%")).count() == 1
+
+    fake_plaid(monkeypatch, pages=3)
+    auth_client.post("/plaid/sync", data={"item_id": banks[0]})
+    db.session.expire_all()
+    item = db.session.get(PlaidItem, banks[0])
+    assert item.cursor == "cursor-Monzo-3" and item.last_synced_at is not None
+    saved = Transaction.query.filter(Transaction.plaid_transaction_id.like("tx-Monzo-%"))
+    assert sorted(t.plaid_transaction_id for t in saved) == ["tx-Monzo-1", "tx-Monzo-2", "tx-Monzo-3"]
+
+
+def test_sync_saves_healthy_banks_when_one_fails(auth_client, banks, monkeypatch):
+    fake_plaid(monkeypatch, fail={"Barclays"})
+
+    response = auth_client.post("/plaid/sync", follow_redirects=True)
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert "Barclays: sync failed" in page
+    assert "Synced 2 of 3 banks" in page
+
+    synced = {t.plaid_transaction_id for t in Transaction.query.filter(Transaction.plaid_transaction_id.isnot(None))}
+    assert synced == {"tx-Monzo-1", "tx-Monzo-2", "tx-Starling-1", "tx-Starling-2"}
+    cursors = {item.institution_name: item.cursor for item in PlaidItem.query}
+    assert cursors == {"Monzo": "cursor-Monzo-2", "Barclays": None, "Starling": "cursor-Starling-2"}
+    assert Account.query.filter_by(name="Monzo").one().latest_balance is not None
+
+
+def test_plaid_rows_are_deduplicated_by_the_unique_index(app, two_users):
+    alice_id, bob_id = two_users
+
+    def page(user_id, *ids):
+        txs = [{"transaction_id": i, "name": "PRET", "date": date(2024, 5, 1), "amount": 3.0, "account_id": "a"}
+               for i in ids]
+        return build_transactions_from_plaid(txs, {}, user_id)
+
+    save = lambda rows: bulk_insert_transactions(rows, skip_duplicates=True, dedup_key="plaid_transaction_id")
+    assert len(save(page(alice_id, "p1", "p2", "p1"))) == 2  # repeated within the page
+    assert len(save(page(alice_id, "p2", "p3"))) == 1         # p2 imported by an earlier page
+    assert len(save(page(bob_id, "p1"))) == 1                 # ids are only unique per user
+    db.session.commit()
+
+    assert Transaction.query.filter_by(user_id=alice_id).filter(Transaction.plaid_transaction_id.isnot(None)).count() == 3
+    assert get_dashboard_stats(alice_id)["total"] == 4  # stats only counted rows actually inserted
+
+
+def test_modified_and_removed_transactions_are_applied_in_chunks(app, two_users, monkeypatch):
+    alice_id, _ = two_users
+    monkeypatch.setattr(helpers, "PLAID_WRITE_CHUNK_SIZE", 2)
+    txs = [{"transaction_id": f"p{i}", "name": "PRET", "date": date(2024, 5, 1), "amount": 3.0, "account_id": "a"}
+           for i in range(1, 6)]
+    bulk_insert_transactions(build_transactions_from_plaid(txs, {}, alice_id))
+    db.session.commit()
+
+    # Posted a month later at a different amount and name; "zz" was never imported
+    posted = [{**txs[0], "date": date(2024, 6, 2), "amount": 4.5, "name": "PRET A MANGER 123"},
+              {**txs[1], "amount": 3.25},
+              {**txs[0], "transaction_id": "zz"}]
+    assert update_plaid_transactions(alice_id, posted) == 2
+    db.session.commit()
+
+    p1 = Transaction.query.filter_by(user_id=alice_id, plaid_transaction_id="p1").one()
+    assert (p1.date, p1.amount_minor, p1.description) == (date(2024, 6, 2), 450, "PRET A MANGER 123")
+
+    def monthly():
+        return sorted((m.month, m.total_minor, m.count, m.min_minor, m.max_minor)
+                      for m in MonthlyCategoryTotal.query.filter_by(user_id=alice_id))
+
+    kept = monthly()
+    rebuild_monthly_totals(alice_id)
+    assert monthly() == kept  # the rollup moved with the rows
+
+    assert delete_plaid_transactions(alice_id, ["p1", "p3", "p4", "p5", "zz"]) == 4
+    db.session.commit()
+    remaining = Transaction.query.filter(Transaction.plaid_transaction_id.isnot(None))
+    assert [t.plaid_transaction_id for t in remaining] == ["p2"]
+    assert get_dashboard_stats(alice_id)["total"] == 2
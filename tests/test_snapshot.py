@@ -0,0 +1,135 @@
+"""Tests for cached columnar ledger snapshots (snapshot.py)."""
+from datetime import date
+
+import numpy as np
+
+from helpers import save_transactions, transaction_row
+from ledger import record_import
+from models import db, Category, Transaction
+from snapshot import LedgerSnapshot, SnapshotCache, build_snapshot, get_snapshot, ledger_summary
+
+
+def add_rows(user_id, *amounts, day=date(2024, 3, 5), category_id=None, norm="TESCO"):
+    return save_transactions([
+        transaction_row(user_id=user_id, date=day, amount=a, description=norm, account="Main",
+                        normalised_description=norm, category_id=category_id)
+        for a in amounts
+    ])
+
+
+def fake_snapshot(user_id, version=1, rows=10):
+    zeros = np.zeros(rows, dtype=np.int64)
+    return LedgerSnapshot(user_id, version, zeros, zeros, zeros.astype(np.int32),
+                          zeros.astype(np.int32), zeros.astype(np.int32), zeros.astype(np.int32), (), ("GBP",))
+
+
+def test_snapshot_columns(app, two_users):
+    alice_id, _ = two_users
+    add_rows(alice_id, 12.34, -0.1)
+
+    snapshot = build_snapshot(alice_id, version=0)
+    assert len(snapshot) == 3  # plus the fixture's "Alice coffee"
+    assert snapshot.days.dtype == np.int64 and snapshot.pence.dtype == np.int64
+    assert snapshot.category.dtype == np.int32 and snapshot.merchant.dtype == np.int32
+    assert sorted(snapshot.pence.tolist()) == [-10, 1000, 1234]
+    assert date(1970, 1, 1).toordinal() + int(snapshot.days.max()) == date(2024, 3, 5).toordinal()
+
+
+def test_cache_reuses_snapshot_until_the_ledger_changes(app, two_users):
+    alice_id, _ = two_users
+    first = get_snapshot(alice_id)
+    assert get_snapshot(alice_id) is first
+
+    add_rows(alice_id, 5.0)                 # bulk insert bumps ledger_version
+    second = get_snapshot(alice_id)
+    assert second is not first and len(second) == len(first) + 1
+
+    tx = Transaction.query.filter_by(user_id=alice_id).first()
+    tx.amount = 99.0                        # so does an ORM edit
+    db.session.commit()
+    assert get_snapshot(alice_id).pence.max() == 9900
+
+    third = get_snapshot(alice_id)
+    record_import(alice_id)                 # and an import or sync
+    db.session.commit()
+    assert get_snapshot(alice_id) is not third
+
+
+def test_cache_evicts_least_recently_used_to_stay_under_its_cap():
+    one = fake_snapshot(1)
+    cache = SnapshotCache(max_bytes=one.nbytes * 2)
+    cache.put(one)
+    cache.put(fake_snapshot(2))
+    cache.get(1, 1, lambda: None)           # touch user 1
+    cache.put(fake_snapshot(3))
+
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get(1, 1, lambda: None) is one
+    rebuilt = fake_snapshot(2)
+    assert cache.get(2, 1, lambda: rebuilt) is rebuilt  # user 2 was evicted, so it is rebuilt
+    assert len(cache) == 2
+
+    cache.put(fake_snapshot(4, rows=1000))  # bigger than the whole cache: not kept
+    assert len(cache) == 2
+
+
+def test_summary_and_group_bys(app, two_users):
+    alice_id, _ = two_users
+    coffee = Category(user_id=alice_id, name="Coffee")
+    db.session.add(coffee)
+    db.session.commit()
+    add_rows(alice_id, 3.0, 4.0, category_id=coffee.id, norm="PRET")
+    add_rows(alice_id, 50.0, day=date(2024, 4, 1))
+
+    result = ledger_summary(alice_id, start=date(2024, 3, 1), group_by="category")
+    assert result["summary"]["count"] == 3
+    assert result["summary"]["total"] == 57.0
+    assert result["summary"]["median"] == 4.0
+    assert [(g["label"], g["count"], g["total"]) for g in result["groups"]] == [
+        ("Uncategorised", 1, 50.0), ("Coffee", 2, 7.0),
+    ]
+
+    months = ledger_summary(alice_id, group_by="month")["groups"]
+    assert {g["label"]: g["total"] for g in months} == {"2024-01": 10.0, "2024-03": 7.0, "2024-04": 50.0}
+
+
+def test_summary_is_per_currency(app, two_users):
+    alice_id, _ = two_users
+    add_rows(alice_id, 3.0, 4.0)
+    save_transactions([transaction_row(user_id=alice_id, date=date(2024, 3, 5), amount=a, currency="JPY",
+                                       description="LAWSON", account="Main", normalised_description="LAWSON")
+                       for a in (1500, 500)])
+
+    pounds = ledger_summary(alice_id, group_by="merchant")
+    assert (pounds["currency"], pounds["currencies"]) == ("GBP", ["GBP", "JPY"])
+    assert pounds["summary"]["count"] == 3 and pounds["summary"]["total"] == 17.0
+    yen = ledger_summary(alice_id, group_by="merchant", currency="jpy")
+    assert yen["summary"]["total"] == 2000.0 and yen["summary"]["median"] == 1000.0
+    assert [(g["label"], g["total"]) for g in yen["groups"]] == [("LAWSON", 2000.0)]
+    assert ledger_summary(alice_id, currency="EUR")["summary"]["count"] == 0
+
+
+def test_category_groups_are_labelled_by_path(app, two_users):
+    alice_id, _ = two_users
+    food, travel = Category(user_id=alice_id, name="Food"), Category(user_id=alice_id, name="Travel")
+    db.session.add_all([food, travel])
+    db.session.flush()
+    food_other = Category(user_id=alice_id, name="Other", parent_id=food.id)
+    travel_other = Category(user_id=alice_id, name="Other", parent_id=travel.id)
+    db.session.add_all([food_other, travel_other])
+    db.session.commit()
+    add_rows(alice_id, 5.0, category_id=food_other.id)
+    add_rows(alice_id, 20.0, category_id=travel_other.id)
+
+    groups = ledger_summary(alice_id, start=date(2024, 3, 1), group_by="category")["groups"]
+    assert [(g["key"], g["label"]) for g in groups] == [
+        (travel_other.id, "Travel > Other"), (food_other.id, "Food > Other"),
+    ]
+
+
+def test_summary_endpoint(auth_client):
+    response = auth_client.get("/analytics/summary?group_by=merchant")
+    assert response.status_code == 200
+    assert response.get_json()["summary"]["count"] == 1
+
+    assert auth_client.get("/analytics/summary?group_by=colour").status_code == 400
@@ -0,0 +1,117 @@
+"""Tests for the paginated /transactions and /uncategorised views."""
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Category, ImportBatch, Transaction
+
+
+@pytest.fixture
+def history(app, two_users):
+    """Seven extra transactions for Alice: three on one day (ties on date), odd ones categorised."""
+    alice_id, _ = two_users
+    groceries = Category(user_id=alice_id, name="Groceries")
+    db.session.add(groceries)
+    db.session.flush()
+    days = [date(2024, 2, 1)] * 3 + [date(2024, 2, d) for d in range(2, 6)]
+    db.session.add_all([
+        Transaction(user_id=alice_id, date=day, amount=1.0, description=f"TX{i}", account="Main",
+                    category_id=groceries.id if i % 2 else None)
+        for i, day in enumerate(days)
+    ])
+    db.session.commit()
+    return alice_id
+
+
+def expected_order(user_id, **filters):
+    return [t.id for t in Transaction.query.filter_by(user_id=user_id, **filters)
+            .order_by(Transaction.date.desc(), Transaction.id.desc())]
+
+
+def test_uncategorised_json_pages_with_a_cursor(auth_client, history):
+    seen, cursor = [], None
+    while True:
+        body = auth_client.get("/uncategorised", query_string={"limit": 2, "before": cursor}).get_json()
+        assert body["total"] == 5  # 4 from history + the fixture's own coffee
+        seen += [t["id"] for t in body["transactions"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected_order(history, category_id=None)
+
+
+def test_transactions_page_links_to_older_rows(auth_client, history):
+    first = auth_client.get("/transactions?limit=3").get_data(as_text=True)
+    assert "Total: 8" in first
+    assert "Older →" in first and "⏮ Newest" not in first
+    assert "limit=3" in first.split("Older →")[0].rsplit("<a ", 1)[1]  # the page size carries over
+
+    ids = expected_order(history)
+    last = db.session.get(Transaction, ids[2])
+    older = auth_client.get(f"/transactions?limit=3&before={last.date.isoformat()}_{last.id}")
+    assert f"<td>{ids[3]}</td>" in older.get_data(as_text=True)
+    assert f"<td>{ids[2]}</td>" not in older.get_data(as_text=True)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SELECTs sent to the database inside the block. The logged-in user
+    lookup is left out: it is cached on g for as long as the test's app context lives.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.startswith("SELECT") and not statement.startswith("SELECT user."):
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def nested_categories(app, two_users):
+    """Twenty categorised transactions for Alice, each under its own 'Food > ...' subcategory."""
+    alice_id, _ = two_users
+    food = Category(user_id=alice_id, name="Food")
+    db.session.add(food)
+    db.session.flush()
+    batch = ImportBatch(user_id=alice_id, filename="big.csv")
+    db.session.add(batch)
+    db.session.flush()
+    for i in range(20):
+        sub = Category(user_id=alice_id, name=f"Sub{i}", parent_id=food.id)
+        db.session.add(sub)
+        db.session.flush()
+        db.session.add(Transaction(user_id=alice_id, date=date(2024, 3, 1), amount=1.0, description=f"T{i}",
+                                   account="Main", category_id=sub.id, batch_id=batch.id))
+    db.session.commit()
+    batch_id = batch.id
+    db.session.expunge_all()  # nothing cached in the identity map
+    return batch_id
+
+
+def test_transactions_page_query_count_does_not_grow_with_rows(auth_client, nested_categories):
+    with count_queries() as small:
+        auth_client.get("/transactions?limit=2")
+    db.session.expunge_all()
+    with count_queries() as large:
+        page = auth_client.get("/transactions?limit=20").get_data(as_text=True)
+
+    assert "Food &gt; Sub19" in page
+    assert len(large) == len(small) == 2  # page with categories joined, user_stats
+    assert not [s for s in large if "count(*)" in s.lower()]  # the total is a stored counter
+
+
+def test_review_upload_query_count_does_not_grow_with_rows(auth_client, nested_categories):
+    with count_queries() as statements:
+        page = auth_client.get(f"/uploads/{nested_categories}/review").get_data(as_text=True)
+
+    assert "T19" in page
+    assert len(statements) == 3  # batch, transactions with categories joined, category names
@@ -0,0 +1,105 @@
+"""Tests for the CSV upload → review → recategorise flow, keyed by import batch."""
+import io
+
+import pytest
+
+from models import db, Account, Category, ImportBatch, Transaction
+
+
+CSV = b"Date,Amount,Description\n01/01/2025,1.50,TESCO\n02/01/2025,2.00,PRET\n"
+
+
+@pytest.fixture
+def account(app, two_users):
+    alice_id, _ = two_users
+    acct = Account(user_id=alice_id, name="Main", account_type="manual")
+    db.session.add_all([acct, Category(user_id=alice_id, name="Groceries")])
+    db.session.commit()
+    return acct.id
+
+
+def upload(client, account_id, content=CSV, filename="statement.csv"):
+    return client.post(
+        "/upload-csv",
+        data={"account_id": str(account_id), "file": (io.BytesIO(content), filename)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_upload_stores_only_the_batch_id_in_the_session(auth_client, account):
+    response = upload(auth_client, account)
+    batch = ImportBatch.query.one()
+
+    assert response.headers["Location"].endswith(f"/uploads/{batch.id}/review")
+    assert batch.row_count == 2 and batch.filename == "statement.csv"
+    with auth_client.session_transaction() as sess:
+        assert sess["last_import_batch_id"] == batch.id
+        assert "last_upload_ids" not in sess
+
+
+def test_any_past_upload_can_be_reviewed(auth_client, account):
+    upload(auth_client, account, filename="first.csv")
+    upload(auth_client, account, CSV.replace(b"TESCO", b"ALDI"), filename="second.csv")
+    first, second = ImportBatch.query.order_by(ImportBatch.id).all()
+
+    page = auth_client.get(f"/uploads/{first.id}/review").get_data(as_text=True)
+    assert "TESCO" in page and "ALDI" not in page
+
+    latest = auth_client.get("/review-last-upload")
+    assert latest.headers["Location"].endswith(f"/uploads/{second.id}/review")
+
+    listing = auth_client.get("/uploads").get_data(as_text=True)
+    assert "first.csv" in listing and "second.csv" in listing
+
+
+def test_update_categories_only_touches_the_batch(auth_client, account):
+    upload(auth_client, account)
+    batch = ImportBatch.query.one()
+    tesco = Transaction.query.filter_by(batch_id=batch.id, description="TESCO").one()
+
+    auth_client.post("/update-categories", data={
+        "batch_id": batch.id,
+        "action": "save",
+        f"category_{tesco.id}": "Groceries",
+    })
+
+    db.session.expire_all()
+    assert tesco.category == "Groceries"
+    assert Transaction.query.filter_by(description="Alice coffee").one().category_id is None
+
+
+def test_other_users_batches_are_hidden(client, account, two_users):
+    _, bob_id = two_users
+    batch = ImportBatch(user_id=two_users[0], account_id=account, filename="a.csv")
+    db.session.add(batch)
+    db.session.commit()
+
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(bob_id)
+    assert client.get(f"/uploads/{batch.id}/review").status_code == 404
+
+
+def test_reuploading_an_overlapping_statement_skips_duplicates(auth_client, account):
+    upload(auth_client, account)
+    overlap = CSV + b"03/01/2025,4.00,ALDI\n"
+    response = upload(auth_client, account, overlap, filename="overlap.csv")
+
+    second = ImportBatch.query.filter_by(filename="overlap.csv").one()
+    assert (second.row_count, second.duplicate_count) == (1, 2)
+    assert Transaction.query.filter_by(account_id=account).count() == 3
+    assert response.headers["Location"].endswith(f"/uploads/{second.id}/review")
+
+
+def test_dry_run_counts_new_and_duplicate_rows_without_saving(auth_client, account):
+    upload(auth_client, account)
+    overlap = CSV + b"03/01/2025,4.00,ALDI\n03/01/2025,4.00,ALDI\n"
+
+    response = auth_client.post(
+        "/upload-csv",
+        data={"account_id": str(account), "dry_run": "1", "file": (io.BytesIO(overlap), "overlap.csv")},
+        content_type="multipart/form-data",
+    )
+
+    assert "4 rows read — 2 new, 2 already imported" in response.get_data(as_text=True)
+    assert ImportBatch.query.count() == 1
+    assert Transaction.query.filter_by(account_id=account).count() == 2